@@ -0,0 +1,856 @@
+import asyncio
+import random
+import time
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+from signalr_push import push_event
+from amqp_raw import message_envelope
+from amqp_lease import LeaseManager
+from queue_depth import AsyncQueueDepthService, QueueNotFound
+from amqp_topology import TopologyRegistry
+from amqp_routing import BindingIndex
+from amqp_metrics import Counters, Instruments
+from amqp_codec import default_codec
+from dlq_replay import DlqReplayManager
+from dlq_snapshot import DlqSnapshotStore, death_reason
+from amqp_warmup import Readiness, load_topology
+from amqp_workers import ConsumerPool, parse_handlers
+from amqp_outbox import AMQP_OUTBOX_DIR, Outbox
+from amqp_flow import FlowControl
+from amqp_supervisor import BrokerUnavailable, CircuitBreaker
+from amqp_streams import QUEUE_TYPES, StreamQueues
+
+
+# ============================================================
+# ASYNC AMQP CLIENT (asyncio-native twin of AmqpClient)
+# ============================================================
+# One AsyncioConnection per process, shared by every in-flight request:
+#
+#   - self.channel   → declares / binds / basic_get / ack / publish
+#   - self._probe    → passive queue_declare (a 404 closes the channel,
+#                      so it must not take the main channel down with it)
+#   - self._confirm  → confirm-mode channel for publish_many
+#
+# pika's async channel already serialises synchronous RPCs, so awaiting
+# callers simply queue up behind each other on the event loop instead of
+# each holding a thread.
+#
+# While the connection is down a CircuitBreaker answers every request
+# with BrokerUnavailable (503) at once; only the start() task connects,
+# with backoff, and closes the breaker when it succeeds.
+class AsyncAmqpClient:
+
+    def __init__(self,
+                 host="amqp_rabbit",
+                 port=5672,
+                 username="guest",
+                 password="guest",
+                 use_quorum=False,
+                 lease_ttl=30.0,
+                 depth_ttl=1.0,
+                 codec=None,
+                 topology=None,
+                 outbox_dir=AMQP_OUTBOX_DIR):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_quorum = use_quorum
+        self.queue_types = {}       # per-queue override of use_quorum
+        self.codec = codec or default_codec
+
+        self.metrics = Counters({
+            "reconnects": 0,
+            "channel_reopens": 0,
+            "unrouteable": 0,
+            "published_ok": 0
+        })
+
+        self.instruments = Instruments()
+        self.topology = TopologyRegistry(metrics=self.metrics, instruments=self.instruments)
+        self.routes = BindingIndex(metrics=self.metrics)
+        self.flow = FlowControl(metrics=self.metrics)
+
+        self.connection = None
+        self.channel = None
+        self._probe = None
+        self._confirm = None
+
+        # Broker down → 503 fast; one background task (start) reconnects,
+        # requests never wait out connect retries themselves
+        self.breaker = CircuitBreaker(metrics=self.metrics)
+        self.breaker.trip("starting")
+        self._reconnecting = False
+        self._closing = False
+
+        # Declared again after every (re)connect; /ready follows it
+        self.warmup_topology = topology or load_topology()
+        self.readiness = Readiness()
+        self._warm_task = None
+
+        self._connect_lock = None
+        self._get_lock = None
+        self._get_future = None
+        self._rpc_futures = set()
+
+        self._confirm_tag = 0
+        self._confirm_futures = {}   # delivery_tag → Future
+        self._returned_tags = set()
+
+        self.depth = AsyncQueueDepthService(
+            self._fetch_queue_count, ttl=depth_ttl, metrics=self.metrics)
+
+        # Lease channel is a blocking one: driven from worker threads
+        self.leases = LeaseManager(self._params, lease_ttl=lease_ttl, metrics=self.metrics)
+
+        # DLQ replay jobs run on their own threads + blocking connections too
+        self.replays = DlqReplayManager(
+            self._params,
+            metrics=self.metrics,
+            on_progress=lambda job: push_event("amqpMessage", {"type": "dlqReplay", **job})
+        )
+        self.snapshots = DlqSnapshotStore(
+            self._params,
+            codec=self.codec,
+            metrics=self.metrics,
+            on_progress=lambda snap: push_event("amqpMessage", {"type": "dlqSnapshot", **snap})
+        )
+
+        # Stream reads: short basic_consume on pooled blocking connections
+        self.streams = StreamQueues(self._params, metrics=self.metrics, instruments=self.instruments)
+        for name, retention in self.warmup_topology.get("streams", {}).items():
+            self.streams.register(name, **retention)
+
+        # Handler workers: own consumer thread + blocking connection
+        self.workers = ConsumerPool(
+            self._params,
+            queue_args=self._queue_args,
+            codec=self.codec,
+            metrics=self.metrics,
+            instruments=self.instruments
+        )
+        for queue, handler in parse_handlers().items():
+            self.workers.register(queue, handler)
+        self.workers.start()
+
+        # Outbox flusher: own thread + blocking confirm connection
+        self.outbox = Outbox(
+            self._params,
+            directory=outbox_dir,
+            metrics=self.metrics,
+            instruments=self.instruments,
+            on_confirmed=self._published_to,
+            flow=self.flow
+        )
+        self.outbox.start()
+
+    # ============================================================
+    # 1) CONNECT + CHANNELS
+    # ============================================================
+    def _params(self):
+        creds = pika.PlainCredentials(self.username, self.password)
+        return pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=creds,
+            heartbeat=0,
+            blocked_connection_timeout=10,
+            connection_attempts=3,
+            retry_delay=2
+        )
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+            self._get_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.connection and self.connection.is_open:
+                return
+
+            self.metrics.inc("reconnects")
+            print(f"[AMQP-async] Connecting to {self.host}:{self.port}")
+
+            with self.instruments.timer("connect"):
+                opened = loop.create_future()
+                AsyncioConnection(
+                    parameters=self._params(),
+                    on_open_callback=lambda c: opened.done() or opened.set_result(c),
+                    on_open_error_callback=lambda c, e: opened.done() or opened.set_exception(
+                        pika.exceptions.AMQPConnectionError(e)),
+                    on_close_callback=self._on_connection_closed,
+                    custom_ioloop=loop
+                )
+                self.connection = await opened
+                self.flow.watch(self.connection, "main")
+
+                self.channel = await self._open_channel()
+            self._probe = None
+            self._confirm = None
+            print("[AMQP-async] Connected")
+
+            # topology + confirm channel in the background; /ready waits for it
+            self._warm_task = loop.create_task(self._warm_up())
+
+    async def start(self, base=0.5, cap=15.0):
+        """Connect with full-jitter backoff until it works (startup + reconnect task)."""
+        if self._reconnecting:
+            return
+        self._reconnecting = True
+        try:
+            attempt = 0
+            self.readiness.set("connecting")
+            while True:
+                try:
+                    await self.connect()
+                    break
+                except Exception as e:
+                    attempt += 1
+                    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+                    print(f"[AMQP-async] Connect #{attempt} failed ({e!r}) — next in {delay:.2f}s")
+                    self.readiness.set("connecting", repr(e))
+                    await asyncio.sleep(delay)
+            self.breaker.close()
+        finally:
+            self._reconnecting = False
+
+    def _connection_lost(self, reason):
+        # open the breaker and make sure one reconnect task is running
+        self.breaker.trip(reason)
+        if not self._reconnecting and not self._closing:
+            asyncio.get_running_loop().create_task(self.start())
+
+    async def _warm_up(self):
+        self.readiness.set("warming")
+        topo = self.warmup_topology
+        steps, errors = {}, []
+        started = time.perf_counter()
+
+        async def step(name, coro):
+            try:
+                await coro
+                steps["declared"] = steps.get("declared", 0) + 1
+            except Exception as e:
+                errors.append(f"{name}: {e!r}")
+
+        for ex in topo["exchanges"]:
+            await step(f"exchange {ex['name']}",
+                       self.declare_exchange(ex["name"], ex["type"], force=False))
+        for q in topo["queues"]:
+            await step(f"queue {q}", self.declare_queue(q, force=False))
+        for b in topo["bindings"]:
+            await step(f"binding {b['queue']}", self.bind(b["queue"], b["exchange"], b["routing_key"]))
+
+        try:
+            await self._confirm_channel()
+            steps["confirm_channels"] = 1
+        except Exception as e:
+            errors.append(f"confirm channel: {e!r}")
+
+        steps["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+        self.readiness.finished(steps, errors)
+        print(f"[AMQP-async] Warm-up done in {steps['duration_ms']} ms"
+              + (f" ({len(errors)} error(s))" if errors else ""))
+
+    def ready(self):
+        """Readiness report for /ready (ready=True → route traffic here)."""
+        return self.readiness.snapshot(
+            connected=bool(self.connection and self.connection.is_open),
+            breaker_state=self.metrics.get("breaker_state", "closed")
+        )
+
+    async def close(self):
+        self._closing = True
+        if self.connection and self.connection.is_open:
+            self.connection.close()
+
+    async def _open_channel(self):
+        fut = asyncio.get_running_loop().create_future()
+        self.connection.channel(on_open_callback=fut.set_result)
+        ch = await fut
+        ch.add_on_close_callback(self._on_channel_closed)
+        ch.add_on_return_callback(self._on_return)
+        ch.add_callback(self._on_get_empty, [pika.spec.Basic.GetEmpty], one_shot=False)
+        return ch
+
+    async def _ready(self):
+        if not (self.connection and self.connection.is_open):
+            # reconnecting in the background (or about to): 503 right away
+            # instead of queueing on the connect lock behind its retries
+            self.breaker.check()
+            self._connection_lost("connection closed")
+            raise BrokerUnavailable("AMQP connection is down")
+        if not (self.channel and self.channel.is_open):
+            self.metrics.inc("channel_reopens")
+            self.channel = await self._open_channel()
+        return self.channel
+
+    def _on_connection_closed(self, _conn, reason):
+        print(f"[AMQP-async] Connection closed: {reason!r}")
+        self.readiness.set("connecting", repr(reason))
+        self.topology.invalidate(reason)
+        self._fail_pending(reason)
+        self._connection_lost(reason)
+
+    def _on_channel_closed(self, ch, reason):
+        print(f"[AMQP-async] Channel {ch.channel_number} closed: {reason!r}")
+        self.topology.invalidate(reason)
+        self._fail_pending(reason, channel=ch)
+
+    def _fail_pending(self, reason, channel=None):
+        exc = reason if isinstance(reason, Exception) else \
+            pika.exceptions.AMQPChannelError(reason)
+
+        for fut, ch in list(self._rpc_futures):
+            if channel is None or ch is channel:
+                if not fut.done():
+                    fut.set_exception(exc)
+                self._rpc_futures.discard((fut, ch))
+
+        if channel is None or channel is self._confirm:
+            for fut in self._confirm_futures.values():
+                if not fut.done():
+                    fut.set_exception(exc)
+            self._confirm_futures.clear()
+
+    # ------------------------------------------------------------
+    # callback → awaitable
+    # ------------------------------------------------------------
+    async def _rpc(self, ch, call):
+        """call(callback) issues one pika RPC on `ch`; await its reply."""
+        fut = asyncio.get_running_loop().create_future()
+        entry = (fut, ch)
+        self._rpc_futures.add(entry)
+
+        def done(frame):
+            self._rpc_futures.discard(entry)
+            if not fut.done():
+                fut.set_result(frame)
+
+        call(done)
+        return await fut
+
+    # ============================================================
+    # 2) RETURN HANDLER
+    # ============================================================
+    def _on_return(self, ch, method, props, body):
+        print("[AMQP-async] ❌ Returned message (unrouteable):", body)
+        self.metrics.inc("unrouteable")
+
+    # ============================================================
+    # 3) EXCHANGE
+    # ============================================================
+    async def declare_exchange(self, name, type="direct", force=True):
+        if not force and self.topology.has_exchange(name, type):
+            return
+        ch = await self._ready()
+        with self.instruments.timer("declare", exchange=name):
+            await self._rpc(ch, lambda cb: ch.exchange_declare(
+                exchange=name,
+                exchange_type=type,
+                durable=True,
+                callback=cb
+            ))
+        self.topology.add_exchange(name, type)
+        self.routes.set_type(name, type)
+
+    # ============================================================
+    # 4) QUEUE + DLQ + QUORUM (optional) / STREAM
+    # ============================================================
+    def _set_queue_type(self, name, queue_type, *retention):
+        if queue_type is None:
+            return
+        if queue_type not in QUEUE_TYPES:
+            raise ValueError(f"queue type must be one of {', '.join(QUEUE_TYPES)}")
+        if queue_type == "stream":
+            self.streams.register(name, *retention)
+        else:
+            self.streams.forget(name)
+        self.queue_types[name] = queue_type
+
+    def _queue_args(self, name):
+        stream = self.streams.args(name)
+        if stream is not None:
+            return stream
+        args = {
+            "x-dead-letter-exchange": f"{name}.DLX",
+            "x-dead-letter-routing-key": f"{name}.DLQ"
+        }
+        if self.queue_types.get(name, "quorum" if self.use_quorum else "classic") == "quorum":
+            args["x-queue-type"] = "quorum"
+        return args
+
+    async def _ensure_queue(self, name, arguments=None, force=False):
+        if not force and self.topology.has_queue(name, arguments):
+            return None
+        ch = await self._ready()
+        with self.instruments.timer("declare", queue=name):
+            frame = await self._rpc(ch, lambda cb: ch.queue_declare(
+                queue=name, durable=True, arguments=arguments, callback=cb))
+        self.topology.add_queue(name, arguments)
+        return frame
+
+    async def _ensure_binding(self, queue, exchange, routing_key, force=False):
+        if not force and self.topology.has_binding(queue, exchange, routing_key):
+            return
+        ch = await self._ready()
+        with self.instruments.timer("declare", exchange=exchange, queue=queue):
+            await self._rpc(ch, lambda cb: ch.queue_bind(
+                queue=queue, exchange=exchange, routing_key=routing_key, callback=cb))
+        self.topology.add_binding(queue, exchange, routing_key)
+
+    async def declare_queue(self, name, force=True, queue_type=None, max_age=None,
+                            max_length_bytes=None, max_segment_size_bytes=None):
+        self._set_queue_type(name, queue_type, max_age, max_length_bytes, max_segment_size_bytes)
+        args = self._queue_args(name)
+        if args.get("x-queue-type") == "stream":
+            await self._ensure_queue(name, args, force=force)
+            return
+
+        dlq = f"{name}.DLQ"
+        dlx = f"{name}.DLX"
+
+        await self.declare_exchange(dlx, "direct", force=force)
+        await self._ensure_queue(dlq, force=force)
+        await self._ensure_queue(name, args, force=force)
+        await self._ensure_binding(dlq, dlx, dlq, force=force)
+
+    # ============================================================
+    # 5) BIND
+    # ============================================================
+    async def bind(self, queue, exchange, routing_key, exchange_type=None):
+        exchange_type = exchange_type or self.routes.exchange_type(exchange)
+        await self.declare_exchange(exchange, exchange_type, force=False)
+        await self.declare_queue(queue, force=False)
+        await self._ensure_binding(queue, exchange, routing_key)
+        self.routes.add(queue, exchange, routing_key)
+
+    def route(self, exchange, routing_key):
+        return list(self.routes.route(exchange, routing_key))
+
+    # ============================================================
+    # 6) PUBLISH
+    # ============================================================
+    async def publish(self, exchange, routing_key, body, properties=None, encode=True):
+        targets = self.routes.route(exchange, routing_key)
+        content_type = content_encoding = None
+        if encode:
+            body, content_type, content_encoding = self.codec.encode(
+                body,
+                content_type=getattr(properties, "content_type", None),
+                content_encoding=getattr(properties, "content_encoding", None)
+            )
+        if content_type or content_encoding:
+            properties = properties or pika.BasicProperties()
+            properties.content_type = content_type
+            properties.content_encoding = content_encoding
+
+        if self.outbox.enabled:
+            self.flow.limit(exchange, (routing_key,))
+            # group commit blocks until fsync: keep it off the event loop
+            return await asyncio.to_thread(
+                self.outbox.append, exchange, routing_key, body, properties,
+                exchange_type=self.routes.exchange_type(exchange))
+
+        if self.flow.blocked:
+            # "wait" policy parks a worker thread, never the event loop
+            await asyncio.to_thread(self.flow.check_blocked)
+
+        # the declare cache says nothing about the channel: always get a live
+        # one, and before spending tokens (a 503 must not use up the budget)
+        ch = await self._ready()
+        self.flow.limit(exchange, (routing_key,))
+
+        try:
+            if exchange:
+                await self.declare_exchange(exchange, self.routes.exchange_type(exchange), force=False)
+            with self.instruments.timer("publish", exchange=exchange,
+                                        queue=targets[0] if len(targets) == 1 else None):
+                ch.basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=properties,
+                    mandatory=False
+                )
+            self.metrics.inc("published")
+            for queue_name in targets:
+                self.depth.adjust(queue_name, +1)
+        except Exception as e:
+            print("[AMQP-async] Publish failed:", repr(e))
+            self.metrics.inc("errors")
+            raise
+
+        for queue_name in targets:
+            count = await self.depth.estimate(queue_name)
+            if count is not None:
+                self.push("amqpMessage", {
+                    "type": "queueCount",
+                    "queue": queue_name,
+                    "count": count
+                })
+        return True
+
+    async def publish_many(self, exchange, messages, timeout=30.0):
+        """Async counterpart of AmqpClient.publish_many."""
+        if self.flow.blocked:
+            await asyncio.to_thread(self.flow.check_blocked)
+        await self._ready()
+        self.flow.limit(exchange, [
+            m[0] if isinstance(m, (tuple, list)) else m.get("routing_key", m.get("routingKey"))
+            for m in messages
+        ])
+        if exchange:
+            await self.declare_exchange(exchange, self.routes.exchange_type(exchange), force=False)
+        ch = await self._confirm_channel()
+        loop = asyncio.get_running_loop()
+
+        futures = []
+        for m in messages:
+            if isinstance(m, (tuple, list)):
+                routing_key, body = m
+                headers = None
+            else:
+                routing_key = m.get("routing_key", m.get("routingKey"))
+                body = m.get("message", m.get("body"))
+                headers = m.get("headers")
+            body, content_type, content_encoding = self.codec.encode(body)
+
+            self._confirm_tag += 1
+            tag = self._confirm_tag
+            headers = dict(headers or {})
+            headers["x-confirm-tag"] = tag
+
+            fut = loop.create_future()
+            self._confirm_futures[tag] = fut
+            ch.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    headers=headers,
+                    content_type=content_type,
+                    content_encoding=content_encoding
+                ),
+                mandatory=True
+            )
+            futures.append(fut)
+
+        with self.instruments.timer("confirm_wait", exchange=exchange):
+            done, _ = await asyncio.wait(futures, timeout=timeout) if futures else (set(), set())
+
+        result = {"total": len(futures), "acked": [], "nacked": [],
+                  "returned": [], "pending": []}
+        for index, fut in enumerate(futures):
+            if fut not in done or fut.exception() is not None:
+                result["pending"].append(index)
+            else:
+                result[fut.result()].append(index)
+
+        self.metrics.inc("published_ok", len(result["acked"]))
+        delivered = []
+        for index in result["acked"]:
+            m = messages[index]
+            rk = m[0] if isinstance(m, (tuple, list)) else m.get("routing_key", m.get("routingKey"))
+            delivered.append((exchange, rk))
+        self._published_to(delivered)
+        return result
+
+    def _published_to(self, delivered):
+        """
+        (exchange, routing_key) pairs the broker confirmed → depth + queueCount.
+        Also called from the outbox flusher thread: only counts already
+        cached are pushed (no awaiting a lookup from there).
+        """
+        per_queue = {}
+        for exchange, routing_key in delivered:
+            for queue_name in self.routes.route(exchange, routing_key):
+                per_queue[queue_name] = per_queue.get(queue_name, 0) + 1
+
+        for queue_name, n in per_queue.items():
+            self.depth.adjust(queue_name, n)
+            count = self.depth.peek(queue_name)
+            if count is not None:
+                self.push("amqpMessage", {
+                    "type": "queueCount",
+                    "queue": queue_name,
+                    "count": count
+                })
+
+    async def _confirm_channel(self):
+        await self._ready()
+        if self._confirm and self._confirm.is_open:
+            return self._confirm
+
+        ch = await self._open_channel()
+        self._confirm_tag = 0
+        self._returned_tags = set()
+
+        def on_return(_ch, method, props, body):
+            tag = (props.headers or {}).get("x-confirm-tag")
+            if tag is not None:
+                self._returned_tags.add(int(tag))
+
+        def on_confirm(frame):
+            m = frame.method
+            if m.multiple:
+                tags = [t for t in self._confirm_futures if t <= m.delivery_tag]
+            else:
+                tags = [m.delivery_tag]
+
+            for t in tags:
+                fut = self._confirm_futures.pop(t, None)
+                if fut is None or fut.done():
+                    continue
+                if isinstance(m, pika.spec.Basic.Nack):
+                    fut.set_result("nacked")
+                elif t in self._returned_tags:
+                    fut.set_result("returned")
+                else:
+                    fut.set_result("acked")
+                self._returned_tags.discard(t)
+
+        ch.add_on_return_callback(on_return)
+        await self._rpc(ch, lambda cb: ch.confirm_delivery(
+            ack_nack_callback=on_confirm, callback=cb))
+        self._confirm = ch
+        return ch
+
+    # ============================================================
+    # 7) QUEUE COUNT (cached; passive declare on the probe channel)
+    # ============================================================
+    async def queue_count(self, queue):
+        """Ready-message count of `queue`; raises QueueNotFound (404)."""
+        return await self.depth.get(queue)
+
+    async def _fetch_queue_count(self, queue):
+        await self._ready()
+        if not (self._probe and self._probe.is_open):
+            self._probe = await self._open_channel()
+        ch = self._probe
+        try:
+            with self.instruments.timer("queue_count", queue=queue):
+                frame = await self._rpc(ch, lambda cb: ch.queue_declare(
+                    queue=queue, passive=True, callback=cb))
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code == 404:
+                raise QueueNotFound(queue) from None
+            raise
+        return frame.method.message_count
+
+    # ============================================================
+    # 8) CONSUME ONE
+    # ============================================================
+    def _on_get_empty(self, _frame):
+        fut = self._get_future
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    async def basic_get(self, queue, auto_ack=True):
+        """Single basic_get → (method, props, body) or None when empty."""
+        ch = await self._ready()
+
+        # pika allows only one outstanding basic_get per channel
+        async with self._get_lock:
+            fut = asyncio.get_running_loop().create_future()
+            self._get_future = fut
+            entry = (fut, ch)
+            self._rpc_futures.add(entry)
+
+            def on_get(_ch, method, props, body):
+                if not fut.done():
+                    fut.set_result((method, props, body))
+
+            try:
+                with self.instruments.timer("basic_get", queue=queue):
+                    ch.basic_get(queue=queue, callback=on_get, auto_ack=auto_ack)
+                    return await fut
+            finally:
+                self._rpc_futures.discard(entry)
+                self._get_future = None
+
+    async def consume_one(self, queue):
+        got = await self.consume_raw(queue)
+        if got is None:
+            return None
+        return message_envelope(queue, *got, self.codec)
+
+    async def consume_raw(self, queue):
+        """(method, props, body) with the body untouched, or None when empty."""
+        try:
+            # MUST match existing queue arguments (skipped once known)
+            await self._ensure_queue(queue, self._queue_args(queue))
+
+            got = await self.basic_get(queue, auto_ack=True)
+            if got is None:
+                return None
+            method, props, body = got
+            self.metrics.inc("consumed")
+            self.depth.observe(queue, method.message_count)
+
+        except Exception as e:
+            print("[AMQP-async] Consume failed:", repr(e))
+            self.metrics.inc("errors")
+            raise
+
+        # Basic.GetOk carries the remaining count: no lookup needed
+        self.push("amqpMessage", {
+            "type": "queueCount",
+            "queue": queue,
+            "count": method.message_count
+        })
+
+        return method, props, body
+
+    # ============================================================
+    # 8b) CONSUME STREAM
+    # ============================================================
+    async def consume_stream(self, queue, prefetch=10, idle_timeout=15):
+        """
+        Async twin of AmqpClient.consume_stream: one basic_consume on a
+        dedicated channel, ack after the caller pulled the next item,
+        None on idle so the caller can send a keep-alive.
+
+        Subscribes right away (BrokerUnavailable surfaces here, before a
+        response has started) and returns the async generator of deliveries.
+        """
+        await self._ready()
+        ch = await self._open_channel()
+        await self._rpc(ch, lambda cb: ch.basic_qos(prefetch_count=prefetch, callback=cb))
+
+        inbox = asyncio.Queue()     # bounded in practice by prefetch
+        ch.add_on_close_callback(lambda _ch, _reason: inbox.put_nowait(None))
+        ch.basic_consume(
+            queue,
+            lambda _ch, method, props, body: inbox.put_nowait((method, props, body)),
+            auto_ack=False
+        )
+        return self._stream_deliveries(ch, inbox, queue, idle_timeout)
+
+    async def _stream_deliveries(self, ch, inbox, queue, idle_timeout):
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(inbox.get(), idle_timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+
+                if item is None:        # channel closed by broker
+                    return
+
+                method, props, body = item
+                self.metrics.inc("consumed")
+                envelope = message_envelope(queue, method, props, body, self.codec)
+                envelope["delivery_tag"] = method.delivery_tag
+                envelope["redelivered"] = method.redelivered
+
+                yield envelope
+                ch.basic_ack(method.delivery_tag)
+        finally:
+            if ch.is_open:
+                ch.close()
+
+    # ============================================================
+    # 8c) CONSUME BATCH (lease-based, see amqp_lease.py)
+    # ============================================================
+    async def consume_batch(self, queue, max_count, ttl=None):
+        lease, deliveries = await asyncio.to_thread(
+            self.leases.fetch, queue, max_count, ttl)
+        if lease is None:
+            return None
+
+        self.metrics.inc("consumed", len(deliveries))
+        self.depth.adjust(queue, -len(deliveries))
+
+        messages = []
+        for method, props, body in deliveries:
+            envelope = message_envelope(queue, method, props, body, self.codec)
+            envelope["delivery_tag"] = method.delivery_tag
+            envelope["redelivered"] = method.redelivered
+            messages.append(envelope)
+
+        return {
+            "ok": True,
+            "queue": queue,
+            "lease": lease.id,
+            "expires_in": ttl or self.leases.lease_ttl,
+            "delivery_tags": list(lease.tags),
+            "count": len(messages),
+            "messages": messages
+        }
+
+    async def settle_lease(self, lease_id, action="ack"):
+        queue = self.leases.queue_of(lease_id)
+        count = await asyncio.to_thread(self.leases.settle, lease_id, action)
+        if action == "requeue":
+            self.depth.adjust(queue, count)
+        return count
+
+    # ============================================================
+    # 8d) STREAM READ (x-queue-type=stream, by offset)
+    # ============================================================
+    async def read_stream(self, queue, offset="first", max_messages=1000, prefetch=None, wait=1.0):
+        deliveries, next_offset = await asyncio.to_thread(
+            self.streams.read, queue, offset, max_messages, prefetch, wait)
+
+        self.metrics.inc("consumed", len(deliveries))
+        messages = []
+        for position, method, props, body in deliveries:
+            envelope = message_envelope(queue, method, props, body, self.codec)
+            envelope["offset"] = position
+            messages.append(envelope)
+
+        return {
+            "ok": True,
+            "queue": queue,
+            **self.streams.describe(deliveries, next_offset, offset),
+            "count": len(messages),
+            "messages": messages
+        }
+
+    # ============================================================
+    # 9) ACK
+    # ============================================================
+    async def ack(self, tag):
+        if await asyncio.to_thread(self.leases.ack_tag, tag):
+            return
+        ch = await self._ready()
+        ch.basic_ack(tag)
+
+    # ============================================================
+    # 10) DLQ INSPECTOR
+    # ============================================================
+    async def peek_dlq(self, q):
+        got = await self.basic_get(f"{q}.DLQ", auto_ack=False)
+        if got is None:
+            return None
+
+        method, props, body = got
+        # straight back to the head — a peek must not hold the message
+        self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+        message, _ = self.codec.text(body, props)
+        return {
+            "body": message,
+            "reason": death_reason(props),
+            "headers": props.headers,
+            "message_count": method.message_count
+        }
+
+    # ============================================================
+    # 11) REALTIME PUSH + METRICS
+    # ============================================================
+    def push(self, event_name, payload):
+        # push_event only enqueues for the background dispatcher
+        queue = payload.get("queue") if isinstance(payload, dict) else None
+        with self.instruments.timer("push_event", queue=queue):
+            push_event(event_name, payload)
+
+    def prometheus(self):
+        """Stage histograms + counters in Prometheus text format."""
+        return self.instruments.render(self.metrics)
@@ -0,0 +1,176 @@
+import os
+import json
+import zlib
+import base64
+
+from amqp_metrics import Counters
+
+# Optional codecs: used when installed, otherwise simply not offered
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+try:
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+
+# Off unless a deployment opts in: consumers outside this gateway must
+# undo content_encoding before compressed bodies can be sent to them
+AMQP_COMPRESSION = os.environ.get("AMQP_COMPRESSION", "none")          # none | zlib | lz4 | zstd
+AMQP_COMPRESS_MIN_BYTES = int(os.environ.get("AMQP_COMPRESS_MIN_BYTES", "1024"))
+AMQP_COMPRESS_LEVEL = int(os.environ.get("AMQP_COMPRESS_LEVEL", "6"))
+AMQP_SERIALIZER = os.environ.get("AMQP_SERIALIZER", "json")            # json | msgpack
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+
+class CodecError(Exception):
+    """Unknown / unavailable content_encoding or content_type."""
+
+
+# ============================================================
+# COMPRESSORS — name (= content_encoding) → (compress, decompress)
+# ============================================================
+def _compressors(level):
+    def zlib_pack(b):
+        return zlib.compress(b, level)
+
+    table = {
+        "zlib": (zlib_pack, zlib.decompress),
+        "deflate": (zlib_pack, zlib.decompress),
+        # decode-only: other producers may send gzip
+        "gzip": (None, lambda b: zlib.decompress(b, 16 + zlib.MAX_WBITS)),
+    }
+    if _lz4:
+        table["lz4"] = (lambda b: _lz4.compress(b), _lz4.decompress)
+    if _zstd:
+        table["zstd"] = (
+            lambda b: _zstd.ZstdCompressor(level=min(level, 22)).compress(b),
+            lambda b: _zstd.ZstdDecompressor().decompress(b, max_output_size=1 << 30)
+        )
+    return table
+
+
+# ============================================================
+# PAYLOAD CODEC
+# ============================================================
+# Applied by AmqpClient on every publish and every consume:
+#
+#   publish:  dict/list → json (or msgpack)  → content_type
+#             ≥ threshold bytes → compressed → content_encoding
+#             (kept only when it actually got smaller)
+#   consume:  content_encoding → decompress, content_type → deserialize
+#
+# str / bytes bodies keep their old wire format below the threshold, so
+# consumers that predate the codec still read small messages as before.
+class PayloadCodec:
+
+    def __init__(self,
+                 compression=AMQP_COMPRESSION,
+                 threshold=AMQP_COMPRESS_MIN_BYTES,
+                 level=AMQP_COMPRESS_LEVEL,
+                 serializer=AMQP_SERIALIZER):
+        self.threshold = threshold
+        self._table = _compressors(level)
+
+        compression = (compression or "none").lower()
+        if compression != "none" and self._table.get(compression, (None,))[0] is None:
+            print(f"[AMQP] Compression '{compression}' unavailable — using zlib")
+            compression = "zlib"
+        self.compression = None if compression == "none" else compression
+
+        if serializer == "msgpack" and _msgpack is None:
+            print("[AMQP] msgpack not installed — serializing as json")
+            serializer = "json"
+        self.serializer = serializer
+
+        self.stats = Counters({"compressed": 0, "bytes_in": 0, "bytes_out": 0})
+
+    # ------------------------------------------------------------
+    # publish side
+    # ------------------------------------------------------------
+    def serialize(self, obj):
+        if self.serializer == "msgpack":
+            return _msgpack.packb(obj, use_bin_type=True), MSGPACK
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8"), JSON
+
+    def encode(self, body, content_type=None, content_encoding=None):
+        """→ (bytes, content_type, content_encoding) ready for basic_publish."""
+        if body is None:
+            body = b""
+        elif isinstance(body, str):
+            body = body.encode("utf-8")
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            body = bytes(body)
+        else:
+            body, content_type = self.serialize(body)
+
+        # already encoded by the caller (e.g. DLQ replay of a raw body)
+        if content_encoding or not self.compression or len(body) < self.threshold:
+            return body, content_type, content_encoding
+
+        packed = self._table[self.compression][0](body)
+        if len(packed) >= len(body):
+            return body, content_type, None
+
+        self.stats.inc("compressed")
+        self.stats.inc("bytes_in", len(body))
+        self.stats.inc("bytes_out", len(packed))
+        return packed, content_type, self.compression
+
+    # ------------------------------------------------------------
+    # consume side
+    # ------------------------------------------------------------
+    def decompress(self, body, props):
+        """Raw payload bytes with content_encoding undone."""
+        encoding = getattr(props, "content_encoding", None)
+        if not body or not encoding or encoding in ("identity", "utf-8", "utf8"):
+            return body
+        entry = self._table.get(encoding.lower())
+        if entry is None:
+            raise CodecError(f"content_encoding '{encoding}' not supported here")
+        return entry[1](body)
+
+    def decode(self, body, props):
+        """Python value of a delivery: dict/list for json/msgpack, else str/bytes."""
+        body = self.decompress(body, props)
+        content_type = (getattr(props, "content_type", None) or "").split(";")[0].strip()
+
+        if content_type == MSGPACK:
+            if _msgpack is None:
+                raise CodecError("msgpack payload but msgpack is not installed")
+            return _msgpack.unpackb(body, raw=False)
+        if content_type == JSON and body:
+            return json.loads(body)
+        try:
+            return body.decode("utf-8") if body is not None else None
+        except UnicodeDecodeError:
+            return body
+
+    def text(self, body, props):
+        """
+        JSON-envelope view: (message, message_encoding). JSON bodies stay
+        the text they were sent as; binary becomes base64.
+        """
+        if not body:
+            return None, None
+        raw = self.decompress(body, props)
+        content_type = (getattr(props, "content_type", None) or "").split(";")[0].strip()
+
+        if content_type == MSGPACK and _msgpack is not None:
+            return _msgpack.unpackb(raw, raw=False), None
+        try:
+            return raw.decode("utf-8"), None
+        except UnicodeDecodeError:
+            return base64.b64encode(raw).decode("ascii"), "base64"
+
+
+default_codec = PayloadCodec()
@@ -0,0 +1,164 @@
+import copy
+import time
+from collections import OrderedDict
+
+import pika
+
+# Header stamped on every confirmed publish so that a basic.return
+# (which carries no delivery tag) can be matched back to its message.
+# It is part of the wire format: consumers of publish_many / outbox
+# messages see it (an integer, unique per channel only) and should
+# ignore it. The caller's properties object is never modified.
+CONFIRM_TAG_HEADER = "x-confirm-tag"
+
+
+class ConfirmBatch:
+    """Outcome of one publish_many call, indexed by message position."""
+
+    def __init__(self, total):
+        self.total = total
+        self.acked = []
+        self.nacked = []
+        self.returned = []
+        self.outstanding = 0
+
+    def as_dict(self, pending=()):
+        return {
+            "total": self.total,
+            "acked": sorted(self.acked),
+            "nacked": sorted(self.nacked),
+            "returned": sorted(self.returned),
+            "pending": sorted(pending)
+        }
+
+
+# ============================================================
+# PIPELINED PUBLISHER CONFIRMS
+# ============================================================
+# BlockingChannel.confirm_delivery() waits for the broker ack after
+# *every* basic_publish (one round-trip per message). Here confirm mode
+# is enabled on the underlying async channel instead: messages are
+# written back-to-back and acks/nacks are matched by delivery tag as they
+# stream in, including `multiple=True` acks covering a whole range.
+class ConfirmTracker:
+
+    PUMP_EVERY = 256        # drain socket every N publishes
+
+    def __init__(self, channel, instruments=None):
+        self.channel = channel
+        self.instruments = instruments
+        self._impl = channel._impl
+        self.next_tag = 1
+        self.pending = OrderedDict()    # delivery_tag -> (batch, index)
+        self.returned_tags = set()
+
+        ready = []
+        self._impl.add_on_return_callback(self._on_return)
+        self._impl.confirm_delivery(
+            ack_nack_callback=self._on_confirm,
+            callback=lambda _frame: ready.append(True)
+        )
+        deadline = time.monotonic() + 10
+        while not ready:
+            if time.monotonic() > deadline or not channel.is_open:
+                raise pika.exceptions.AMQPChannelError("Confirm.Select timed out")
+            channel.connection.process_data_events(time_limit=0.1)
+
+    @classmethod
+    def attach(cls, channel, instruments=None):
+        """ChannelPool `setup` hook."""
+        return cls(channel, instruments=instruments)
+
+    # ------------------------------------------------------------
+    # broker callbacks (run inline while the connection is pumped)
+    # ------------------------------------------------------------
+    def _on_return(self, _channel, method, props, body):
+        tag = (props.headers or {}).get(CONFIRM_TAG_HEADER)
+        if tag is not None:
+            self.returned_tags.add(int(tag))
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+
+        if method.multiple:
+            tags = []
+            for tag in self.pending:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag]
+
+        for tag in tags:
+            entry = self.pending.pop(tag, None)
+            if entry is None:
+                continue
+            batch, index = entry
+            batch.outstanding -= 1
+
+            if not acked:
+                batch.nacked.append(index)
+            elif tag in self.returned_tags:
+                batch.returned.append(index)
+            else:
+                batch.acked.append(index)
+
+            self.returned_tags.discard(tag)
+
+    # ------------------------------------------------------------
+    # publish
+    # ------------------------------------------------------------
+    def publish_batch(self, exchange, messages, mandatory=True, timeout=30.0):
+        """
+        messages: iterable of (routing_key, body_bytes, properties|None)
+        Returns the batch outcome as a dict of message indexes; messages
+        still unconfirmed at `timeout` are reported as pending.
+        """
+        messages = list(messages)
+        batch = ConfirmBatch(len(messages))
+        tags = {}
+        connection = self.channel.connection
+        started = time.perf_counter()
+
+        for index, (routing_key, body, props) in enumerate(messages):
+            # copy: the caller may reuse its properties (retries, other batches)
+            props = copy.copy(props) if props is not None else pika.BasicProperties()
+            if props.delivery_mode is None:
+                props.delivery_mode = 2     # persistent, like the default path
+            tag = self.next_tag
+            props.headers = dict(props.headers or {})
+            props.headers[CONFIRM_TAG_HEADER] = tag
+
+            self._impl.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=props,
+                mandatory=mandatory
+            )
+            self.next_tag += 1
+            self.pending[tag] = (batch, index)
+            tags[tag] = index
+            batch.outstanding += 1
+
+            if (index + 1) % self.PUMP_EVERY == 0:
+                connection.process_data_events(time_limit=0)
+
+        written = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        while batch.outstanding > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.channel.is_open:
+                break
+            connection.process_data_events(time_limit=min(remaining, 0.05))
+
+        still_pending = [i for t, i in tags.items() if t in self.pending]
+        result = batch.as_dict(still_pending)
+
+        if self.instruments:
+            self.instruments.observe("publish", written - started, exchange=exchange)
+            self.instruments.observe("confirm_wait", time.perf_counter() - written,
+                                     exchange=exchange,
+                                     outcome="timeout" if still_pending else "ok")
+        return result
@@ -0,0 +1,95 @@
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+
+
+# ============================================================
+# CONNECTION OWNER THREAD
+# ============================================================
+# pika.BlockingConnection / BlockingChannel are NOT thread-safe. Flask
+# serves requests on many threads, and two of them writing frames on the
+# shared channel at once interleave (→ channel errors → reconnect storms).
+#
+# Every operation on the shared connection is therefore a command:
+#
+#   request thread ── submit(fn) ──► queue ──► owner thread runs fn()
+#          ▲                                          │
+#          └──────────── Future.result() ◄────────────┘
+#
+# The owner thread is the only one that ever touches the connection.
+# While idle it calls `on_idle` (pump I/O: returns, socket liveness).
+class ConnectionOwner:
+
+    def __init__(self, name="amqp-io", on_idle=None, idle_interval=0.1):
+        self.name = name
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+
+        self._commands = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def in_owner_thread(self):
+        return threading.current_thread() is self._thread
+
+    # ------------------------------------------------------------
+    # producer side
+    # ------------------------------------------------------------
+    def submit(self, fn):
+        fut = Future()
+        if self.in_owner_thread():
+            # nested call from a command: run inline, never queue behind ourselves
+            self._execute(fn, fut)
+            return fut
+
+        self._ensure_started()
+        self._commands.put((fn, fut))
+        return fut
+
+    def call(self, fn, timeout=None):
+        """Run fn() on the owner thread and return its result (or raise)."""
+        return self.submit(fn).result(timeout)
+
+    def pending(self):
+        return self._commands.qsize()
+
+    # ------------------------------------------------------------
+    # owner thread
+    # ------------------------------------------------------------
+    def _run(self):
+        while True:
+            try:
+                fn, fut = self._commands.get(timeout=self.idle_interval)
+            except queue.Empty:
+                self._idle()
+                continue
+
+            self._execute(fn, fut)
+
+    @staticmethod
+    def _execute(fn, fut):
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+
+    def _idle(self):
+        if not self.on_idle:
+            return
+        try:
+            self.on_idle()
+        except Exception:
+            print(f"[AMQP] {self.name}: idle pump failed")
+            print(traceback.format_exc())
@@ -0,0 +1,221 @@
+import os
+import math
+import time
+import fnmatch
+import threading
+from functools import partial
+
+from amqp_metrics import Counters
+from amqp_supervisor import BrokerUnavailable
+from dlq_replay import TokenBucket
+
+# Publish rate limits, comma separated:
+#
+#   <exchange>[:<routing key glob>]=<per second>[/<burst>]
+#
+#   orders=500/1000           all of exchange "orders"
+#   orders:order.eu.*=50      the matching keys of "orders", one shared bucket
+#   *=2000                    every other exchange, one bucket each
+AMQP_PUBLISH_LIMITS = os.environ.get("AMQP_PUBLISH_LIMITS", "")
+# While the broker is blocked (memory / disk alarm): "shed" → 503 at once,
+# "wait" → hold the request up to AMQP_BLOCKED_WAIT_S for the unblock first
+AMQP_BLOCKED_POLICY = os.environ.get("AMQP_BLOCKED_POLICY", "shed")
+AMQP_BLOCKED_WAIT_S = float(os.environ.get("AMQP_BLOCKED_WAIT_S", "2.0"))
+
+
+class BrokerBlocked(BrokerUnavailable):
+    """The broker sent connection.blocked (resource alarm); publishing would hang."""
+
+
+class RateLimited(Exception):
+    """A publish rate limit is exhausted; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after=1, rule=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rule = rule
+
+
+class _Rule:
+
+    def __init__(self, exchange, routing_key, rate, burst):
+        self.exchange = exchange            # "*" → per exchange
+        self.routing_key = routing_key      # glob, or None for the whole exchange
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}                   # exchange → TokenBucket
+
+    @property
+    def label(self):
+        return self.exchange + (f":{self.routing_key}" if self.routing_key else "")
+
+    def bucket(self, exchange):
+        b = self.buckets.get(exchange)
+        if b is None:
+            b = self.buckets[exchange] = TokenBucket(self.rate, self.burst)
+        return b
+
+
+def parse_limits(spec=AMQP_PUBLISH_LIMITS):
+    rules = []
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        target, _, value = item.partition("=")
+        exchange, _, routing_key = target.strip().partition(":")
+        rate, _, burst = value.strip().partition("/")
+        rules.append(_Rule(exchange, routing_key or None, float(rate),
+                           float(burst) if burst else None))
+    return rules
+
+
+# ============================================================
+# FLOW CONTROL — broker alarms + per-exchange publish budgets
+# ============================================================
+# When RabbitMQ hits its memory or disk watermark it sends
+# connection.blocked and stops reading from publishing connections: a
+# publish then sits in the socket until blocked_connection_timeout
+# tears the connection down. Every connection we publish on is watched
+# here, and while any of them is blocked a publish is refused up front
+# (BrokerBlocked → 503 + Retry-After) instead of tying up a request
+# thread; with the outbox enabled publishes are still accepted into it.
+#
+# Rate limits are token buckets, checked before the broker is touched:
+# a publish must fit every rule that matches it (its exchange rule, or
+# "*" when there is none, plus any routing-key rules), so one noisy
+# producer runs out of its own budget (429) before it can push the
+# broker into an alarm that stalls everybody else. A batch larger than
+# a bucket's burst is let through on a full bucket and leaves it in
+# debt.
+class FlowControl:
+
+    def __init__(self, limits=AMQP_PUBLISH_LIMITS, policy=AMQP_BLOCKED_POLICY,
+                 wait=AMQP_BLOCKED_WAIT_S, metrics=None):
+        self.rules = parse_limits(limits) if isinstance(limits, str) else list(limits)
+        self.policy = policy
+        self.wait = wait
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("flow_blocked", "flow_blocked_events", "flow_shed", "rate_limited"):
+            self.metrics.setdefault(key, 0)
+
+        self._blocked = {}          # id(connection) → (connection, name, reason, since)
+        self._unblocked = threading.Event()
+        self._unblocked.set()
+        self._lock = threading.Lock()
+        self._bucket_lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # connection.blocked / connection.unblocked
+    # ------------------------------------------------------------
+    def watch(self, connection, name):
+        """Follow the blocked state of a (Blocking|Asyncio)Connection."""
+        connection.add_on_connection_blocked_callback(partial(self._on_blocked, name))
+        connection.add_on_connection_unblocked_callback(partial(self._on_unblocked, name))
+
+    def _on_blocked(self, name, connection, frame):
+        reason = getattr(frame.method, "reason", None)
+        with self._lock:
+            self._blocked[id(connection)] = (connection, name, reason, time.time())
+            self._update()
+        self.metrics.inc("flow_blocked_events")
+        print(f"[AMQP] Connection '{name}' blocked by the broker: {reason}")
+
+    def _on_unblocked(self, name, connection, _frame):
+        with self._lock:
+            self._blocked.pop(id(connection), None)
+            self._update()
+        print(f"[AMQP] Connection '{name}' unblocked")
+
+    def _update(self):
+        # caller holds _lock; a connection closed while blocked
+        # (blocked_connection_timeout) never reports the unblock
+        for key in [k for k, (conn, *_rest) in self._blocked.items() if not conn.is_open]:
+            del self._blocked[key]
+        self.metrics["flow_blocked"] = 1 if self._blocked else 0
+        if self._blocked:
+            self._unblocked.clear()
+        else:
+            self._unblocked.set()
+
+    @property
+    def blocked(self):
+        if self._unblocked.is_set():
+            return False
+        with self._lock:
+            self._update()
+            return bool(self._blocked)
+
+    def check_blocked(self, wait=True):
+        """Raise BrokerBlocked while the broker blocks publishers."""
+        if not self.blocked:
+            return
+        if wait and self.policy == "wait" and self._unblocked.wait(self.wait) and not self.blocked:
+            return
+        self.metrics.inc("flow_shed")
+        with self._lock:
+            reasons = sorted({str(reason) for _c, _n, reason, _s in self._blocked.values()})
+        raise BrokerBlocked(f"AMQP broker is blocking publishers ({', '.join(reasons) or 'alarm'})",
+                            retry_after=5)
+
+    # ------------------------------------------------------------
+    # rate limits
+    # ------------------------------------------------------------
+    def _matching(self, exchange, routing_key):
+        matched = []
+        own = fallback = None
+        for rule in self.rules:
+            if rule.routing_key is not None:
+                if rule.exchange in ("*", exchange) and \
+                        fnmatch.fnmatchcase(routing_key or "", rule.routing_key):
+                    matched.append(rule)
+            elif rule.exchange == exchange:
+                own = rule
+            elif rule.exchange == "*":
+                fallback = rule
+        # a "*" rule only covers exchanges without a rule of their own
+        if own or fallback:
+            matched.append(own or fallback)
+        return matched
+
+    def limit(self, exchange, routing_keys):
+        """Take one token per message from every matching bucket, or raise RateLimited."""
+        if not self.rules:
+            return
+        need = {}       # rule → tokens (one bucket per rule per exchange)
+        for routing_key in routing_keys:
+            for rule in self._matching(exchange, routing_key):
+                need[rule] = need.get(rule, 0) + 1
+        if not need:
+            return
+
+        with self._bucket_lock:
+            wait, rule = max(((rule.bucket(exchange).shortfall(n), rule) for rule, n in need.items()),
+                             key=lambda w: w[0])
+            if wait > 0:
+                self.metrics.inc("rate_limited")
+                raise RateLimited(f"Publish rate limit '{rule.label}' exceeded "
+                                  f"({rule.rate:g}/s)", retry_after=max(1, math.ceil(wait)),
+                                  rule=rule.label)
+            for rule, n in need.items():
+                rule.bucket(exchange).tokens -= n
+
+    # ------------------------------------------------------------
+    # stats
+    # ------------------------------------------------------------
+    def snapshot(self):
+        with self._lock:
+            self._update()
+            blocked = [{"connection": name, "reason": reason, "since": since}
+                       for _conn, name, reason, since in self._blocked.values()]
+        with self._bucket_lock:
+            rules = []
+            for rule in self.rules:
+                for bucket in rule.buckets.values():
+                    bucket._refill()
+                rules.append({
+                    "rule": rule.label,
+                    "rate": rule.rate,
+                    "burst": rule.burst or max(1.0, rule.rate),
+                    "tokens": {ex: round(b.tokens, 3) for ex, b in rule.buckets.items()}
+                })
+        return {"blocked": bool(blocked), "policy": self.policy,
+                "connections": blocked, "limits": rules}
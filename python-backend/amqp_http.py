@@ -0,0 +1,83 @@
+import json
+
+import pika
+
+OCTET_STREAM = "application/octet-stream"
+
+# AMQP basic properties ⇄ HTTP headers for the raw-bytes routes.
+# The application headers table travels as JSON in X-Amqp-Headers
+# (values may be nested, e.g. x-death).
+_PROPERTY_HEADERS = (
+    ("content_type", "X-Amqp-Content-Type", str),
+    ("content_encoding", "X-Amqp-Content-Encoding", str),
+    ("delivery_mode", "X-Amqp-Delivery-Mode", int),
+    ("priority", "X-Amqp-Priority", int),
+    ("correlation_id", "X-Amqp-Correlation-Id", str),
+    ("reply_to", "X-Amqp-Reply-To", str),
+    ("expiration", "X-Amqp-Expiration", str),
+    ("message_id", "X-Amqp-Message-Id", str),
+    ("timestamp", "X-Amqp-Timestamp", int),
+    ("type", "X-Amqp-Type", str),
+    ("user_id", "X-Amqp-User-Id", str),
+    ("app_id", "X-Amqp-App-Id", str),
+)
+HEADERS_TABLE = "X-Amqp-Headers"
+
+
+def wants_raw(content_type=None, accept=None):
+    """True when the request body / preferred response is raw bytes."""
+    if content_type:
+        return content_type.split(";")[0].strip().lower() == OCTET_STREAM
+    if accept:
+        return OCTET_STREAM in accept and "application/json" not in accept
+    return False
+
+
+def properties_from_headers(headers):
+    """HTTP request headers → pika.BasicProperties (persistent by default)."""
+    fields = {"delivery_mode": 2}
+    for attr, header, cast in _PROPERTY_HEADERS:
+        value = headers.get(header)
+        if value is not None:
+            fields[attr] = cast(value)
+
+    table = headers.get(HEADERS_TABLE)
+    if table:
+        fields["headers"] = json.loads(table)
+
+    return pika.BasicProperties(**fields)
+
+
+def properties_dict(props):
+    """BasicProperties → plain dict of the fields that are set (JSON / pickle safe)."""
+    fields = {}
+    for attr in ("content_type", "content_encoding", "headers", "delivery_mode",
+                 "priority", "correlation_id", "reply_to", "expiration",
+                 "message_id", "timestamp", "type", "user_id", "app_id"):
+        value = getattr(props, attr, None)
+        if value is not None:
+            fields[attr] = value
+    return fields
+
+
+def properties_to_headers(queue, method, props):
+    """One delivery's metadata as HTTP response headers."""
+    headers = {
+        "X-Amqp-Queue": queue,
+        "X-Amqp-Exchange": method.exchange,
+        "X-Amqp-Routing-Key": method.routing_key,
+        "X-Amqp-Delivery-Tag": str(method.delivery_tag),
+        "X-Amqp-Redelivered": "true" if method.redelivered else "false",
+    }
+    count = getattr(method, "message_count", None)
+    if count is not None:
+        headers["X-Amqp-Message-Count"] = str(count)
+
+    for attr, header, _cast in _PROPERTY_HEADERS:
+        value = getattr(props, attr, None)
+        if value is not None:
+            headers[header] = str(value)
+
+    if getattr(props, "headers", None):
+        headers[HEADERS_TABLE] = json.dumps(props.headers, default=str)
+    return headers
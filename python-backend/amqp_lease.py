@@ -0,0 +1,228 @@
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+
+import pika
+
+from amqp_metrics import Counters
+
+
+class LeaseNotFound(Exception):
+    """Lease id unknown: already settled, expired, or its channel was lost."""
+
+
+class Lease:
+
+    def __init__(self, queue, tags, ttl):
+        self.id = uuid.uuid4().hex
+        self.queue = queue
+        self.tags = list(tags)          # contiguous, ascending
+        self.expires_at = time.monotonic() + ttl
+
+    def expired(self, now):
+        return now >= self.expires_at
+
+
+# ============================================================
+# LEASE MANAGER — batch get + manual ack on ONE persistent channel
+# ============================================================
+# Delivery tags are only valid on the channel that delivered them, so
+# every batch is fetched and later settled on the same long-lived
+# channel. A lease groups the tags of one batch:
+#
+#   fetch()  → basic_get × N (auto_ack=False)  → lease id + tags
+#   settle() → ack / nack (→ DLQ) / requeue the whole lease
+#   reaper   → requeues leases nobody settled before their TTL
+#
+# Because tags are handed out in order, the oldest open lease can be
+# settled with a single `multiple=True` frame; younger leases fall back
+# to per-tag frames so they never touch another lease's messages.
+#
+# A basic_get on a missing queue would close the shared channel and
+# hand every open lease back to the broker, so each fetch first checks
+# the queue with a passive declare on a separate probe channel: a bad
+# queue name then only costs its caller a 404 (and the probe channel).
+class LeaseManager:
+
+    ACTIONS = ("ack", "nack", "requeue")
+
+    def __init__(self, params_factory, lease_ttl=30.0, reap_interval=1.0, metrics=None):
+        self.params_factory = params_factory
+        self.lease_ttl = lease_ttl
+        self.reap_interval = reap_interval
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("lease_open", "lease_fetched", "lease_settled", "lease_expired"):
+            self.metrics.setdefault(key, 0)
+
+        self.connection = None
+        self.channel = None
+        self._probe = None              # passive declares (a 404 closes it)
+        self._leases = OrderedDict()    # lease_id → Lease (oldest first)
+        self._tag_index = {}            # delivery_tag → lease_id
+        self._lock = threading.RLock()
+        self._reaper = None
+
+    # ------------------------------------------------------------
+    # channel
+    # ------------------------------------------------------------
+    def _ensure_channel(self):
+        if self.channel and self.channel.is_open:
+            return self.channel
+
+        # Old channel gone → broker already requeued everything it held
+        self._drop_all_leases()
+
+        if not (self.connection and self.connection.is_open):
+            print("[AMQP] Lease channel: connecting")
+            self.connection = pika.BlockingConnection(self.params_factory())
+        self.channel = self.connection.channel()
+        return self.channel
+
+    def _check_queue(self, queue):
+        # caller holds _lock and has just called _ensure_channel()
+        if not (self._probe and self._probe.is_open):
+            self._probe = self.connection.channel()
+        self._probe.queue_declare(queue=queue, passive=True)
+
+    def _drop_all_leases(self):
+        if self._leases:
+            print(f"[AMQP] Lease channel lost — {len(self._leases)} lease(s) requeued by broker")
+        self._leases.clear()
+        self._tag_index.clear()
+        self.metrics["lease_open"] = 0
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name="amqp-lease-reaper", daemon=True)
+            self._reaper.start()
+
+    # ------------------------------------------------------------
+    # fetch
+    # ------------------------------------------------------------
+    def fetch(self, queue, max_count, ttl=None):
+        """
+        Pull up to `max_count` messages with manual ack.
+        Returns (lease_or_None, [(method, props, body), ...]).
+        """
+        ttl = ttl or self.lease_ttl
+        self._start_reaper()
+
+        with self._lock:
+            ch = self._ensure_channel()
+            # 404 here closes the probe channel only; open leases survive
+            self._check_queue(queue)
+            messages = []
+            try:
+                for _ in range(max_count):
+                    method, props, body = ch.basic_get(queue=queue, auto_ack=False)
+                    if method is None:
+                        break
+                    messages.append((method, props, body))
+            except pika.exceptions.ChannelClosedByBroker:
+                # e.g. queue deleted since the probe — nothing leased survives
+                self._drop_all_leases()
+                raise
+
+            if not messages:
+                return None, []
+
+            lease = Lease(queue, [m.delivery_tag for m, _, _ in messages], ttl)
+            self._leases[lease.id] = lease
+            for tag in lease.tags:
+                self._tag_index[tag] = lease.id
+
+            self.metrics["lease_open"] = len(self._leases)
+            self.metrics.inc("lease_fetched", len(messages))
+            return lease, messages
+
+    # ------------------------------------------------------------
+    # settle
+    # ------------------------------------------------------------
+    def settle(self, lease_id, action="ack"):
+        if action not in self.ACTIONS:
+            raise ValueError(f"action must be one of {self.ACTIONS}")
+
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None or not (self.channel and self.channel.is_open):
+                raise LeaseNotFound(lease_id)
+
+            count = len(lease.tags)
+            self._settle_tags(lease, list(lease.tags), action)
+            self.metrics.inc("lease_settled")
+            return count
+
+    def queue_of(self, lease_id):
+        lease = self._leases.get(lease_id)
+        return lease.queue if lease else None
+
+    def ack_tag(self, tag):
+        """Single-tag ack for /ack. Returns False when the tag is not leased."""
+        with self._lock:
+            lease_id = self._tag_index.get(tag)
+            if lease_id is None:
+                return False
+            lease = self._leases[lease_id]
+            self._settle_tags(lease, [tag], "ack")
+            return True
+
+    def _settle_tags(self, lease, tags, action):
+        ch = self.channel
+        oldest = next(iter(self._leases)) == lease.id
+        whole = len(tags) == len(lease.tags)
+
+        if oldest and whole:
+            # every outstanding tag ≤ max belongs to this lease
+            self._send(ch, lease.tags[-1], action, multiple=True)
+        else:
+            for tag in tags:
+                self._send(ch, tag, action, multiple=False)
+
+        done = set(tags)
+        for tag in done:
+            self._tag_index.pop(tag, None)
+        lease.tags = [t for t in lease.tags if t not in done]
+        if not lease.tags:
+            self._leases.pop(lease.id, None)
+        self.metrics["lease_open"] = len(self._leases)
+
+    @staticmethod
+    def _send(ch, tag, action, multiple):
+        if action == "ack":
+            ch.basic_ack(delivery_tag=tag, multiple=multiple)
+        else:
+            # nack without requeue → dead-lettered to <queue>.DLQ
+            ch.basic_nack(delivery_tag=tag, multiple=multiple,
+                          requeue=(action == "requeue"))
+
+    # ------------------------------------------------------------
+    # expiry
+    # ------------------------------------------------------------
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception:
+                print("[AMQP] Lease reaper error")
+                print(traceback.format_exc())
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [l for l in self._leases.values() if l.expired(now)]
+            if not expired or not (self.channel and self.channel.is_open):
+                return 0
+
+            for lease in expired:
+                print(f"[AMQP] Lease {lease.id} expired — requeue {len(lease.tags)} msg")
+                self._settle_tags(lease, list(lease.tags), "requeue")
+                self.metrics.inc("lease_expired")
+
+            # keep the socket drained while nobody else is using it
+            self.connection.process_data_events(time_limit=0)
+            return len(expired)
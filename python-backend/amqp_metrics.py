@@ -0,0 +1,150 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+class Counters(dict):
+    """
+    The `metrics` dict shared by AmqpClient and its helpers.
+
+    Still a plain dict for /amqp-stats, but `d[k] += 1` from several
+    request threads loses updates; `inc()` does the read-modify-write
+    under a lock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def inc(self, key, n=1):
+        with self._lock:
+            self[key] = self.get(key, 0) + n
+
+    def high_water(self, key, value):
+        with self._lock:
+            if value > self.get(key, 0):
+                self[key] = value
+
+
+# Seconds; dense at the low end where pooled round-trips live
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Histogram:
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * (n_buckets + 1)     # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+# ============================================================
+# LATENCY INSTRUMENTS (Prometheus text exposition)
+# ============================================================
+# Stages: connect, declare, publish, confirm_wait, basic_get,
+# queue_count (passive declare), push_event, handle (worker pool),
+# outbox_commit (append + group fsync) and stream_read (one offset read).
+# One histogram per (stage, exchange, queue) and one counter per
+# (..., outcome):
+#
+#   amqp_client_stage_seconds_bucket{stage="publish",exchange="x",queue="q",le="0.005"} 12
+#   amqp_client_stage_total{stage="publish",exchange="x",queue="q",outcome="error"} 1
+#
+# Queue names come from HTTP input, so the number of label sets is
+# capped; anything past `max_series` is folded into queue="_other".
+class Instruments:
+
+    def __init__(self, namespace="amqp_client", buckets=LATENCY_BUCKETS, max_series=2000):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.max_series = max_series
+
+        self._histograms = {}   # (stage, exchange, queue) → _Histogram
+        self._outcomes = {}     # (stage, exchange, queue, outcome) → int
+        self._lock = threading.Lock()
+
+    def _key(self, stage, exchange, queue):
+        key = (stage, exchange or "", queue or "")
+        if key not in self._histograms and len(self._histograms) >= self.max_series:
+            key = (stage, "_other" if exchange else "", "_other" if queue else "")
+        return key
+
+    def observe(self, stage, seconds, exchange=None, queue=None, outcome="ok"):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            key = self._key(stage, exchange, queue)
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = _Histogram(len(self.buckets))
+            h.counts[i] += 1
+            h.sum += seconds
+            h.count += 1
+
+            okey = key + (outcome,)
+            self._outcomes[okey] = self._outcomes.get(okey, 0) + 1
+
+    @contextmanager
+    def timer(self, stage, exchange=None, queue=None):
+        """Time the block; an exception is recorded with outcome="error"."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start,
+                         exchange=exchange, queue=queue, outcome=outcome)
+
+    # ------------------------------------------------------------
+    # exposition
+    # ------------------------------------------------------------
+    @staticmethod
+    def _escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    def _labels(self, **labels):
+        inner = ",".join(f'{k}="{self._escape(v)}"' for k, v in labels.items())
+        return "{" + inner + "}"
+
+    def render(self, counters=None):
+        """Prometheus text format (0.0.4) of histograms, outcomes and `counters`."""
+        with self._lock:
+            histograms = [(k, list(h.counts), h.sum, h.count)
+                          for k, h in sorted(self._histograms.items())]
+            outcomes = sorted(self._outcomes.items())
+
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_stage_seconds Latency of one AMQP client stage.",
+            f"# TYPE {ns}_stage_seconds histogram",
+        ]
+        for (stage, exchange, queue), counts, total, n in histograms:
+            base = dict(stage=stage, exchange=exchange, queue=queue)
+            cumulative = 0
+            for le, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{ns}_stage_seconds_bucket{self._labels(**base, le=repr(le))} {cumulative}")
+            lines.append(f"{ns}_stage_seconds_bucket{self._labels(**base, le='+Inf')} {n}")
+            lines.append(f"{ns}_stage_seconds_sum{self._labels(**base)} {total:.6f}")
+            lines.append(f"{ns}_stage_seconds_count{self._labels(**base)} {n}")
+
+        lines.append(f"# HELP {ns}_stage_total Stage executions by outcome.")
+        lines.append(f"# TYPE {ns}_stage_total counter")
+        for (stage, exchange, queue, outcome), n in outcomes:
+            labels = self._labels(stage=stage, exchange=exchange, queue=queue, outcome=outcome)
+            lines.append(f"{ns}_stage_total{labels} {n}")
+
+        # Flat counters / gauges from the metrics dict (numbers only)
+        for key, value in sorted((counters or {}).items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"# TYPE {ns}_{key} gauge")
+            lines.append(f"{ns}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,608 @@
+import os
+import json
+import time
+import zlib
+import fcntl
+import random
+import struct
+import itertools
+import threading
+
+import pika
+
+from amqp_metrics import Counters
+from amqp_http import properties_dict
+from amqp_confirms import ConfirmTracker
+from amqp_supervisor import BrokerUnavailable
+
+# Unset → publish() goes straight to the broker (no outbox)
+AMQP_OUTBOX_DIR = os.environ.get("AMQP_OUTBOX_DIR")
+AMQP_OUTBOX_SEGMENT_BYTES = int(os.environ.get("AMQP_OUTBOX_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+# Unflushed bytes on disk before publish() answers 503
+AMQP_OUTBOX_MAX_BYTES = int(os.environ.get("AMQP_OUTBOX_MAX_BYTES", str(2 * 1024 ** 3)))
+# Group-commit window: appends arriving within it share one fsync
+AMQP_OUTBOX_COMMIT_MS = float(os.environ.get("AMQP_OUTBOX_COMMIT_MS", "2"))
+# Records per confirm batch of the flusher
+AMQP_OUTBOX_BATCH = int(os.environ.get("AMQP_OUTBOX_BATCH", "500"))
+
+# One record: <seq:u64><crc32(meta+body):u32><meta_len:u32><body_len:u32><meta json><body>
+_RECORD = struct.Struct("<QIII")
+
+
+class OutboxFull(BrokerUnavailable):
+    """Unflushed backlog reached AMQP_OUTBOX_MAX_BYTES (answered as 503)."""
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ============================================================
+# OUTBOX LOG — one directory of WAL segments, owned by one process
+# ============================================================
+#   <first_seq>.wal   append-only records, rolled at `segment_bytes`
+#   checkpoint        last seq the broker confirmed
+#   lock              flock'ed by the owning process
+#
+# append() writes into the active segment and waits until a shared
+# fsync covers it: the fsync thread sleeps `commit_ms`, then syncs
+# everything written so far in one go, so N concurrent publishes cost
+# one fsync instead of N. The reader only ever sees fsync'ed records.
+#
+# On open, a torn tail (crash mid-write) is cut at the last record with
+# a good CRC, and segments entirely at or below the checkpoint are
+# deleted; the rest is replayed.
+class OutboxLog:
+
+    def __init__(self, directory, lock_file, writable=True,
+                 segment_bytes=AMQP_OUTBOX_SEGMENT_BYTES,
+                 commit_ms=AMQP_OUTBOX_COMMIT_MS, metrics=None, on_durable=None):
+        self.directory = directory
+        self.lock_file = lock_file
+        self.writable = writable
+        self.segment_bytes = segment_bytes
+        self.commit_s = commit_ms / 1000.0
+        self.metrics = metrics if metrics is not None else Counters()
+        self.on_durable = on_durable
+
+        self.segments = []          # first seq of each segment, ascending
+        self.bytes = 0              # all segments on disk
+        self.seq = 0                # last seq written
+        self.confirmed = 0          # last seq the broker confirmed
+        self.error = None           # fsync failure: the log stops accepting
+        self._recover()
+
+        self.durable = self.seq     # last seq known to be on disk
+        self.durable_end = None     # (segment, offset) readable in the active segment
+        self._file = None
+        self._active = None
+        self._size = 0
+        self._syncing = False
+        self._cond = threading.Condition()
+
+        # flusher side
+        self._cursor = (self.segments[0], 0) if self.segments else None
+        self._reader = None
+        self._reader_segment = None
+
+        if writable:
+            self._open_segment()
+            threading.Thread(target=self._sync_loop, name="outbox-fsync", daemon=True).start()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, first):
+        return self._path(f"{first:020d}.wal")
+
+    @staticmethod
+    def _records(f, offset, end):
+        """(seq, meta, body, next_offset) of each complete, CRC-valid record in [offset, end)."""
+        f.seek(offset)
+        while offset + _RECORD.size <= end:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            seq, crc, meta_len, body_len = _RECORD.unpack(header)
+            size = _RECORD.size + meta_len + body_len
+            if offset + size > end:
+                return
+            payload = f.read(meta_len + body_len)
+            if len(payload) < meta_len + body_len or zlib.crc32(payload) != crc:
+                return
+            offset += size
+            yield seq, payload[:meta_len], payload[meta_len:], offset
+
+    def _recover(self):
+        try:
+            with open(self._path("checkpoint")) as f:
+                self.confirmed = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            self.confirmed = 0
+        self.seq = self.confirmed
+
+        for name in sorted(n for n in os.listdir(self.directory) if n.endswith(".wal")):
+            path = self._path(name)
+            size = os.path.getsize(path)
+            end, last = 0, None
+            with open(path, "rb") as f:
+                for seq, _meta, _body, end in self._records(f, 0, size):
+                    last = seq
+            if end < size:
+                print(f"[AMQP] Outbox: {name} cut at {end}/{size} bytes (torn or corrupt tail)")
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+            if last is None or last <= self.confirmed:
+                os.remove(path)
+                continue
+            self.segments.append(int(name[:-4]))
+            self.bytes += end
+            self.seq = max(self.seq, last)
+
+        if self.seq > self.confirmed:
+            print(f"[AMQP] Outbox: {self.seq - self.confirmed} unconfirmed record(s) "
+                  f"in {self.directory} — replaying")
+
+    # ------------------------------------------------------------
+    # write side
+    # ------------------------------------------------------------
+    def _open_segment(self):
+        first = self.seq + 1
+        self._file = open(self._segment_path(first), "ab")
+        _fsync_dir(self.directory)
+        self._active = first
+        self._size = 0
+        self.segments.append(first)
+        self.durable_end = (first, 0)
+        if self._cursor is None:
+            self._cursor = (first, 0)
+
+    def _roll(self):
+        # caller holds _cond; the fsync thread must not be using _file
+        while self._syncing:
+            self._cond.wait()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.metrics.inc("outbox_fsyncs")
+        self.durable = self.seq
+        self._open_segment()
+        self._cond.notify_all()
+        if self.on_durable:
+            self.on_durable()
+
+    def append(self, meta, body):
+        """Write one record; returns its seq once it is on disk."""
+        crc = zlib.crc32(body, zlib.crc32(meta))
+        with self._cond:
+            if self.error:
+                raise OSError(f"outbox log unusable: {self.error}")
+            if self._size >= self.segment_bytes:
+                self._roll()
+            self.seq += 1
+            seq = self.seq
+            self._file.write(_RECORD.pack(seq, crc, len(meta), len(body)))
+            self._file.write(meta)
+            self._file.write(body)
+            n = _RECORD.size + len(meta) + len(body)
+            self._size += n
+            self.bytes += n
+            self._cond.notify_all()         # wake the fsync thread
+
+            while self.durable < seq and not self.error:
+                self._cond.wait()
+            if self.durable < seq:
+                raise OSError(f"outbox fsync failed: {self.error}")
+        return seq
+
+    def _sync_loop(self):
+        while True:
+            with self._cond:
+                while self.durable >= self.seq and not self.error:
+                    self._cond.wait()
+                if self.error:
+                    return
+            if self.commit_s:
+                time.sleep(self.commit_s)   # let concurrent appends join this commit
+
+            with self._cond:
+                if self.durable >= self.seq:
+                    continue                # a segment roll synced it already
+                target, end, f = self.seq, (self._active, self._size), self._file
+                f.flush()
+                self._syncing = True
+            try:
+                os.fsync(f.fileno())
+                self.metrics.inc("outbox_fsyncs")
+            except OSError as e:
+                # after a failed fsync the page cache state is unknown:
+                # refuse further appends rather than claim durability
+                print("[AMQP] Outbox: fsync failed:", repr(e))
+                with self._cond:
+                    self.error = repr(e)
+            with self._cond:
+                self._syncing = False
+                if not self.error:
+                    self.durable = target
+                    self.durable_end = end
+                self._cond.notify_all()
+            if self.on_durable:
+                self.on_durable()
+            if self.error:
+                # durable can never catch up with seq again: stop here
+                # instead of re-fsyncing (and waking the flusher) every commit_ms
+                print("[AMQP] Outbox: fsync thread stopped, log is read-only")
+                return
+
+    # ------------------------------------------------------------
+    # read side (flusher thread only)
+    # ------------------------------------------------------------
+    def _open_reader(self, segment):
+        if self._reader_segment != segment:
+            if self._reader:
+                self._reader.close()
+            self._reader = open(self._segment_path(segment), "rb")
+            self._reader_segment = segment
+        return self._reader
+
+    def read(self, limit):
+        """Up to `limit` fsync'ed, unconfirmed records after the cursor → [(seq, meta, body)]."""
+        with self._cond:
+            segments = list(self.segments)
+            durable_end = self.durable_end
+
+        out = []
+        while len(out) < limit and self._cursor is not None:
+            segment, offset = self._cursor
+            active = durable_end is not None and segment == durable_end[0]
+            end = durable_end[1] if active else os.path.getsize(self._segment_path(segment))
+
+            f = self._open_reader(segment)
+            for seq, meta, body, offset in self._records(f, offset, end):
+                self._cursor = (segment, offset)
+                if seq > self.confirmed:
+                    out.append((seq, meta, body))
+                    if len(out) >= limit:
+                        return out
+
+            if active:
+                break
+            if self._cursor[1] < end:
+                # sealed segments were fsync'ed whole; a bad CRC here is disk damage
+                print(f"[AMQP] Outbox: skipping damaged tail of segment {segment} "
+                      f"({end - self._cursor[1]} bytes)")
+                self.metrics.inc("outbox_corrupt")
+            later = [s for s in segments if s > segment]
+            if not later:
+                break
+            self._cursor = (later[0], 0)
+        return out
+
+    def confirm(self, seq):
+        """Everything up to `seq` is on the broker: checkpoint, drop sealed segments."""
+        self.confirmed = seq
+        tmp = self._path("checkpoint.tmp")
+        with open(tmp, "w") as f:
+            f.write(str(seq))
+        os.replace(tmp, self._path("checkpoint"))
+
+        with self._cond:
+            while len(self.segments) > 1 and self.segments[1] - 1 <= seq:
+                first = self.segments.pop(0)
+                if self._reader_segment == first:
+                    self._reader.close()
+                    self._reader = self._reader_segment = None
+                path = self._segment_path(first)
+                self.bytes -= os.path.getsize(path)
+                os.remove(path)
+                if self._cursor[0] == first:
+                    # read to its very end: carry on at the next one
+                    self._cursor = (self.segments[0], 0)
+
+    @property
+    def drained(self):
+        return self.confirmed >= self.seq
+
+    def destroy(self):
+        """Drop an adopted, drained log and release its directory."""
+        if self._reader:
+            self._reader.close()
+        for first in self.segments:
+            try:
+                os.remove(self._segment_path(first))
+            except FileNotFoundError:
+                pass
+        self.segments = []
+        self.bytes = 0
+        self.lock_file.close()
+
+    def snapshot(self):
+        return {
+            "directory": self.directory,
+            "writable": self.writable,
+            "segments": len(self.segments),
+            "bytes": self.bytes,
+            "last_seq": self.seq,
+            "durable_seq": self.durable,
+            "confirmed_seq": self.confirmed,
+            "backlog": self.seq - self.confirmed,
+            "error": self.error
+        }
+
+
+# ============================================================
+# OUTBOX — accept publishes at disk speed, deliver them later
+# ============================================================
+# With AMQP_OUTBOX_DIR set, publish() appends to the local log and
+# returns as soon as the record is fsync'ed; it needs no broker
+# connection, so it keeps working through a broker restart or a
+# maintenance window. A flusher thread reads the log in order and
+# publishes it in confirm-mode batches on its own connection; a batch
+# is checkpointed once every record in it is acked (or returned as
+# unroutable — retrying would not change that), nacked or timed-out
+# records are re-sent. Delivery is at-least-once: a crash between the
+# broker's ack and the checkpoint re-sends that batch on restart.
+#
+# Every process owns one `slot-N` directory (flock), so gunicorn
+# workers never share a segment. A slot left behind by a worker that is
+# gone (e.g. WEB_CONCURRENCY lowered) is adopted by whoever finds it
+# unlocked, drained read-only, and then emptied.
+class Outbox:
+
+    def __init__(self, params_factory, directory=AMQP_OUTBOX_DIR,
+                 segment_bytes=AMQP_OUTBOX_SEGMENT_BYTES, max_bytes=AMQP_OUTBOX_MAX_BYTES,
+                 commit_ms=AMQP_OUTBOX_COMMIT_MS, batch_size=AMQP_OUTBOX_BATCH,
+                 confirm_timeout=30.0, metrics=None, instruments=None, on_confirmed=None,
+                 flow=None):
+        self.params_factory = params_factory
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.commit_ms = commit_ms
+        self.batch_size = batch_size
+        self.confirm_timeout = confirm_timeout
+        self.instruments = instruments
+        self.on_confirmed = on_confirmed
+        self.flow = flow
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("outbox_appended", "outbox_fsyncs", "outbox_flushed",
+                    "outbox_unroutable", "outbox_retries"):
+            self.metrics.setdefault(key, 0)
+
+        self.log = None
+        self.adopted = []               # read-only logs of departed processes
+        self.connected = False
+        self.last_error = None
+        self._pending = None            # (log, records) sent but not yet all confirmed
+        self._wake = threading.Event()
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    # ------------------------------------------------------------
+    # startup (lazily, once per process)
+    # ------------------------------------------------------------
+    def start(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._claim()
+            threading.Thread(target=self._run, name="outbox-flusher", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _lock_slot(self, name):
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+        f = open(os.path.join(path, "lock"), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _claim(self):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = sorted(n for n in os.listdir(self.directory) if n.startswith("slot-"))
+
+        for i in itertools.count():
+            name = f"slot-{i}"
+            lock = self._lock_slot(name)
+            if lock:
+                break
+        self.log = OutboxLog(os.path.join(self.directory, name), lock,
+                             segment_bytes=self.segment_bytes, commit_ms=self.commit_ms,
+                             metrics=self.metrics, on_durable=self._wake.set)
+        print(f"[AMQP] Outbox: writing to {self.log.directory}")
+
+        for other in existing:
+            if other == name:
+                continue
+            lock = self._lock_slot(other)
+            if lock is None:
+                continue                # a live process owns it
+            log = OutboxLog(os.path.join(self.directory, other), lock,
+                            writable=False, metrics=self.metrics)
+            if log.drained:
+                log.destroy()
+                continue
+            print(f"[AMQP] Outbox: adopted {other} ({log.seq - log.confirmed} to replay)")
+            self.adopted.append(log)
+
+    # ------------------------------------------------------------
+    # publish side
+    # ------------------------------------------------------------
+    def backlog_bytes(self):
+        return sum(log.bytes for log in [self.log, *self.adopted] if log)
+
+    def append(self, exchange, routing_key, body, properties=None, exchange_type="direct"):
+        """Persist one publish; returns its sequence number in this process' log."""
+        self.start()
+        if self.backlog_bytes() >= self.max_bytes:
+            raise OutboxFull(f"AMQP outbox full ({self.backlog_bytes()} bytes unflushed)",
+                             retry_after=5)
+
+        meta = json.dumps({
+            "exchange": exchange,
+            "exchange_type": exchange_type,
+            "routing_key": routing_key,
+            "properties": properties_dict(properties) if properties is not None else None
+        }, default=str).encode("utf-8")
+
+        if self.instruments:
+            with self.instruments.timer("outbox_commit", exchange=exchange):
+                seq = self.log.append(meta, body or b"")
+        else:
+            seq = self.log.append(meta, body or b"")
+        self.metrics.inc("outbox_appended")
+        return seq
+
+    # ------------------------------------------------------------
+    # flusher thread
+    # ------------------------------------------------------------
+    def _run(self):
+        attempt = 0
+        while True:
+            try:
+                self._session()
+            except Exception as e:
+                self.connected = False
+                self.last_error = repr(e)
+                attempt += 1
+                delay = random.uniform(0, min(15.0, 0.5 * (2 ** attempt)))
+                print(f"[AMQP] Outbox: flusher lost the broker ({e!r}) — retry in {delay:.2f}s")
+                time.sleep(delay)
+            else:
+                attempt = 0
+
+    def _next_batch(self):
+        for log in list(self.adopted):
+            records = log.read(self.batch_size)
+            if records:
+                return log, records
+            if log.drained:
+                print(f"[AMQP] Outbox: {log.directory} drained — released")
+                self.adopted.remove(log)
+                log.destroy()
+        records = self.log.read(self.batch_size)
+        return (self.log, records) if records else None
+
+    def _session(self):
+        connection = pika.BlockingConnection(self.params_factory())
+        try:
+            if self.flow:
+                self.flow.watch(connection, "outbox")
+            tracker = ConfirmTracker(connection.channel(), instruments=self.instruments)
+            declared = set()
+            self.connected = True
+            self.last_error = None
+            while True:
+                if self.flow and self.flow.blocked:
+                    # broker alarm: hold the backlog; the unblock arrives here
+                    connection.process_data_events(time_limit=0.5)
+                    continue
+                if self._pending is None:
+                    self._wake.clear()
+                    batch = self._next_batch()
+                    if batch is None:
+                        # idle: keep the connection serviced while waiting
+                        connection.process_data_events(time_limit=0)
+                        self._wake.wait(0.5)
+                        continue
+                    log, records = batch
+                    self._pending = (log, [(seq, json.loads(meta), body)
+                                           for seq, meta, body in records], records[-1][0])
+
+                log, records, last = self._pending
+                left = self._send(connection, tracker, declared, records)
+                if left:
+                    self.metrics.inc("outbox_retries")
+                    self._pending = (log, left, last)
+                    if not tracker.channel.is_open:
+                        raise pika.exceptions.AMQPChannelError("confirm channel closed")
+                    time.sleep(0.2)
+                    continue
+
+                log.confirm(last)
+                self._pending = None
+        finally:
+            self.connected = False
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+
+    def _send(self, connection, tracker, declared, records):
+        """Publish `records` in order with confirms → the ones to send again."""
+        left = []
+        delivered = []
+        for exchange, run in self._runs(records):
+            if exchange and exchange not in declared:
+                self._declare(connection, exchange, run[0][1]["exchange_type"])
+                declared.add(exchange)
+
+            result = tracker.publish_batch(exchange, [
+                (meta["routing_key"], body,
+                 pika.BasicProperties(**meta["properties"]) if meta["properties"] is not None else None)
+                for _seq, meta, body in run
+            ], timeout=self.confirm_timeout)
+
+            for index in result["acked"]:
+                delivered.append((exchange, run[index][1]["routing_key"]))
+            self.metrics.inc("outbox_unroutable", len(result["returned"]))
+            for index in sorted(result["nacked"] + result["pending"]):
+                left.append(run[index])
+
+        self.metrics.inc("outbox_flushed", len(delivered))
+        if delivered and self.on_confirmed:
+            try:
+                self.on_confirmed(delivered)
+            except Exception as e:
+                print("[AMQP] Outbox: confirm callback failed:", repr(e))
+        return left
+
+    @staticmethod
+    def _runs(records):
+        """Consecutive records grouped by exchange (one publish_batch each, order kept)."""
+        for exchange, run in itertools.groupby(records, key=lambda r: r[1]["exchange"]):
+            yield exchange, list(run)
+
+    @staticmethod
+    def _declare(connection, exchange, exchange_type):
+        # passive first: an existing exchange of another type must not 406 the flusher
+        ch = connection.channel()
+        try:
+            ch.exchange_declare(exchange=exchange, passive=True)
+        except pika.exceptions.ChannelClosedByBroker:
+            ch = connection.channel()
+            ch.exchange_declare(exchange=exchange, exchange_type=exchange_type, durable=True)
+        finally:
+            if ch.is_open:
+                ch.close()
+
+    # ------------------------------------------------------------
+    # stats
+    # ------------------------------------------------------------
+    def snapshot(self):
+        logs = [log for log in [self.log, *self.adopted] if log]
+        return {
+            "enabled": self.enabled,
+            "connected": self.connected,
+            "error": self.last_error,
+            "backlog": sum(log.seq - log.confirmed for log in logs),
+            "bytes": sum(log.bytes for log in logs),
+            "max_bytes": self.max_bytes,
+            "in_flight": len(self._pending[1]) if self._pending else 0,
+            "logs": [log.snapshot() for log in logs]
+        }
@@ -0,0 +1,278 @@
+import time
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+import pika
+
+from amqp_metrics import Counters
+
+
+class PoolTimeout(Exception):
+    """No pooled channel became free within checkout_timeout."""
+
+
+# ============================================================
+# 1) ONE POOL SLOT = 1 long-lived connection + 1 channel
+# ============================================================
+# pika.BlockingConnection is not thread-safe, so two threads must never
+# share the same connection. Each slot therefore owns its own connection
+# and is handed to exactly one thread at a time.
+class PooledChannel:
+
+    def __init__(self, connection, channel, extra=None):
+        self.connection = connection
+        self.channel = channel
+        self.extra = extra          # per-channel state from `setup`
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def is_open(self):
+        return bool(
+            self.connection and self.connection.is_open
+            and self.channel and self.channel.is_open
+        )
+
+    def close(self):
+        try:
+            if self.connection and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+# ============================================================
+# 2) CHANNEL POOL
+# ============================================================
+class ChannelPool:
+    """
+    Bounded pool of long-lived (connection, channel) slots.
+
+    - connections are opened lazily, up to `size`
+    - idle slots are health-checked before reuse and replaced when dead
+    - a slot whose caller raised is re-channelled (or dropped) instead
+      of being handed back in an unknown state
+    """
+
+    def __init__(self,
+                 params_factory,
+                 size=4,
+                 checkout_timeout=5.0,
+                 health_check_interval=1.0,
+                 metrics=None,
+                 on_return=None,
+                 setup=None,
+                 on_error=None,
+                 on_connect=None,
+                 name="publish"):
+        self.params_factory = params_factory
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.on_return = on_return
+        self.setup = setup
+        self.on_error = on_error
+        self.on_connect = on_connect
+        self.name = name
+
+        self.metrics = metrics if metrics is not None else Counters()
+        self._prefix = f"pool_{name}"
+        for key in ("size", "in_use", "checkouts", "replaced", "timeouts"):
+            self.metrics.setdefault(f"{self._prefix}_{key}", 0)
+        self.metrics.setdefault(f"{self._prefix}_checkout_ms_last", 0.0)
+        self.metrics.setdefault(f"{self._prefix}_checkout_ms_max", 0.0)
+        self.metrics.setdefault(f"{self._prefix}_checkout_ms_total", 0.0)
+
+        self._idle = deque()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    # ------------------------------------------------------------
+    # open / health
+    # ------------------------------------------------------------
+    def _open_channel(self, connection):
+        ch = connection.channel()
+        if self.on_return:
+            ch.add_on_return_callback(self.on_return)
+        extra = self.setup(ch) if self.setup else None
+        return ch, extra
+
+    def _open_slot(self):
+        print(f"[AMQP] Pool '{self.name}': opening connection")
+        conn = pika.BlockingConnection(self.params_factory())
+        try:
+            if self.on_connect:
+                self.on_connect(conn)
+            return PooledChannel(conn, *self._open_channel(conn))
+        except Exception:
+            conn.close()
+            raise
+
+    def _healthy(self, slot):
+        if not slot.is_open():
+            return False
+
+        if time.monotonic() - slot.last_used < self.health_check_interval:
+            return True
+
+        # Zero-timeout pump: detects a dead socket and dispatches any
+        # pending basic.return frames without waiting.
+        try:
+            slot.connection.process_data_events(time_limit=0)
+            return slot.is_open()
+        except Exception as e:
+            print(f"[AMQP] Pool '{self.name}': health check failed: {e!r}")
+            return False
+
+    # ------------------------------------------------------------
+    # checkout / checkin
+    # ------------------------------------------------------------
+    def _acquire(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError(f"Pool '{self.name}' is closed")
+
+                if self._idle:
+                    slot = self._idle.pop()      # LIFO → hot connections first
+                    break
+
+                if self._created < self.size:
+                    self._created += 1
+                    slot = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics.inc(f"{self._prefix}_timeouts")
+                    raise PoolTimeout(
+                        f"No channel free in pool '{self.name}' "
+                        f"after {self.checkout_timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+
+        try:
+            if slot is not None and not self._healthy(slot):
+                slot.close()
+                self.metrics.inc(f"{self._prefix}_replaced")
+                slot = None
+
+            if slot is None:
+                slot = self._open_slot()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+        self._record_checkout((time.monotonic() - started) * 1000.0)
+        return slot
+
+    def _release(self, slot, failed=False, error=None):
+        if failed and self.on_error:
+            try:
+                self.on_error(error)
+            except Exception:
+                print(traceback.format_exc())
+
+        if failed and slot.connection.is_open:
+            # Connection still fine, only the channel broke (404, 406, ...):
+            # reopening a channel is one round-trip, a new connection is five.
+            try:
+                if slot.channel.is_open:
+                    slot.channel.close()
+            except Exception:
+                pass
+            try:
+                slot.channel, slot.extra = self._open_channel(slot.connection)
+                failed = False
+            except Exception:
+                print(traceback.format_exc())
+
+        with self._cond:
+            self._in_use -= 1
+            if failed or self._closed or not slot.is_open():
+                self._created -= 1
+                self.metrics.inc(f"{self._prefix}_replaced")
+                drop = True
+            else:
+                slot.last_used = time.monotonic()
+                self._idle.append(slot)
+                drop = False
+            self._sync_gauges()
+            self._cond.notify()
+
+        if drop:
+            slot.close()
+
+    @contextmanager
+    def slot(self):
+        """
+        with pool.slot() as slot:
+            slot.channel / slot.connection / slot.extra
+        """
+        slot = self._acquire()
+        try:
+            yield slot
+        except BaseException as e:
+            self._release(slot, failed=True, error=e)
+            raise
+        else:
+            self._release(slot)
+
+    @contextmanager
+    def channel(self):
+        """
+        with pool.channel() as ch:
+            ch.basic_publish(...)
+        """
+        with self.slot() as slot:
+            yield slot.channel
+
+    def warm(self, count=None):
+        """Open up to `count` (default: all) slots ahead of traffic."""
+        slots = []
+        try:
+            for _ in range(min(count or self.size, self.size)):
+                slots.append(self._acquire())
+        finally:
+            for slot in slots:
+                self._release(slot)
+        return len(slots)
+
+    # ------------------------------------------------------------
+    # metrics / shutdown
+    # ------------------------------------------------------------
+    def _sync_gauges(self):
+        self.metrics[f"{self._prefix}_size"] = self._created
+        self.metrics[f"{self._prefix}_in_use"] = self._in_use
+
+    def _record_checkout(self, ms):
+        with self._cond:
+            p = self._prefix
+            self.metrics.inc(f"{p}_checkouts")
+            self.metrics[f"{p}_checkout_ms_last"] = round(ms, 3)
+            self.metrics.inc(f"{p}_checkout_ms_total", ms)
+            self.metrics.high_water(f"{p}_checkout_ms_max", round(ms, 3))
+            self._sync_gauges()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+            self._sync_gauges()
+            self._cond.notify_all()
+
+        for slot in idle:
+            slot.close()
@@ -2,8 +2,57 @@ import pika
 import time
 import json
 import random
+import threading
 import traceback
 from signalr_push import push_event
+from amqp_pool import ChannelPool
+from amqp_confirms import ConfirmTracker
+from amqp_lease import LeaseManager
+from queue_depth import QueueDepthService, QueueNotFound
+from amqp_routing import BindingIndex
+from amqp_topology import TopologyRegistry
+from amqp_executor import ConnectionOwner
+from amqp_supervisor import BrokerUnavailable, CircuitBreaker, ConnectionSupervisor
+from amqp_metrics import Counters, Instruments
+from amqp_codec import default_codec
+from dlq_replay import DlqReplayManager
+from dlq_snapshot import DlqSnapshotStore, death_reason
+from amqp_warmup import AMQP_WARMUP_POOLS, Readiness, load_topology
+from amqp_workers import ConsumerPool, parse_handlers
+from amqp_outbox import AMQP_OUTBOX_DIR, Outbox
+from amqp_flow import FlowControl
+from amqp_streams import QUEUE_TYPES, StreamQueues
+
+def message_envelope(queue, method, props, body, codec=default_codec):
+    """JSON-friendly view of one delivery (shared by every consume path)."""
+    # content_encoding undone; non-UTF-8 payloads come back as base64
+    message, message_encoding = codec.text(body, props)
+    envelope = {
+        "ok": True,
+        "queue": queue,
+        "exchange": method.exchange,
+        "routing_key": method.routing_key,
+        "message": message,
+        "properties": {
+            "content_type": getattr(props, "content_type", None),
+            "content_encoding": getattr(props, "content_encoding", None),
+            "headers": getattr(props, "headers", None),
+            "delivery_mode": getattr(props, "delivery_mode", None),
+            "priority": getattr(props, "priority", None),
+            "correlation_id": getattr(props, "correlation_id", None),
+            "reply_to": getattr(props, "reply_to", None),
+            "expiration": getattr(props, "expiration", None),
+            "message_id": getattr(props, "message_id", None),
+            "timestamp": getattr(props, "timestamp", None),
+            "type": getattr(props, "type", None),
+            "user_id": getattr(props, "user_id", None),
+            "app_id": getattr(props, "app_id", None)
+        }
+    }
+    if message_encoding:
+        envelope["message_encoding"] = message_encoding
+    return envelope
+
 
 class AmqpClient:
 
@@ -12,75 +61,275 @@ class AmqpClient:
                  port=5672,
                  username="guest",
                  password="guest",
-                 use_quorum=False):
+                 use_quorum=False,
+                 pool_size=4,
+                 confirm_pool_size=2,
+                 pool_checkout_timeout=5.0,
+                 lease_ttl=30.0,
+                 depth_ttl=1.0,
+                 command_timeout=30.0,
+                 codec=None,
+                 topology=None,
+                 warm_pools=AMQP_WARMUP_POOLS,
+                 outbox_dir=AMQP_OUTBOX_DIR):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.use_quorum = use_quorum
-        self.binding_map = {}   # routing_key → queue
+        self.queue_types = {}       # per-queue override of use_quorum
+        self.command_timeout = command_timeout
 
+        # Serialization + compression of bodies (content_type / content_encoding)
+        self.codec = codec or default_codec
 
         # Internal metrics
-        self.metrics = {
+        self.metrics = Counters({
             "reconnects": 0,
             "channel_reopens": 0,
             "publish_retry": 0,
             "unrouteable": 0,
             "published_ok": 0
-        }
+        })
 
         self.connection = None
         self.channel = None
 
-        self._connect()
+        # Declared + pre-opened on every (re)connect; /ready follows it
+        self.warmup_topology = topology or load_topology()
+        self.warm_pools = warm_pools
+        self.readiness = Readiness()
+
+        # Per-stage latency histograms (Prometheus text via prometheus())
+        self.instruments = Instruments()
+
+        # Exchanges / queues / bindings already declared (skip repeats)
+        self.topology = TopologyRegistry(metrics=self.metrics, instruments=self.instruments)
+
+        # Exchange types + our bindings → target queues of a publish
+        self.routes = BindingIndex(metrics=self.metrics)
+
+        # connection.blocked tracking + per-exchange publish rate limits
+        self.flow = FlowControl(metrics=self.metrics)
+
+        # Long-lived publish connections (opened lazily on first use)
+        self.pool = ChannelPool(
+            self._pool_params,
+            size=pool_size,
+            checkout_timeout=pool_checkout_timeout,
+            metrics=self.metrics,
+            on_return=self._on_return,
+            on_error=self.topology.invalidate,
+            on_connect=lambda conn: self.flow.watch(conn, "publish"),
+            name="publish"
+        )
+
+        # Confirm-mode channels for publish_many (pipelined acks)
+        self.confirm_pool = ChannelPool(
+            self._pool_params,
+            size=confirm_pool_size,
+            checkout_timeout=pool_checkout_timeout,
+            metrics=self.metrics,
+            on_return=self._on_return,
+            setup=lambda ch: ConfirmTracker.attach(ch, instruments=self.instruments),
+            on_error=self.topology.invalidate,
+            on_connect=lambda conn: self.flow.watch(conn, "confirm"),
+            name="confirm"
+        )
+
+        # queueCount lookups: TTL cache + single-flight + local deltas
+        self.depth = QueueDepthService(
+            self._fetch_queue_count,
+            ttl=depth_ttl,
+            metrics=self.metrics
+        )
+
+        # Persistent manual-ack channel for batch consume + /ack-batch
+        self.leases = LeaseManager(
+            self._pool_params,
+            lease_ttl=lease_ttl,
+            metrics=self.metrics
+        )
+
+        # Bulk DLQ → origin replay jobs (own connection per job, confirms)
+        self.replays = DlqReplayManager(
+            self._pool_params,
+            metrics=self.metrics,
+            on_progress=lambda job: push_event("amqpMessage", {"type": "dlqReplay", **job})
+        )
+
+        # DLQ → local mmap'd segment file, browsed without the broker
+        self.snapshots = DlqSnapshotStore(
+            self._pool_params,
+            codec=self.codec,
+            metrics=self.metrics,
+            on_progress=lambda snap: push_event("amqpMessage", {"type": "dlqSnapshot", **snap})
+        )
+
+        # x-queue-type=stream declarations + offset reads (own connections)
+        self.streams = StreamQueues(
+            self._pool_params,
+            metrics=self.metrics,
+            instruments=self.instruments
+        )
+        for name, retention in self.warmup_topology.get("streams", {}).items():
+            self.streams.register(name, **retention)
+
+        # Server-side consumers: basic_consume → thread / process pool,
+        # batched acks, failures → <queue>.DLQ (AMQP_WORKER_HANDLERS)
+        self.workers = ConsumerPool(
+            self._pool_params,
+            queue_args=self._queue_args,
+            codec=self.codec,
+            metrics=self.metrics,
+            instruments=self.instruments
+        )
+        for queue, handler in parse_handlers().items():
+            self.workers.register(queue, handler)
+        self.workers.start()
+
+        # AMQP_OUTBOX_DIR set → publish() only appends to a local WAL;
+        # a flusher thread delivers it with confirms
+        self.outbox = Outbox(
+            self._pool_params,
+            directory=outbox_dir,
+            metrics=self.metrics,
+            instruments=self.instruments,
+            on_confirmed=self._published_to,
+            flow=self.flow
+        )
+        self.outbox.start()
+
+        # self.connection / self.channel are only ever touched on this thread
+        self.io = ConnectionOwner(name="amqp-io", on_idle=self._pump)
+
+        # Broker down → 503 fast; one background thread reconnects
+        self.breaker = CircuitBreaker(metrics=self.metrics)
+        self.supervisor = ConnectionSupervisor(
+            self._reconnect,
+            self.breaker,
+            metrics=self.metrics
+        )
+
+        # Never block the importer: connect + warm up in the background,
+        # requests get 503 (and /ready false) until that is done
+        self.breaker.trip("starting")
+        threading.Thread(target=self._start_up, name="amqp-warmup", daemon=True).start()
 
     # ============================================================
-    # 1) SAFE WRAPPER with exponential jitter-backoff
+    # 1) SAFE WRAPPER — fail fast, reconnect in the background
     # ============================================================
     def _safe(self, fn):
-        base = 0.15
-        retries = 3
+        # Broker known down → 503 immediately, no sleep / connect here
+        self.breaker.check()
 
-        for attempt in range(1, retries + 1):
-            try:
-                return fn()
+        # Request threads only submit; the owner thread runs fn
+        return self.io.call(lambda: self._safe_inline(fn), timeout=self.command_timeout)
 
-            except pika.exceptions.ChannelClosedByBroker as e:
-                print(f"[AMQP] ChannelClosedByBroker: {e}")
-                print(traceback.format_exc())
-                self.metrics["channel_reopens"] += 1
-                self._open_channel()
-                time.sleep(base * attempt)
-                continue
+    def _safe_inline(self, fn):
+        if not (self.connection and self.connection.is_open):
+            self._connection_lost("connection closed")
+            raise BrokerUnavailable("AMQP connection is down")
 
-            except pika.exceptions.StreamLostError as e:
-                print(f"[AMQP] StreamLostError — reconnecting")
-                print(traceback.format_exc())
-                self._connect()
-                time.sleep(base * attempt)
-                continue
+        if not (self.channel and self.channel.is_open):
+            self._open_channel()
 
-            except pika.exceptions.AMQPConnectionError as e:
-                print(f"[AMQP] ConnectionError — reconnecting fully")
-                print(traceback.format_exc())
-                self._connect()
-                time.sleep(base * attempt)
-                continue
+        try:
+            return fn()
 
-            except Exception as e:
-                print(f"[AMQP] Unknown error: {e}")
-                print(traceback.format_exc())
-                self._connect()
-                time.sleep(base * attempt)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            # 404 / 406 ... → caller's fault; connection is fine
+            print(f"[AMQP] ChannelClosedByBroker: {e}")
+            self.topology.invalidate(e)
+            self._open_channel()
+            raise
+
+        except pika.exceptions.AMQPConnectionError as e:
+            # StreamLostError, ConnectionClosedByBroker, ...
+            print(f"[AMQP] ConnectionError: {e!r}")
+            print(traceback.format_exc())
+            self._connection_lost(e)
+            raise BrokerUnavailable(f"AMQP connection lost: {e!r}") from e
+
+    def _connection_lost(self, reason):
+        """Any thread: open the circuit and let the supervisor reconnect."""
+        self.readiness.set("connecting", repr(reason))
+        self.topology.invalidate(reason)
+        self.supervisor.connection_lost(reason)
+
+    def _guard_broker(self, e):
+        """Pooled paths: report connection-level failures to the supervisor."""
+        if isinstance(e, pika.exceptions.AMQPConnectionError):
+            self._connection_lost(e)
+            raise BrokerUnavailable(f"AMQP connection lost: {e!r}") from e
 
-        raise Exception("Operation failed after retries")
+    # ============================================================
+    # 1b) STARTUP — background connect, warm-up, readiness
+    # ============================================================
+    def _start_up(self):
+        try:
+            self._reconnect()
+            self.breaker.close()
+        except Exception as e:
+            # Supervisor takes over (backoff), and warms up once it connects
+            print(f"[AMQP] Initial connect failed: {e!r}")
+            self.readiness.set("connecting", repr(e))
+            self._connection_lost(e)
+
+    def _reconnect(self):
+        """Supervisor + startup: one connect attempt, then warm up."""
+        self.readiness.set("connecting")
+        self.io.call(lambda: self._connect(attempts=1))
+        self._warm_up()
+
+    def _warm_up(self):
+        self.readiness.set("warming")
+        topo = self.warmup_topology
+        steps, errors = {}, []
+        started = time.perf_counter()
+
+        def step(name, fn):
+            try:
+                # straight to the owner thread: the breaker is still open
+                # while the supervisor is reconnecting
+                self.io.call(lambda: self._safe_inline(fn), timeout=self.command_timeout)
+                steps["declared"] = steps.get("declared", 0) + 1
+            except Exception as e:
+                errors.append(f"{name}: {e!r}")
+
+        for ex in topo["exchanges"]:
+            step(f"exchange {ex['name']}",
+                 lambda ex=ex: self._declare_exchange(ex["name"], ex["type"]))
+        for q in topo["queues"]:
+            step(f"queue {q}", lambda q=q: self._declare_queue(q))
+        for b in topo["bindings"]:
+            step(f"binding {b['queue']}",
+                 lambda b=b: self._bind(b["queue"], b["exchange"], b["routing_key"]))
+
+        if self.warm_pools:
+            for pool in (self.pool, self.confirm_pool):
+                try:
+                    steps[f"{pool.name}_channels"] = pool.warm()
+                except Exception as e:
+                    errors.append(f"pool {pool.name}: {e!r}")
+
+        steps["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+        self.readiness.finished(steps, errors)
+        print(f"[AMQP] Warm-up done in {steps['duration_ms']} ms"
+              + (f" ({len(errors)} error(s))" if errors else ""))
+
+    def ready(self):
+        """Readiness report for /ready (ready=True → route traffic here)."""
+        return self.readiness.snapshot(
+            connected=bool(self.connection and self.connection.is_open),
+            breaker_state=self.metrics.get("breaker_state", "closed")
+        )
 
     # ============================================================
     # 2) CONNECT + CHANNEL
     # ============================================================
-    def _connect(self):
-        self.metrics["reconnects"] += 1
+    def _connect(self, attempts=5):
+        self.metrics.inc("reconnects")
         print(f"[AMQP] Connecting to {self.host}:{self.port}")
 
         creds = pika.PlainCredentials(self.username, self.password)
@@ -90,12 +339,20 @@ class AmqpClient:
             credentials=creds,
             heartbeat=0,                # ⬅ FIX: tăng heartbeat
             blocked_connection_timeout=30,
-            connection_attempts=5,
+            connection_attempts=attempts,
             retry_delay=3
         )
 
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
+        if self.connection and self.connection.is_open:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+
+        with self.instruments.timer("connect"):
+            self.connection = pika.BlockingConnection(params)
+            self.channel = self.connection.channel()
+        self.flow.watch(self.connection, "main")
 
         # ⬅ KHÔNG recommend khi vẫn dùng BlockingConnection
         # self.channel.confirm_delivery()
@@ -104,170 +361,319 @@ class AmqpClient:
 
         print("[AMQP] Connected")
 
+    def _pump(self):
+        # owner thread, idle: dispatch returns + notice a dead socket early
+        if self.connection and self.connection.is_open:
+            try:
+                self.connection.process_data_events(time_limit=0)
+            except pika.exceptions.AMQPConnectionError as e:
+                self._connection_lost(e)
+        elif self.connection is not None and self.metrics.get("breaker_state") != "open":
+            # closed under us with no request in flight: /ready must not
+            # wait for the next request to find out
+            self._connection_lost("connection closed")
+
+    def _pool_params(self):
+        creds = pika.PlainCredentials(self.username, self.password)
+        return pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=creds,
+            heartbeat=0,
+            blocked_connection_timeout=10,
+            connection_attempts=3,
+            retry_delay=2
+        )
+
     def _open_channel(self):
         try:
-            self.metrics["channel_reopens"] += 1
+            self.metrics.inc("channel_reopens")
             self.channel = self.connection.channel()
             self.channel.confirm_delivery()
             self.channel.add_on_return_callback(self._on_return)
             print("[AMQP] Channel reopened")
-        except:
-            print("[AMQP] Channel reopen failed – full reconnect")
-            self._connect()
+        except Exception as e:
+            print("[AMQP] Channel reopen failed – supervisor reconnects")
+            self._connection_lost(e)
+            raise BrokerUnavailable(f"AMQP channel reopen failed: {e!r}") from e
 
     # ============================================================
     # 3) PUBLISHER RETURN HANDLER (unrouteable messages)
     # ============================================================
     def _on_return(self, ch, method, props, body):
         print("[AMQP] ❌ Returned message (unrouteable):", body)
-        self.metrics["unrouteable"] += 1
+        self.metrics.inc("unrouteable")
 
     # ============================================================
     # 4) EXCHANGE
     # ============================================================
     def declare_exchange(self, name, type="direct"):
-        return self._safe(lambda: self._declare_exchange(name, type))
+        # explicit API call → always hits the broker (and refreshes the cache)
+        return self._safe(lambda: self._declare_exchange(name, type, force=True))
 
-    def _declare_exchange(self, name, type):
-        self.channel.exchange_declare(
-            exchange=name,
-            exchange_type=type,
-            durable=True
-        )
+    def _declare_exchange(self, name, type, force=False):
+        self.topology.ensure_exchange(self.channel, name, type, force=force)
+        self.routes.set_type(name, type)
 
     # ============================================================
-    # 5) QUEUE + DLQ + QUORUM (optional)
+    # 5) QUEUE + DLQ + QUORUM (optional) / STREAM
     # ============================================================
-    def declare_queue(self, name):
-        return self._safe(lambda: self._declare_queue(name))
+    def declare_queue(self, name, queue_type=None, max_age=None,
+                      max_length_bytes=None, max_segment_size_bytes=None):
+        """
+        queue_type: classic | quorum | stream (default: quorum when
+        use_quorum, else classic). The retention arguments only apply to
+        streams; None → AMQP_STREAM_* defaults.
+        """
+        self._set_queue_type(name, queue_type, max_age, max_length_bytes, max_segment_size_bytes)
+        return self._safe(lambda: self._declare_queue(name, force=True))
+
+    def _set_queue_type(self, name, queue_type, *retention):
+        if queue_type is None:
+            return
+        if queue_type not in QUEUE_TYPES:
+            raise ValueError(f"queue type must be one of {', '.join(QUEUE_TYPES)}")
+        if queue_type == "stream":
+            self.streams.register(name, *retention)
+        else:
+            self.streams.forget(name)
+        self.queue_types[name] = queue_type
+
+    def _queue_args(self, name):
+        # MUST be identical on every declare of `name` (xem LƯU Ý VÀNG)
+        stream = self.streams.args(name)
+        if stream is not None:
+            return stream
+
+        args = {
+            "x-dead-letter-exchange": f"{name}.DLX",
+            "x-dead-letter-routing-key": f"{name}.DLQ"
+        }
+
+        if self.queue_types.get(name, "quorum" if self.use_quorum else "classic") == "quorum":
+            args["x-queue-type"] = "quorum"
+
+        return args
+
+    def _declare_queue(self, name, force=False):
+        ch = self.channel
+        args = self._queue_args(name)
+        if args.get("x-queue-type") == "stream":
+            # no dead-lettering on streams: nothing is ever rejected out of them
+            return self.topology.ensure_queue(ch, name, args, force=force)
 
-    def _declare_queue(self, name):
         dlq = f"{name}.DLQ"
         dlx = f"{name}.DLX"
 
         # DLX exchange
-        self.channel.exchange_declare(
-            exchange=dlx,
-            exchange_type="direct",
-            durable=True
-        )
+        self.topology.ensure_exchange(ch, dlx, "direct", force=force)
 
         # DLQ queue
-        self.channel.queue_declare(queue=dlq, durable=True)
+        self.topology.ensure_queue(ch, dlq, force=force)
 
-        args = {
-            "x-dead-letter-exchange": dlx,
-            "x-dead-letter-routing-key": dlq
-        }
-
-        if self.use_quorum:
-            args["x-queue-type"] = "quorum"
+        declared = self.topology.ensure_queue(ch, name, args, force=force)
 
-        self.channel.queue_declare(
-            queue=name,
-            durable=True,
-            arguments=args
-        )
-
-        self.channel.queue_bind(
-            exchange=dlx,
-            queue=dlq,
-            routing_key=dlq
-        )
+        self.topology.ensure_binding(ch, dlq, dlx, dlq, force=force)
+        return declared
 
     # ============================================================
     # 6) BIND
     # ============================================================
-    def bind(self, queue, exchange, routing_key):
-        self.binding_map[routing_key] = queue
-        return self._safe(lambda: self._bind(queue, exchange, routing_key))
+    def bind(self, queue, exchange, routing_key, exchange_type=None):
+        """
+        exchange_type: direct | topic | fanout | headers. Defaults to the
+        type this client declared `exchange` with, else "direct".
+        """
+        return self._safe(lambda: self._bind(queue, exchange, routing_key, exchange_type))
 
-    def _bind(self, queue, exchange, routing_key):
-        self._declare_exchange(exchange, "direct")
+    def _bind(self, queue, exchange, routing_key, exchange_type=None):
+        self._declare_exchange(exchange, exchange_type or self.routes.exchange_type(exchange))
         self._declare_queue(queue)
 
-        self.channel.queue_bind(
-            exchange=exchange,
-            queue=queue,
-            routing_key=routing_key
-        )
+        self.topology.ensure_binding(self.channel, queue, exchange, routing_key)
+        self.routes.add(queue, exchange, routing_key)
+
+    def route(self, exchange, routing_key):
+        """Queues a publish to (exchange, routing_key) reaches, per our bindings."""
+        return list(self.routes.route(exchange, routing_key))
 
     # ============================================================
     # 7) PUBLISH (Confirm + Retry + DLX safe)
     # ============================================================
-    def publish(self, exchange, routing_key, body):
-        """
-        API-safe publish: open a new connection for each publish request.
+    def publish(self, exchange, routing_key, body, properties=None, encode=True):
         """
+        API-safe publish: borrow a long-lived channel from the pool
+        instead of opening a new connection for each publish request.
 
-        import pika
+        `body` may be str, bytes or any JSON-able value; the codec picks
+        content_type / content_encoding unless `properties` already set them.
+        encode=False sends bytes exactly as given (raw-bytes route).
 
-        creds = pika.PlainCredentials(self.username, self.password)
+        In outbox mode the message is only written to the local log and
+        the log sequence number is returned; no broker round-trip, and
+        the breaker is not consulted.
 
-        params = pika.ConnectionParameters(
-            host=self.host,
-            port=self.port,
-            credentials=creds,
-            heartbeat=0,
-            blocked_connection_timeout=10,
-            connection_attempts=3,
-            retry_delay=2
-        )
+        Raises RateLimited (429) past a publish limit, and BrokerBlocked
+        (503) while the broker blocks publishers (outbox mode excepted).
+        """
 
-        queue_name = self.binding_map.get(routing_key, routing_key)
+        if self.outbox.enabled:
+            self.flow.limit(exchange, (routing_key,))
+            if encode:
+                body, properties = self._encode(body, properties)
+            return self.outbox.append(exchange, routing_key, body, properties,
+                                      exchange_type=self.routes.exchange_type(exchange))
+
+        # refusals first: a 503 must not spend rate-limit tokens
+        self.breaker.check()
+        self.flow.check_blocked()
+        self.flow.limit(exchange, (routing_key,))
+        targets = self.routes.route(exchange, routing_key)
+        if encode:
+            body, properties = self._encode(body, properties)
 
         try:
-            # Tạo connection riêng cho mỗi publish
-            with pika.BlockingConnection(params) as conn:
-                ch = conn.channel()
-
-                # đảm bảo exchange tồn tại
-                ch.exchange_declare(
-                    exchange=exchange,
-                    exchange_type="direct",
-                    durable=True
-                )
-
-                ch.basic_publish(
-                    exchange=exchange,
-                    routing_key=routing_key,
-                    body=body.encode("utf-8") if isinstance(body, str) else body,
-                    mandatory=False
-                )
+            with self.pool.channel() as ch:
+
+                # đảm bảo exchange tồn tại (1 lần, sau đó lấy từ cache)
+                if exchange:
+                    self.topology.ensure_exchange(ch, exchange, self.routes.exchange_type(exchange))
+
+                with self.instruments.timer("publish", exchange=exchange,
+                                            queue=targets[0] if len(targets) == 1 else None):
+                    ch.basic_publish(
+                        exchange=exchange,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties,
+                        mandatory=False
+                    )
 
                 # metrics safe
-                self.metrics["published"] = self.metrics.get("published", 0) + 1
+                self.metrics.inc("published")
+
+            # 🔥 current_count: cached depth + this publish, for every
+            # queue the bindings route it to (no round-trip per queue)
+            for queue_name in targets:
+                self.depth.adjust(queue_name, +1)
+                count = self.depth.estimate(queue_name)
+                if count is not None:
+                    self._push(queue_name, {
+                        "type": "queueCount",
+                        "queue": queue_name,
+                        "count": count
+                    })
 
-            # 🔥 Compute current_count bằng passive declare
-            # 🔥 2) Ra khỏi WITH block → connection đã đóng → safe để query count
-            current_count = 0
+            return True   # ✔ nằm trong function
 
-            # 🔥 Compute current_count bằng passive declare
-            try:
-                qc_conn = pika.BlockingConnection(params)
-                qc_ch = qc_conn.channel()
-                qinfo = qc_ch.queue_declare(queue=queue_name, passive=True)
-                current_count = qinfo.method.message_count
-                qc_conn.close()
-            except Exception as e:
-                print("[AMQP] queueCount failed:", e)
-                current_count = 0
+        except Exception as e:
+            print("[AMQP] Publish failed:", repr(e))
+            self.metrics.inc("errors")
+            self._guard_broker(e)
+            raise
 
-            push_event("amqpMessage", {
-                "type": "queueCount",
-                "queue": queue_name,
-                "count": current_count
-            })
+    # ============================================================
+    # 7b) PUBLISH MANY (one channel, pipelined publisher confirms)
+    # ============================================================
+    def publish_many(self, exchange, messages, timeout=30.0):
+        """
+        messages: list of {"routing_key"|"routingKey", "message"|"body",
+                           "headers"?} dicts or (routing_key, body) tuples.
 
-            return True   # ✔ nằm trong function
+        All messages go out back-to-back on one confirm-mode channel;
+        the result lists message indexes that were acked, nacked,
+        returned as unroutable, or still pending at `timeout`.
+        """
+        self.breaker.check()
+        self.flow.check_blocked()
+        batch = [self._batch_item(m) for m in messages]
+        self.flow.limit(exchange, [routing_key for routing_key, _body, _props in batch])
 
+        try:
+            with self.confirm_pool.slot() as slot:
+                if exchange:
+                    self.topology.ensure_exchange(slot.channel, exchange,
+                                                  self.routes.exchange_type(exchange))
+                result = slot.extra.publish_batch(exchange, batch, timeout=timeout)
         except Exception as e:
-            print("[AMQP] Publish failed:", repr(e))
-            self.metrics["errors"] = self.metrics.get("errors", 0) + 1
+            print("[AMQP] Publish batch failed:", repr(e))
+            self.metrics.inc("errors")
+            self._guard_broker(e)
             raise
 
+        self.metrics.inc("published", len(result["acked"]))
+        self.metrics.inc("published_ok", len(result["acked"]))
+        self.metrics.inc("nacked", len(result["nacked"]))
+
+        self._published_to((exchange, batch[index][0]) for index in result["acked"])
+        return result
+
+    def _published_to(self, delivered):
+        """(exchange, routing_key) pairs the broker confirmed → depth + queueCount."""
+        # One queueCount per target queue, not per message
+        per_queue = {}
+        for exchange, routing_key in delivered:
+            for queue_name in self.routes.route(exchange, routing_key):
+                per_queue[queue_name] = per_queue.get(queue_name, 0) + 1
+
+        for queue_name, n in per_queue.items():
+            self.depth.adjust(queue_name, n)
+            count = self.depth.estimate(queue_name)
+            if count is not None:
+                self._push(queue_name, {
+                    "type": "queueCount",
+                    "queue": queue_name,
+                    "count": count
+                })
+
+    def _batch_item(self, m):
+        if isinstance(m, (tuple, list)):
+            routing_key, body = m
+            headers = None
+        else:
+            routing_key = m.get("routing_key", m.get("routingKey"))
+            body = m.get("message", m.get("body"))
+            headers = m.get("headers")
+
+        body, props = self._encode(body, pika.BasicProperties(delivery_mode=2, headers=headers))
+        return routing_key, body, props
+
+    def _encode(self, body, properties=None):
+        """Codec pass → (bytes, BasicProperties or None)."""
+        body, content_type, content_encoding = self.codec.encode(
+            body,
+            content_type=getattr(properties, "content_type", None),
+            content_encoding=getattr(properties, "content_encoding", None)
+        )
+        if content_type or content_encoding:
+            properties = properties or pika.BasicProperties()
+            properties.content_type = content_type
+            properties.content_encoding = content_encoding
+        return body, properties
+
+    def _fetch_queue_count(self, queue):
+        # Broker known down → fail here instead of dialing a pool connection
+        self.breaker.check()
+
+        # Passive declare on a missing queue closes the channel (404);
+        # the pool reopens the channel on the same connection.
+        try:
+            with self.pool.channel() as ch:
+                with self.instruments.timer("queue_count", queue=queue):
+                    qinfo = ch.queue_declare(queue=queue, passive=True)
+                return qinfo.method.message_count
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code == 404:
+                raise QueueNotFound(queue) from None
+            raise
+
+    def queue_length(self, queue):
+        """Ready-message count of `queue`; raises QueueNotFound (404)."""
+        self.breaker.check()
+        return self.depth.get(queue)
+
     def _publish(self, exchange, routing_key, body):
-        self._declare_exchange(exchange, "direct")
+        self._declare_exchange(exchange, self.routes.exchange_type(exchange))
 
         attempts = 3
         for attempt in range(1, attempts + 1):
@@ -280,19 +686,19 @@ class AmqpClient:
                     properties=pika.BasicProperties(delivery_mode=2)
                 )
                 if ok:
-                    self.metrics["published_ok"] += 1
+                    self.metrics.inc("published_ok")
                     print("[AMQP] Publish OK")
                     return True
 
             except pika.exceptions.UnroutableError:
-                self.metrics["unrouteable"] += 1
+                self.metrics.inc("unrouteable")
                 print("[AMQP] ❌ Unrouteable")
                 time.sleep(random.uniform(0.1, 0.4))
                 continue
 
             except Exception as e:
                 print("[AMQP] Publish error:", e)
-                self.metrics["publish_retry"] += 1
+                self.metrics.inc("publish_retry")
                 self._open_channel()
                 time.sleep(random.uniform(0.1, 0.4))
 
@@ -334,88 +740,52 @@ class AmqpClient:
         """
         API-safe consume (không đổi chữ ký): giữ nguyên cách gọi, chỉ thay nội dung trả về.
         """
+        got = self.consume_raw(queue)
+        if got is None:
+            return None  # queue empty
 
-        import pika
+        # Envelope đẹp (không đổi chữ ký)
+        return message_envelope(queue, *got, self.codec)
 
-        creds = pika.PlainCredentials(self.username, self.password)
-
-        params = pika.ConnectionParameters(
-            host=self.host,
-            port=self.port,
-            credentials=creds,
-            heartbeat=0,
-            blocked_connection_timeout=10,
-            connection_attempts=3,
-            retry_delay=2
-        )
+    def consume_raw(self, queue):
+        """
+        One auto-acked delivery as (method, props, body) — body untouched
+        (still encoded). None when the queue is empty.
+        """
+        self.breaker.check()
 
         try:
-            # 1) Consume bằng connection riêng
-            with pika.BlockingConnection(params) as conn:
-                ch = conn.channel()
-
-                # MUST match existing queue arguments
-                ch.queue_declare(
-                    queue=queue,
-                    durable=True,
-                    arguments={
-                        "x-dead-letter-exchange": f"{queue}.DLX",
-                        "x-dead-letter-routing-key": f"{queue}.DLQ"
-                    }
-                )
+            # 1) basic_get on a pooled long-lived channel (a 404 / 406 only
+            #    costs the pool a channel reopen, not a new connection)
+            with self.pool.channel() as ch:
+                # MUST match existing queue arguments (skipped once known)
+                self.topology.ensure_queue(ch, queue, self._queue_args(queue))
 
-                method, props, body = ch.basic_get(queue=queue, auto_ack=True)
+                with self.instruments.timer("basic_get", queue=queue):
+                    method, props, body = ch.basic_get(queue=queue, auto_ack=True)
 
                 if method is None:
                     return None  # queue empty
 
-                self.metrics["consumed"] = self.metrics.get("consumed", 0) + 1
+                self.metrics.inc("consumed")
 
-            # 2) Query queue-length sau khi WITH kết thúc
-            current_count = 0
-            try:
-                qc_conn = pika.BlockingConnection(params)
-                qc_ch = qc_conn.channel()
-                qinfo = qc_ch.queue_declare(queue=queue, passive=True)
-                current_count = qinfo.method.message_count
-                qc_conn.close()
-            except Exception as e:
-                print("[AMQP] queueCount failed:", e)
-                current_count = 0
+            # 2) queue-length: Basic.GetOk đã mang message_count còn lại
+            current_count = method.message_count
+            self.depth.observe(queue, current_count)
 
             # 3) Push realtime qua SignalR
-            push_event("amqpMessage", {
+            self._push(queue, {
                 "type": "queueCount",
                 "queue": queue,
                 "count": current_count
             })
 
-            # 4) Envelope đẹp (không đổi chữ ký)
-            return {
-                "ok": True,
-                "queue": queue,
-                "exchange": method.exchange,
-                "routing_key": method.routing_key,
-                "message": body.decode("utf-8") if body else None,
-                "properties": {
-                    "content_type": getattr(props, "content_type", None),
-                    "headers": getattr(props, "headers", None),
-                    "delivery_mode": getattr(props, "delivery_mode", None),
-                    "priority": getattr(props, "priority", None),
-                    "correlation_id": getattr(props, "correlation_id", None),
-                    "reply_to": getattr(props, "reply_to", None),
-                    "expiration": getattr(props, "expiration", None),
-                    "message_id": getattr(props, "message_id", None),
-                    "timestamp": getattr(props, "timestamp", None),
-                    "type": getattr(props, "type", None),
-                    "user_id": getattr(props, "user_id", None),
-                    "app_id": getattr(props, "app_id", None)
-                }
-            }
+            return method, props, body
 
         except Exception as e:
             print("[AMQP] Consume failed:", repr(e))
-            self.metrics["errors"] = self.metrics.get("errors", 0) + 1
+            self.metrics.inc("errors")
+            self._guard_broker(e)
             raise
 
     def _consume_one(self, queue):
@@ -428,10 +798,149 @@ class AmqpClient:
 
         return {"tag": tag, "message": msg.get("message")}
 
+    # ============================================================
+    # 8b) CONSUME STREAM (one long-lived basic_consume subscription)
+    # ============================================================
+    def consume_stream(self, queue, prefetch=10, idle_timeout=15):
+        """
+        Generator over deliveries of `queue` on a dedicated connection.
+
+        - basic_qos(prefetch) caps how many unacked messages the broker
+          pushes to us
+        - each message is acked only when the caller asks for the next
+          one, i.e. after it was written to the HTTP client. A slow
+          reader therefore stops the acks, and the broker stops sending.
+        - yields None every `idle_timeout` seconds without traffic so the
+          caller can send a keep-alive
+        - closing the generator (client gone) closes the connection and
+          the broker requeues whatever was still unacked
+        """
+        self.breaker.check()
+        try:
+            conn = pika.BlockingConnection(self._pool_params())
+        except pika.exceptions.AMQPConnectionError as e:
+            self._guard_broker(e)
+
+        try:
+            ch = conn.channel()
+            ch.basic_qos(prefetch_count=prefetch)
+            print(f"[AMQP] Stream subscribed to '{queue}' (prefetch={prefetch})")
+
+            for method, props, body in ch.consume(
+                    queue, auto_ack=False, inactivity_timeout=idle_timeout):
+                if method is None:
+                    yield None
+                    continue
+
+                self.metrics.inc("consumed")
+                envelope = message_envelope(queue, method, props, body, self.codec)
+                envelope["delivery_tag"] = method.delivery_tag
+                envelope["redelivered"] = method.redelivered
+
+                yield envelope
+                ch.basic_ack(method.delivery_tag)
+        finally:
+            print(f"[AMQP] Stream on '{queue}' closed")
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # ============================================================
+    # 8c) CONSUME BATCH (manual ack, lease-based)
+    # ============================================================
+    def consume_batch(self, queue, max_count, ttl=None):
+        """
+        Fetch up to `max_count` messages on the lease channel.
+        Nothing is acked until settle_lease(); unsettled leases are
+        requeued after `ttl` seconds (at-least-once).
+        """
+        self.breaker.check()
+        try:
+            with self.instruments.timer("basic_get", queue=queue):
+                lease, deliveries = self.leases.fetch(queue, max_count, ttl=ttl)
+        except pika.exceptions.AMQPConnectionError as e:
+            self._guard_broker(e)
+        if lease is None:
+            return None
+
+        self.metrics.inc("consumed", len(deliveries))
+        self.depth.adjust(queue, -len(deliveries))
+
+        messages = []
+        for method, props, body in deliveries:
+            envelope = message_envelope(queue, method, props, body, self.codec)
+            envelope["delivery_tag"] = method.delivery_tag
+            envelope["redelivered"] = method.redelivered
+            messages.append(envelope)
+
+        return {
+            "ok": True,
+            "queue": queue,
+            "lease": lease.id,
+            "expires_in": ttl or self.leases.lease_ttl,
+            "delivery_tags": list(lease.tags),
+            "count": len(messages),
+            "messages": messages
+        }
+
+    def settle_lease(self, lease_id, action="ack"):
+        """ack | nack (→ DLQ) | requeue every message of a lease."""
+        queue = self.leases.queue_of(lease_id)
+        count = self.leases.settle(lease_id, action)
+        if action == "requeue":
+            self.depth.adjust(queue, count)
+        return count
+
+    # ============================================================
+    # 8d) STREAM READ (x-queue-type=stream, by offset)
+    # ============================================================
+    def read_stream(self, queue, offset="first", max_messages=1000, prefetch=None, wait=1.0):
+        """
+        Non-destructive read of a stream queue: up to `max_messages` from
+        `offset` (first | last | next | n | ISO time | interval like 30m).
+        Pass the returned next_offset back to continue where this one ended.
+        """
+        self.breaker.check()
+        try:
+            deliveries, next_offset = self.streams.read(
+                queue, offset, max_messages, prefetch=prefetch, wait=wait,
+                timeout=self.command_timeout)
+        except pika.exceptions.AMQPConnectionError as e:
+            self._guard_broker(e)
+
+        self.metrics.inc("consumed", len(deliveries))
+        messages = []
+        for position, method, props, body in deliveries:
+            envelope = message_envelope(queue, method, props, body, self.codec)
+            envelope["offset"] = position
+            messages.append(envelope)
+
+        return {
+            "ok": True,
+            "queue": queue,
+            **self.streams.describe(deliveries, next_offset, offset),
+            "count": len(messages),
+            "messages": messages
+        }
+
+    # ============================================================
+    # 8e) RAW BASIC_GET on the shared channel (owner thread)
+    # ============================================================
+    def basic_get(self, queue, auto_ack=True):
+        """(method, props, body) — method is None when the queue is empty."""
+        def get():
+            with self.instruments.timer("basic_get", queue=queue):
+                return self.channel.basic_get(queue=queue, auto_ack=auto_ack)
+        return self._safe(get)
+
     # ============================================================
     # 9) ACK
     # ============================================================
     def ack(self, tag):
+        # Tags handed out by consume_batch live on the lease channel
+        if self.leases.ack_tag(tag):
+            return True
         return self._safe(lambda: self._ack(tag))
 
     def _ack(self, tag):
@@ -441,13 +950,39 @@ class AmqpClient:
     # 10) DLQ INSPECTOR — Level 5 bonus
     # ============================================================
     def peek_dlq(self, q):
+        """
+        Head of <q>.DLQ, left in place: get + nack(requeue) in one owner-
+        thread call, so nothing stays unacked on the shared channel.
+        Browsing beyond the head → snapshots.
+        """
         dlq = f"{q}.DLQ"
-        method, props, body = self.channel.basic_get(queue=dlq, auto_ack=False)
+
+        def peek():
+            method, props, body = self.channel.basic_get(queue=dlq, auto_ack=False)
+            if method is not None:
+                self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return method, props, body
+
+        method, props, body = self._safe(peek)
         if method is None:
             return None
 
+        message, _ = self.codec.text(body, props)
         return {
-            "tag": method.delivery_tag,
-            "body": body.decode("utf-8")
+            "body": message,
+            "reason": death_reason(props),
+            "headers": props.headers,
+            "message_count": method.message_count
         }
 
+
+    # ============================================================
+    # 11) REALTIME PUSH + METRICS
+    # ============================================================
+    def _push(self, queue, payload):
+        with self.instruments.timer("push_event", queue=queue):
+            push_event("amqpMessage", payload)
+
+    def prometheus(self):
+        """Stage histograms + counters in Prometheus text format."""
+        return self.instruments.render(self.metrics)
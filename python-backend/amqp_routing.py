@@ -0,0 +1,237 @@
+import os
+import threading
+from collections import OrderedDict
+
+from amqp_metrics import Counters
+
+# (exchange, routing_key) → queues results kept; any bind change clears them
+AMQP_ROUTE_CACHE_SIZE = int(os.environ.get("AMQP_ROUTE_CACHE_SIZE", "10000"))
+
+EXCHANGE_TYPES = ("direct", "topic", "fanout", "headers")
+
+
+class _Node:
+    """One word position of the topic trie."""
+
+    __slots__ = ("words", "star", "hash", "queues")
+
+    def __init__(self):
+        self.words = {}         # literal word → _Node
+        self.star = None        # "*": exactly one word
+        self.hash = None        # "#": zero or more words
+        self.queues = set()     # bindings whose pattern ends here
+
+    def child(self, word):
+        if word == "*":
+            return self.star
+        if word == "#":
+            return self.hash
+        return self.words.get(word)
+
+    def empty(self):
+        return not (self.words or self.star or self.hash or self.queues)
+
+
+class _Exchange:
+
+    __slots__ = ("type", "bindings", "direct", "trie")
+
+    def __init__(self, exchange_type):
+        self.type = exchange_type
+        self.bindings = set()   # (queue, routing_key) — source of truth
+        self.direct = {}        # routing_key → {queue}  (direct)
+        self.trie = _Node()     # compiled patterns       (topic)
+
+    def add(self, queue, routing_key):
+        if (queue, routing_key) in self.bindings:
+            return
+        self.bindings.add((queue, routing_key))
+        self.direct.setdefault(routing_key, set()).add(queue)
+
+        node = self.trie
+        for word in routing_key.split("."):
+            nxt = node.child(word)
+            if nxt is None:
+                nxt = _Node()
+                if word == "*":
+                    node.star = nxt
+                elif word == "#":
+                    node.hash = nxt
+                else:
+                    node.words[word] = nxt
+            node = nxt
+        node.queues.add(queue)
+
+    def remove(self, queue, routing_key):
+        if (queue, routing_key) not in self.bindings:
+            return
+        self.bindings.discard((queue, routing_key))
+        queues = self.direct.get(routing_key)
+        queues.discard(queue)
+        if not queues:
+            del self.direct[routing_key]
+        self._prune(self.trie, routing_key.split("."), 0, queue)
+
+    def _prune(self, node, words, i, queue):
+        """Drop `queue` at the end of `words`; → True when `node` became empty."""
+        if i == len(words):
+            node.queues.discard(queue)
+            return node.empty()
+        word = words[i]
+        nxt = node.child(word)
+        if nxt is not None and self._prune(nxt, words, i + 1, queue):
+            if word == "*":
+                node.star = None
+            elif word == "#":
+                node.hash = None
+            else:
+                del node.words[word]
+        return node.empty()
+
+    def match(self, routing_key):
+        if self.type == "fanout":
+            return {queue for queue, _key in self.bindings}
+        if self.type == "topic":
+            return self._match_topic(routing_key.split("."))
+        return set(self.direct.get(routing_key, ()))
+
+    def _match_topic(self, words):
+        # Iterative walk; (node, position) pairs already visited are
+        # skipped, so patterns like "#.#.x" stay linear in the key length
+        # instead of branching once per "#".
+        n = len(words)
+        out = set()
+        seen = set()
+        stack = [(self.trie, 0)]
+        while stack:
+            node, i = stack.pop()
+            if (id(node), i) in seen:
+                continue
+            seen.add((id(node), i))
+
+            if node.hash is not None:
+                stack.extend((node.hash, j) for j in range(i, n + 1))
+            if i == n:
+                out |= node.queues
+                continue
+            nxt = node.words.get(words[i])
+            if nxt is not None:
+                stack.append((nxt, i + 1))
+            if node.star is not None:
+                stack.append((node.star, i + 1))
+        return out
+
+
+# ============================================================
+# BINDING INDEX — which queues a publish lands in, computed locally
+# ============================================================
+# The queueCount push after a publish needs the target queue(s). The
+# old `binding_map` (routing_key → one queue) broke as soon as a key
+# had two bindings, and knew nothing about topic / fanout exchanges.
+#
+# Every bind() that reaches the broker is recorded here, per exchange:
+#
+#   direct  routing_key → {queues}                     dict lookup
+#   fanout  every bound queue                          (key ignored)
+#   topic   patterns compiled into a word trie with "*" / "#" edges;
+#           a match walks one path per literal word instead of testing
+#           every pattern, so 50k bindings cost about what 50 do
+#
+# Results are cached per (exchange, routing_key) — a publish burst on
+# the same keys is a dict hit. Any bind change clears the cache.
+#
+# Only what this process bound is known. An exchange it never bound
+# falls back to the old convention "queue named like the routing key",
+# same as the default exchange; a headers exchange cannot be evaluated
+# from the routing key and routes to nothing here.
+class BindingIndex:
+
+    def __init__(self, cache_size=AMQP_ROUTE_CACHE_SIZE, metrics=None):
+        self.cache_size = cache_size
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("route_hits", "route_misses"):
+            self.metrics.setdefault(key, 0)
+
+        self._exchanges = {}            # name → _Exchange
+        self._types = {}                # name → declared type (bound or not)
+        self._cache = OrderedDict()     # (exchange, routing_key) → (queues, ...)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # record
+    # ------------------------------------------------------------
+    def set_type(self, exchange, exchange_type):
+        with self._lock:
+            self._types[exchange] = exchange_type
+            ex = self._exchanges.get(exchange)
+            if ex is not None and ex.type != exchange_type:
+                # only possible after a delete + re-declare on the broker
+                ex.type = exchange_type
+                self._cache.clear()
+
+    def exchange_type(self, exchange, default="direct"):
+        return self._types.get(exchange, default)
+
+    def add(self, queue, exchange, routing_key):
+        with self._lock:
+            ex = self._exchanges.get(exchange)
+            if ex is None:
+                ex = self._exchanges[exchange] = _Exchange(self._types.get(exchange, "direct"))
+            ex.add(queue, routing_key)
+            self._cache.clear()
+
+    def remove(self, queue, exchange, routing_key):
+        with self._lock:
+            ex = self._exchanges.get(exchange)
+            if ex is None:
+                return
+            ex.remove(queue, routing_key)
+            if not ex.bindings:
+                del self._exchanges[exchange]
+            self._cache.clear()
+
+    # ------------------------------------------------------------
+    # lookup
+    # ------------------------------------------------------------
+    def route(self, exchange, routing_key):
+        """Queues a publish to (exchange, routing_key) reaches, as a sorted tuple."""
+        routing_key = routing_key or ""
+        key = (exchange, routing_key)
+        with self._lock:
+            queues = self._cache.get(key)
+            if queues is not None:
+                self._cache.move_to_end(key)
+                self.metrics.inc("route_hits")
+                return queues
+
+            ex = self._exchanges.get(exchange)
+            if ex is None:
+                # default exchange, or nothing bound by us: legacy convention
+                queues = () if self._types.get(exchange) == "headers" else (routing_key,)
+            elif ex.type == "headers":
+                queues = ()
+            else:
+                queues = tuple(sorted(ex.match(routing_key)))
+
+            self._cache[key] = queues
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self.metrics.inc("route_misses")
+        return queues
+
+    def bindings(self, exchange=None):
+        with self._lock:
+            return [
+                {"queue": queue, "exchange": name, "routing_key": key, "type": ex.type}
+                for name, ex in self._exchanges.items() if exchange in (None, name)
+                for queue, key in sorted(ex.bindings)
+            ]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "exchanges": len(self._exchanges),
+                "bindings": sum(len(ex.bindings) for ex in self._exchanges.values()),
+                "cached_routes": len(self._cache)
+            }
@@ -0,0 +1,275 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime, timezone
+
+import pika
+
+from amqp_metrics import Counters, Instruments
+from amqp_pool import ChannelPool
+
+# Retention of streams declared without explicit limits ("" / 0 → none);
+# whichever limit is hit first drops whole segments from the head
+AMQP_STREAM_MAX_AGE = os.environ.get("AMQP_STREAM_MAX_AGE", "7D")
+AMQP_STREAM_MAX_LENGTH_BYTES = int(os.environ.get("AMQP_STREAM_MAX_LENGTH_BYTES", str(20 * 1024 ** 3)))
+AMQP_STREAM_SEGMENT_BYTES = int(os.environ.get("AMQP_STREAM_SEGMENT_BYTES", str(100 * 1024 ** 2)))
+# Credit per read: the broker sends this many messages before the first ack
+AMQP_STREAM_PREFETCH = int(os.environ.get("AMQP_STREAM_PREFETCH", "1000"))
+# Reader connections per process (= concurrent reads)
+AMQP_STREAM_READERS = int(os.environ.get("AMQP_STREAM_READERS", "2"))
+# No delivery for this long mid-read → caught up with the tail, return
+AMQP_STREAM_IDLE_S = float(os.environ.get("AMQP_STREAM_IDLE_S", "0.25"))
+
+QUEUE_TYPES = ("classic", "quorum", "stream")
+OFFSET_SPECS = ("first", "last", "next")
+
+# x-max-age and relative x-stream-offset: <n><Y|M|D|h|m|s>
+_INTERVAL = re.compile(r"^\d+[YMDhms]$")
+
+
+class StreamNotFound(Exception):
+    """The stream queue does not exist on the broker."""
+
+
+class NotAStream(ValueError):
+    """The queue exists but is not an x-queue-type=stream queue."""
+
+
+def stream_args(max_age=None, max_length_bytes=None, max_segment_size_bytes=None):
+    """
+    queue_declare arguments of a stream. None → the AMQP_STREAM_* default,
+    "" / 0 → no such limit. Streams take no dead-lettering arguments.
+    """
+    max_age = AMQP_STREAM_MAX_AGE if max_age is None else max_age
+    max_length_bytes = AMQP_STREAM_MAX_LENGTH_BYTES if max_length_bytes is None else max_length_bytes
+    if max_segment_size_bytes is None:
+        max_segment_size_bytes = AMQP_STREAM_SEGMENT_BYTES
+
+    args = {"x-queue-type": "stream"}
+    if max_age:
+        if not _INTERVAL.match(str(max_age)):
+            raise ValueError(f"max_age must look like 7D, 12h or 30m, got {max_age!r}")
+        args["x-max-age"] = str(max_age)
+    if max_length_bytes:
+        args["x-max-length-bytes"] = int(max_length_bytes)
+    if max_segment_size_bytes:
+        args["x-stream-max-segment-size-bytes"] = int(max_segment_size_bytes)
+    return args
+
+
+def parse_offset(value):
+    """
+    x-stream-offset of a read:
+
+        "first" | "last" | "next"       named positions
+        42 / "42"                       absolute offset
+        "2026-10-17T08:00:00Z"          first chunk at / after that time
+        datetime                        same
+        "30m", "1D"                     relative to now
+    """
+    if value is None or value == "":
+        return "first"
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, bool):
+        raise ValueError(f"invalid stream offset {value!r}")
+    if isinstance(value, int):
+        if value < 0:
+            raise ValueError("stream offset must be >= 0")
+        return value
+
+    value = str(value).strip()
+    if value in OFFSET_SPECS or _INTERVAL.match(value):
+        return value
+    if value.isdigit():
+        return int(value)
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"invalid stream offset {value!r} (first | last | next | "
+                         f"<offset> | <ISO-8601 time> | <interval like 30m>)") from None
+    # pika encodes the table value as an AMQP timestamp (UTC seconds)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _offset_json(offset):
+    return offset.isoformat() if isinstance(offset, datetime) else offset
+
+
+# ============================================================
+# STREAM QUEUES — append-only logs, read by offset
+# ============================================================
+# A stream keeps every message until retention (max-age /
+# max-length-bytes) drops its oldest segments; consuming does not remove
+# anything. Any number of readers can therefore replay the same history,
+# each from its own position, without a classic queue per reader and
+# without basic_get draining it for everybody else.
+#
+# A read is one short basic_consume on a pooled reader connection:
+#
+#   basic_qos(prefetch)                 streams require manual ack + credit;
+#                                       a large prefetch lets the broker
+#                                       push whole chunks at once
+#   basic_consume(x-stream-offset=...)  first | last | next | n | time
+#   ...deliveries until max_messages, or the tail went quiet for
+#      AMQP_STREAM_IDLE_S; acks (credit only) every prefetch/2
+#   basic_cancel                        the channel goes back to the pool
+#
+# Every delivery carries its offset in the x-stream-offset header; a
+# read returns next_offset = last + 1 so callers page through the
+# stream (or resume after a restart) by passing it back.
+#
+# Declared streams are remembered here: their queue arguments differ
+# from the classic / quorum ones (no DLX, x-queue-type=stream), and
+# every later declare of the same name must repeat them exactly.
+class StreamQueues:
+
+    def __init__(self, params_factory, size=AMQP_STREAM_READERS,
+                 prefetch=AMQP_STREAM_PREFETCH, idle=AMQP_STREAM_IDLE_S,
+                 checkout_timeout=5.0, metrics=None, instruments=None):
+        self.prefetch = prefetch
+        self.idle = idle
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("stream_reads", "stream_messages_read", "stream_skipped"):
+            self.metrics.setdefault(key, 0)
+        self.instruments = instruments or Instruments()
+
+        self.pool = ChannelPool(
+            params_factory,
+            size=size,
+            checkout_timeout=checkout_timeout,
+            metrics=self.metrics,
+            name="stream"
+        )
+
+        self._streams = {}          # name → queue_declare arguments
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # declarations
+    # ------------------------------------------------------------
+    def register(self, name, max_age=None, max_length_bytes=None, max_segment_size_bytes=None):
+        """Remember `name` as a stream; → its queue_declare arguments."""
+        args = stream_args(max_age, max_length_bytes, max_segment_size_bytes)
+        with self._lock:
+            self._streams[name] = args
+        return args
+
+    def forget(self, name):
+        with self._lock:
+            self._streams.pop(name, None)
+
+    def args(self, name):
+        """Stream arguments of `name`, or None when it is not a known stream."""
+        with self._lock:
+            args = self._streams.get(name)
+        return dict(args) if args is not None else None
+
+    def is_stream(self, name):
+        with self._lock:
+            return name in self._streams
+
+    # ------------------------------------------------------------
+    # read
+    # ------------------------------------------------------------
+    def read(self, queue, offset="first", max_messages=1000, prefetch=None,
+             wait=1.0, timeout=10.0):
+        """
+        Up to `max_messages` deliveries of `queue` from `offset` on.
+
+        wait     seconds to wait for the first delivery (long poll at "next")
+        timeout  hard cap on the whole read
+
+        → (deliveries, next_offset); deliveries are
+          (offset, method, props, body), next_offset is None when nothing
+          was read.
+        """
+        offset = parse_offset(offset)
+        prefetch = max(1, min(int(prefetch or self.prefetch), 65535))
+        max_messages = max(1, int(max_messages))
+
+        kept = []
+        state = {"last_tag": 0, "foreign": False}
+
+        def on_message(_ch, method, props, body):
+            state["last_tag"] = method.delivery_tag
+            position = (props.headers or {}).get("x-stream-offset")
+            if position is None:
+                state["foreign"] = True
+                return
+            # delivery starts at the chunk holding `offset`: skip its head
+            if isinstance(offset, int) and position < offset:
+                self.metrics.inc("stream_skipped")
+                return
+            kept.append((position, method, props, body))
+
+        try:
+            with self.instruments.timer("stream_read", queue=queue), self.pool.slot() as slot:
+                ch, conn = slot.channel, slot.connection
+                ch.basic_qos(prefetch_count=prefetch)
+                tag = ch.basic_consume(queue, on_message, auto_ack=False,
+                                       arguments={"x-stream-offset": offset})
+                try:
+                    acked = self._pump(conn, ch, kept, state, max_messages, prefetch,
+                                       wait, timeout)
+                    if state["foreign"]:
+                        # a classic / quorum queue: hand everything back
+                        ch.basic_nack(delivery_tag=0, multiple=True, requeue=True)
+                        raise NotAStream(f"queue '{queue}' is not a stream")
+                    if state["last_tag"] > acked:
+                        ch.basic_ack(delivery_tag=state["last_tag"], multiple=True)
+                finally:
+                    if ch.is_open:
+                        ch.basic_cancel(tag)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code == 404:
+                raise StreamNotFound(f"stream '{queue}' not found") from None
+            raise
+
+        deliveries = kept[:max_messages]
+        self.metrics.inc("stream_reads")
+        self.metrics.inc("stream_messages_read", len(deliveries))
+        next_offset = deliveries[-1][0] + 1 if deliveries else None
+        return deliveries, next_offset
+
+    def _pump(self, conn, ch, kept, state, max_messages, prefetch, wait, timeout):
+        started = last = time.monotonic()
+        acked = 0
+        while len(kept) < max_messages and not state["foreign"]:
+            now = time.monotonic()
+            # first delivery may take `wait`; after that a quiet gap ends the read
+            until = min(started + wait if not kept else last + self.idle, started + timeout)
+            if now >= until:
+                break
+            before = state["last_tag"]
+            conn.process_data_events(time_limit=until - now)
+            if state["last_tag"] != before:
+                last = time.monotonic()
+            # acks are credit only (nothing is removed): keep the broker sending
+            if not state["foreign"] and state["last_tag"] - acked >= max(1, prefetch // 2):
+                ch.basic_ack(delivery_tag=state["last_tag"], multiple=True)
+                acked = state["last_tag"]
+        return acked
+
+    def describe(self, deliveries, next_offset, offset):
+        """Page metadata of a read (first / last / next offset)."""
+        return {
+            "offset": _offset_json(parse_offset(offset)),
+            "first_offset": deliveries[0][0] if deliveries else None,
+            "last_offset": deliveries[-1][0] if deliveries else None,
+            "next_offset": next_offset
+        }
+
+    def snapshot(self):
+        with self._lock:
+            streams = {name: dict(args) for name, args in self._streams.items()}
+        return {
+            "streams": streams,
+            "reads": self.metrics.get("stream_reads", 0),
+            "messages_read": self.metrics.get("stream_messages_read", 0)
+        }
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,125 @@
+import time
+import random
+import threading
+
+from amqp_metrics import Counters
+
+
+class BrokerUnavailable(Exception):
+    """Broker connection is down; the caller should answer 503 right away."""
+
+    def __init__(self, message="AMQP broker unavailable", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+#   closed → requests go to the broker
+#   open   → requests fail fast with BrokerUnavailable (no connect, no
+#            sleep in the request thread); only the supervisor may close it
+class CircuitBreaker:
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else Counters()
+        self.metrics.setdefault("breaker_state", "closed")
+        self.metrics.setdefault("breaker_trips", 0)
+        self.metrics.setdefault("breaker_fast_fails", 0)
+
+        self._open = False
+        self._opened_at = None
+        self._reason = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def check(self):
+        if self._open:
+            self.metrics.inc("breaker_fast_fails")
+            down_for = time.monotonic() - (self._opened_at or time.monotonic())
+            raise BrokerUnavailable(
+                f"AMQP broker unavailable for {down_for:.1f}s: {self._reason}")
+
+    def trip(self, reason):
+        with self._lock:
+            if self._open:
+                return False
+            self._open = True
+            self._opened_at = time.monotonic()
+            self._reason = repr(reason)
+            self.metrics["breaker_state"] = "open"
+            self.metrics.inc("breaker_trips")
+        print(f"[AMQP] Circuit OPEN: {reason!r}")
+        return True
+
+    def close(self):
+        with self._lock:
+            if not self._open:
+                return
+            down_for = time.monotonic() - self._opened_at
+            self._open = False
+            self._reason = None
+            self.metrics["breaker_state"] = "closed"
+        print(f"[AMQP] Circuit CLOSED after {down_for:.1f}s")
+
+
+# ============================================================
+# RECONNECTION SUPERVISOR
+# ============================================================
+# One background thread owns reconnection. Request threads that hit a
+# connection-level error only call `connection_lost()`; they never sleep
+# or reconnect themselves, so a broker blip cannot turn into N threads
+# racing through connect-with-retries.
+#
+# Backoff is exponential with full jitter: sleep U(0, min(cap, base·2^n)).
+class ConnectionSupervisor:
+
+    def __init__(self, connect, breaker, base=0.5, cap=15.0, metrics=None):
+        self.connect = connect          # raises on failure
+        self.breaker = breaker
+        self.base = base
+        self.cap = cap
+
+        self.metrics = metrics if metrics is not None else Counters()
+        self.metrics.setdefault("reconnect_attempts", 0)
+
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def connection_lost(self, reason):
+        self.breaker.trip(reason)
+        self._ensure_started()
+        self._wake.set()
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="amqp-supervisor", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            attempt = 0
+
+            while True:
+                attempt += 1
+                self.metrics.inc("reconnect_attempts")
+                try:
+                    self.connect()
+                    break
+                except Exception as e:
+                    delay = random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+                    print(f"[AMQP] Reconnect #{attempt} failed ({e!r}) — next in {delay:.2f}s")
+                    time.sleep(delay)
+
+            self._wake.clear()
+            self.breaker.close()
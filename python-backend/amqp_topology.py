@@ -0,0 +1,158 @@
+import re
+import threading
+
+import pika
+
+from amqp_metrics import Counters
+
+NOT_FOUND = 404
+PRECONDITION_FAILED = 406
+
+# "NOT_FOUND - no queue 'orders' in vhost '/'"
+_NOT_FOUND_RE = re.compile(r"no (queue|exchange) '([^']*)'")
+
+
+# ============================================================
+# TOPOLOGY REGISTRY — what we already declared, with which arguments
+# ============================================================
+# Declares are idempotent but each one is a synchronous broker
+# round-trip. publish() used to declare its exchange per message and
+# bind()/consume_one() re-declared DLX + DLQ + queue every call.
+#
+# The registry remembers exchanges / queues / bindings that are known to
+# exist with given arguments and lets repeat declares be skipped. It is
+# wiped whenever a channel is closed under us (something may have been
+# deleted) or the broker answers PRECONDITION_FAILED (406: our idea of
+# the arguments is wrong — see the "LƯU Ý VÀNG" note in amqp_raw.py).
+# A 404 naming one queue/exchange only drops that entry.
+class TopologyRegistry:
+
+    def __init__(self, metrics=None, instruments=None):
+        self.metrics = metrics if metrics is not None else Counters()
+        self.instruments = instruments
+        for key in ("declare_sent", "declare_skipped", "topology_invalidated"):
+            self.metrics.setdefault(key, 0)
+
+        self._exchanges = {}    # name → exchange_type
+        self._queues = {}       # name → frozen arguments
+        self._bindings = set()  # (queue, exchange, routing_key)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _freeze(arguments):
+        return tuple(sorted((arguments or {}).items()))
+
+    # ------------------------------------------------------------
+    # check / record (also used by the async client)
+    # ------------------------------------------------------------
+    def has_exchange(self, name, exchange_type):
+        with self._lock:
+            hit = self._exchanges.get(name) == exchange_type
+        self._count(hit)
+        return hit
+
+    def add_exchange(self, name, exchange_type):
+        with self._lock:
+            self._exchanges[name] = exchange_type
+
+    def has_queue(self, name, arguments=None):
+        with self._lock:
+            hit = self._queues.get(name) == self._freeze(arguments)
+        self._count(hit)
+        return hit
+
+    def add_queue(self, name, arguments=None):
+        with self._lock:
+            self._queues[name] = self._freeze(arguments)
+
+    def has_binding(self, queue, exchange, routing_key):
+        with self._lock:
+            hit = (queue, exchange, routing_key) in self._bindings
+        self._count(hit)
+        return hit
+
+    def add_binding(self, queue, exchange, routing_key):
+        with self._lock:
+            self._bindings.add((queue, exchange, routing_key))
+
+    def invalidate(self, reason=None):
+        # We closed it ourselves → nothing changed on the broker
+        if isinstance(reason, (pika.exceptions.ChannelClosedByClient,
+                               pika.exceptions.ConnectionClosedByClient)):
+            return
+
+        # 404 on one entity (typical: passive declare of a missing queue)
+        # only forgets that entity; anything else wipes the whole cache.
+        if isinstance(reason, pika.exceptions.ChannelClosedByBroker) \
+                and reason.reply_code == NOT_FOUND:
+            m = _NOT_FOUND_RE.search(reason.reply_text or "")
+            if m:
+                self.forget(m.group(1), m.group(2))
+                return
+
+        with self._lock:
+            if not (self._exchanges or self._queues or self._bindings):
+                return
+            self._exchanges.clear()
+            self._queues.clear()
+            self._bindings.clear()
+        self.metrics.inc("topology_invalidated")
+        print(f"[AMQP] Topology cache invalidated ({reason!r})")
+
+    def forget(self, kind, name):
+        with self._lock:
+            if kind == "queue":
+                self._queues.pop(name, None)
+                self._bindings = {b for b in self._bindings if b[0] != name}
+            else:
+                self._exchanges.pop(name, None)
+                self._bindings = {b for b in self._bindings if b[1] != name}
+
+    def _count(self, hit):
+        self.metrics.inc("declare_skipped" if hit else "declare_sent")
+
+    # ------------------------------------------------------------
+    # sync helpers for BlockingChannel
+    # ------------------------------------------------------------
+    def _guard(self, fn, exchange=None, queue=None):
+        try:
+            if self.instruments:
+                with self.instruments.timer("declare", exchange=exchange, queue=queue):
+                    return fn()
+            return fn()
+        except pika.exceptions.ChannelClosedByBroker as e:
+            # 406 → wipe everything, 404 → forget that one entity
+            self.invalidate(e)
+            raise
+
+    def ensure_exchange(self, ch, name, exchange_type="direct", force=False):
+        if not force and self.has_exchange(name, exchange_type):
+            return
+        self._guard(lambda: ch.exchange_declare(
+            exchange=name,
+            exchange_type=exchange_type,
+            durable=True
+        ), exchange=name)
+        self.add_exchange(name, exchange_type)
+
+    def ensure_queue(self, ch, name, arguments=None, force=False):
+        """Returns the Declare-Ok frame, or None when the declare was skipped."""
+        if not force and self.has_queue(name, arguments):
+            return None
+        frame = self._guard(lambda: ch.queue_declare(
+            queue=name,
+            durable=True,
+            arguments=arguments
+        ), queue=name)
+        self.add_queue(name, arguments)
+        return frame
+
+    def ensure_binding(self, ch, queue, exchange, routing_key, force=False):
+        if not force and self.has_binding(queue, exchange, routing_key):
+            return
+        self._guard(lambda: ch.queue_bind(
+            exchange=exchange,
+            queue=queue,
+            routing_key=routing_key
+        ), exchange=exchange, queue=queue)
+        self.add_binding(queue, exchange, routing_key)
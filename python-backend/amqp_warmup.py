@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import threading
+
+# Topology declared on every (re)connect, before /ready turns true.
+# A path to a JSON file, or the JSON itself:
+#
+#   {"exchanges": [{"name": "orders", "type": "topic"}],
+#    "queues":    ["orders.created", {"name": "audit"},
+#                  {"name": "events", "type": "stream", "maxAge": "7D",
+#                   "maxLengthBytes": 10000000000}],
+#    "bindings":  [{"queue": "orders.created", "exchange": "orders",
+#                   "routingKey": "order.created"}]}
+AMQP_WARMUP_TOPOLOGY = os.environ.get("AMQP_WARMUP_TOPOLOGY")
+# Open the publish / confirm pool connections during warm-up too
+AMQP_WARMUP_POOLS = os.environ.get("AMQP_WARMUP_POOLS", "1") == "1"
+
+
+def load_topology(source=AMQP_WARMUP_TOPOLOGY):
+    """→ {"exchanges": [...], "queues": [...], "bindings": [...], "streams": {...}} (normalised)."""
+    topology = {"exchanges": [], "queues": [], "bindings": [], "streams": {}}
+    if not source:
+        return topology
+
+    try:
+        if source.lstrip().startswith("{"):
+            raw = json.loads(source)
+        else:
+            with open(source) as f:
+                raw = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[AMQP] Warm-up topology unreadable ({e!r}) — skipping it")
+        return topology
+
+    for ex in raw.get("exchanges", []):
+        ex = {"name": ex} if isinstance(ex, str) else ex
+        topology["exchanges"].append({"name": ex["name"], "type": ex.get("type", "direct")})
+    for q in raw.get("queues", []):
+        q = {"name": q} if isinstance(q, str) else q
+        topology["queues"].append(q["name"])
+        if q.get("type") == "stream":
+            # name → retention, registered before the queue is declared
+            topology["streams"][q["name"]] = {
+                "max_age": q.get("maxAge"),
+                "max_length_bytes": q.get("maxLengthBytes"),
+                "max_segment_size_bytes": q.get("maxSegmentSizeBytes")
+            }
+    for b in raw.get("bindings", []):
+        topology["bindings"].append({
+            "queue": b["queue"],
+            "exchange": b["exchange"],
+            "routing_key": b.get("routingKey", b.get("routing_key", b["queue"]))
+        })
+    return topology
+
+
+# ============================================================
+# READINESS — what /ready reports
+# ============================================================
+# Liveness (/health) only says the process serves HTTP. Readiness means
+# the broker connection is up, the circuit is closed and the last
+# warm-up (topology + pooled channels) finished. Warm-up re-runs after
+# every reconnect, so an instance drops out of the load balancer while
+# it re-declares and comes back once it can actually serve.
+class Readiness:
+
+    def __init__(self):
+        self.state = "starting"     # starting | connecting | warming | ready | degraded
+        self.error = None
+        self.started_at = time.time()
+        self.ready_at = None
+        self.warmups = 0
+        self.last = {}              # steps of the last warm-up
+        self._lock = threading.Lock()
+
+    def set(self, state, error=None):
+        with self._lock:
+            self.state = state
+            self.error = error
+            if state in ("ready", "degraded") and self.ready_at is None:
+                self.ready_at = time.time()
+
+    def finished(self, steps, errors):
+        with self._lock:
+            self.warmups += 1
+            self.last = steps
+        # a failed declare is reported, but does not keep us out of rotation
+        self.set("ready" if not errors else "degraded", "; ".join(errors) or None)
+
+    def snapshot(self, connected, breaker_state):
+        with self._lock:
+            warm = self.state in ("ready", "degraded")
+            return {
+                "ready": bool(connected and warm and breaker_state != "open"),
+                "connected": bool(connected),
+                "breaker": breaker_state,
+                "state": self.state,
+                "error": self.error,
+                "warmups": self.warmups,
+                "last_warmup": dict(self.last),
+                "startup_s": round(self.ready_at - self.started_at, 3) if self.ready_at else None
+            }
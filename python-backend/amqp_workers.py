@@ -0,0 +1,468 @@
+import os
+import time
+import queue
+import random
+import importlib
+import threading
+import multiprocessing
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pika
+
+from amqp_codec import default_codec
+from amqp_http import properties_dict
+from amqp_metrics import Counters
+
+# "orders=handlers.orders:handle,audit=handlers.audit:handle"
+AMQP_WORKER_HANDLERS = os.environ.get("AMQP_WORKER_HANDLERS", "")
+AMQP_WORKER_EXECUTOR = os.environ.get("AMQP_WORKER_EXECUTOR", "thread")      # thread | process
+AMQP_WORKER_CONCURRENCY = int(os.environ.get("AMQP_WORKER_CONCURRENCY", "0"))  # 0 → 16 threads / 1 process per core
+AMQP_WORKER_PREFETCH = int(os.environ.get("AMQP_WORKER_PREFETCH", "64"))
+AMQP_WORKER_ACK_BATCH = int(os.environ.get("AMQP_WORKER_ACK_BATCH", "32"))
+AMQP_WORKER_ACK_INTERVAL_MS = float(os.environ.get("AMQP_WORKER_ACK_INTERVAL_MS", "20"))
+
+
+class Delivery:
+    """What a handler receives. Plain data only, so it pickles into a process pool."""
+
+    __slots__ = ("queue", "exchange", "routing_key", "redelivered", "properties", "body", "payload")
+
+    def __init__(self, queue, exchange, routing_key, redelivered, properties, body, payload):
+        self.queue = queue
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.redelivered = redelivered
+        self.properties = properties    # dict (properties_dict)
+        self.body = body                # bytes, content_encoding undone
+        self.payload = payload          # codec.decode(): dict / list / str / bytes
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+def resolve_handler(ref):
+    """"package.module:function" → the function (importable → picklable)."""
+    module, _, name = ref.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def parse_handlers(spec=AMQP_WORKER_HANDLERS):
+    """AMQP_WORKER_HANDLERS → {queue: "module:function"}."""
+    handlers = {}
+    for part in spec.split(","):
+        queue_name, _, ref = part.strip().partition("=")
+        if queue_name and ref:
+            handlers[queue_name.strip()] = ref.strip()
+    return handlers
+
+
+def _invoke(handler, delivery):
+    # module level: this is what a process-pool worker unpickles and runs
+    return handler(delivery)
+
+
+# ============================================================
+# CONSUMER POOL — basic_consume + thread / process pool + batched acks
+# ============================================================
+# One consumer thread owns one connection + channel (pika is not
+# thread-safe) and never runs handler code itself:
+#
+#   broker ──deliver──▶ consumer thread ──submit──▶ executor (N workers)
+#                             ▲                         │
+#                             └──── completions ◀───────┘
+#                       ack / nack on the channel, in batches
+#
+# Backpressure is the broker's: basic_qos(prefetch) per consumer caps
+# how many deliveries a queue can have in flight, so a slow handler
+# stops its queue from being pushed instead of growing a local backlog.
+#
+# Acks: delivery tags increase per channel, so once the oldest
+# outstanding tags have all succeeded they are settled with ONE
+# basic_ack(multiple=True). Successes stuck behind a slow message are
+# acked one by one at the next flush rather than hold prefetch slots.
+# A handler exception → basic_nack(requeue=False) → <queue>.DLQ via the
+# queue's x-dead-letter-exchange. A crashed process pool → requeue.
+#
+# A queue that does not exist (or refuses the consumer) is skipped and
+# retried every RETRY_SKIPPED_S; the other queues keep consuming.
+class ConsumerPool:
+
+    RETRY_SKIPPED_S = 30.0      # a missing / refused queue is tried again after this
+
+    def __init__(self,
+                 params_factory,
+                 queue_args=None,
+                 codec=None,
+                 executor=AMQP_WORKER_EXECUTOR,
+                 concurrency=AMQP_WORKER_CONCURRENCY,
+                 prefetch=AMQP_WORKER_PREFETCH,
+                 ack_batch=AMQP_WORKER_ACK_BATCH,
+                 ack_interval=AMQP_WORKER_ACK_INTERVAL_MS / 1000.0,
+                 metrics=None,
+                 instruments=None):
+        self.params_factory = params_factory
+        self.queue_args = queue_args    # name → x-arguments (DLX wiring)
+        self.codec = codec or default_codec
+        self.executor_kind = executor
+        self.concurrency = concurrency or (
+            (os.cpu_count() or 1) if executor == "process" else 16)
+        self.prefetch = prefetch
+        self.ack_batch = ack_batch
+        self.ack_interval = ack_interval
+        self.instruments = instruments
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("worker_delivered", "worker_acked", "worker_failed",
+                    "worker_requeued", "worker_ack_frames", "worker_in_flight"):
+            self.metrics.setdefault(key, 0)
+
+        self._handlers = OrderedDict()  # queue → (handler, prefetch)
+        self._queue_stats = {}          # queue → Counters
+        self._skipped = {}              # queue → monotonic time of the next try
+        self._added = queue.SimpleQueue()
+        self._done = queue.SimpleQueue()
+        self._executor = None
+        self._generation = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # registry
+    # ------------------------------------------------------------
+    def register(self, queue_name, handler, prefetch=None):
+        """handler(delivery) → anything; raise to dead-letter the message."""
+        if isinstance(handler, str):
+            handler = resolve_handler(handler)
+        self._handlers[queue_name] = (handler, prefetch or self.prefetch)
+        self._queue_stats.setdefault(queue_name, Counters(
+            {"delivered": 0, "acked": 0, "failed": 0, "requeued": 0, "in_flight": 0}))
+        if self.running:
+            self._added.put(queue_name)
+        return self
+
+    @property
+    def running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    # ------------------------------------------------------------
+    # lifecycle (lazy, and restarted in a forked child)
+    # ------------------------------------------------------------
+    def start(self):
+        if not self._handlers or self.running:
+            return False
+        with self._start_lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            self._executor = self._new_executor()
+            self._thread = threading.Thread(target=self._run, name="amqp-workers", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        print(f"[AMQP] Workers: {len(self._handlers)} queue(s), "
+              f"{self.concurrency} {self.executor_kind} worker(s)")
+        return True
+
+    def stop(self, timeout=10.0):
+        """Cancel consumers, let in-flight handlers finish, flush acks."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _new_executor(self):
+        if self.executor_kind == "process":
+            # spawn: never fork a process that holds pika sockets + threads
+            return ProcessPoolExecutor(self.concurrency,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix="amqp-handler")
+
+    def snapshot(self):
+        return {
+            "running": self.running,
+            "executor": self.executor_kind,
+            "concurrency": self.concurrency,
+            "prefetch": self.prefetch,
+            "skipped": sorted(self._skipped),
+            "queues": {q: dict(s) for q, s in self._queue_stats.items()}
+        }
+
+    # ------------------------------------------------------------
+    # consumer thread
+    # ------------------------------------------------------------
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                self._session()
+                attempt = 0
+            except Exception as e:
+                attempt += 1
+                delay = random.uniform(0, min(15.0, 0.5 * (2 ** attempt)))
+                print(f"[AMQP] Workers: session lost ({e!r}) — reconnect in {delay:.2f}s")
+                self._stop.wait(delay)
+
+    def _session(self):
+        connection = pika.BlockingConnection(self.params_factory())
+        self._generation += 1
+        state = {
+            "generation": self._generation,
+            "channel": connection.channel(),
+            "outstanding": OrderedDict(),   # delivery_tag → queue (ascending)
+            "ok": set(),
+            "consumers": []
+        }
+        try:
+            for queue_name in list(self._handlers):
+                if queue_name not in self._skipped:
+                    self._subscribe(connection, state, queue_name)
+
+            last_flush = time.monotonic()
+            while not self._stop.is_set():
+                connection.process_data_events(time_limit=self.ack_interval)
+                while True:
+                    try:
+                        self._subscribe(connection, state, self._added.get_nowait())
+                    except queue.Empty:
+                        break
+                self._retry_skipped(connection, state)
+
+                self._collect(state)
+                now = time.monotonic()
+                if len(state["ok"]) >= self.ack_batch or \
+                        (state["ok"] and now - last_flush >= self.ack_interval):
+                    self._flush(state)
+                    last_flush = now
+
+            self._drain(connection, state)
+        finally:
+            # whatever is still unacked goes back to its queue
+            self._forget(state)
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+
+    def _subscribe(self, connection, state, queue_name):
+        handler, prefetch = self._handlers[queue_name]
+        if self.queue_args:
+            self._declare(connection, queue_name)
+
+        # A 404 on the shared channel would close it under every other
+        # consumer: check the queue on a throwaway channel first
+        error = self._probe(connection, queue_name)
+        if error is not None:
+            self._skip(queue_name, error)
+            return
+
+        ch = state["channel"]
+        try:
+            ch.basic_qos(prefetch_count=prefetch)     # per consumer (global=False)
+            tag = ch.basic_consume(
+                queue_name,
+                on_message_callback=partial(self._on_message, state, queue_name, handler),
+                auto_ack=False
+            )
+        except pika.exceptions.ChannelClosedByBroker as e:
+            # e.g. exclusive consumer elsewhere: the channel is gone, the
+            # next session reopens it without this queue
+            self._skip(queue_name, e)
+            raise
+        self._skipped.pop(queue_name, None)
+        state["consumers"].append(tag)
+        print(f"[AMQP] Workers: consuming '{queue_name}' (prefetch {prefetch})")
+
+    @staticmethod
+    def _probe(connection, queue_name):
+        ch = connection.channel()
+        try:
+            ch.queue_declare(queue=queue_name, passive=True)
+            return None
+        except pika.exceptions.ChannelClosedByBroker as e:
+            return e
+        finally:
+            if ch.is_open:
+                ch.close()
+
+    def _skip(self, queue_name, reason):
+        self._skipped[queue_name] = time.monotonic() + self.RETRY_SKIPPED_S
+        print(f"[AMQP] Workers: not consuming '{queue_name}' ({reason}) "
+              f"— retry in {self.RETRY_SKIPPED_S:g}s")
+
+    def _retry_skipped(self, connection, state):
+        now = time.monotonic()
+        for queue_name, retry_at in list(self._skipped.items()):
+            if now >= retry_at:
+                self._subscribe(connection, state, queue_name)
+
+    def _declare(self, connection, queue_name):
+        # Throwaway channel: a 406 (queue exists with other args) must not
+        # take the consumer channel down — consume the queue as it is
+        ch = connection.channel()
+        try:
+            args = self.queue_args(queue_name)
+            dlx = args.get("x-dead-letter-exchange")
+            dlq = args.get("x-dead-letter-routing-key")
+            if dlx and dlq:
+                ch.exchange_declare(exchange=dlx, exchange_type="direct", durable=True)
+                ch.queue_declare(queue=dlq, durable=True)
+                ch.queue_bind(queue=dlq, exchange=dlx, routing_key=dlq)
+            ch.queue_declare(queue=queue_name, durable=True, arguments=args)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            print(f"[AMQP] Workers: declare of '{queue_name}' refused ({e}) — consuming as is")
+        finally:
+            if ch.is_open:
+                ch.close()
+
+    # ------------------------------------------------------------
+    # delivery → executor → completion
+    # ------------------------------------------------------------
+    def _on_message(self, state, queue_name, handler, ch, method, props, body):
+        stats = self._queue_stats[queue_name]
+        self.metrics.inc("worker_delivered")
+        stats.inc("delivered")
+        tag = method.delivery_tag
+
+        try:
+            raw = self.codec.decompress(body, props)
+            delivery = Delivery(queue_name, method.exchange, method.routing_key,
+                                method.redelivered, properties_dict(props), raw,
+                                self.codec.decode(body, props))
+        except Exception as e:
+            # undecodable → straight to the DLQ, no handler involved
+            print(f"[AMQP] Workers: cannot decode delivery on '{queue_name}': {e!r}")
+            ch.basic_nack(delivery_tag=tag, requeue=False)
+            self.metrics.inc("worker_failed")
+            stats.inc("failed")
+            return
+
+        started = time.perf_counter()
+        executor = self._executor
+        try:
+            future = executor.submit(_invoke, handler, delivery)
+        except BrokenProcessPool:
+            # pool died since the last completion: requeue, rebuild right here
+            ch.basic_nack(delivery_tag=tag, requeue=True)
+            self.metrics.inc("worker_requeued")
+            stats.inc("requeued")
+            self._replace_executor(executor)
+            return
+
+        state["outstanding"][tag] = queue_name
+        self.metrics.inc("worker_in_flight")
+        stats.inc("in_flight")
+        future.add_done_callback(
+            partial(self._completed, state["generation"], executor, tag, queue_name, started))
+
+    def _replace_executor(self, broken):
+        # outcomes of an already replaced pool must not replace the new one
+        if broken is not self._executor:
+            return
+        print("[AMQP] Workers: process pool broke — starting a new one")
+        self._executor = self._new_executor()
+        broken.shutdown(wait=False)
+
+    def _completed(self, generation, executor, tag, queue_name, started, future):
+        # executor thread: only hand the outcome to the consumer thread
+        error = future.exception() if not future.cancelled() else BrokenProcessPool("cancelled")
+        if error is None:
+            outcome = "ok"
+        elif isinstance(error, BrokenProcessPool):
+            outcome = "retry"
+        else:
+            outcome = "failed"
+            print(f"[AMQP] Workers: handler for '{queue_name}' failed: {error!r}")
+
+        if self.instruments:
+            self.instruments.observe("handle", time.perf_counter() - started,
+                                     queue=queue_name, outcome=outcome)
+        self._done.put((generation, executor, tag, queue_name, outcome))
+
+    def _collect(self, state):
+        ch = state["channel"]
+        broken = set()
+        while True:
+            try:
+                generation, executor, tag, queue_name, outcome = self._done.get_nowait()
+            except queue.Empty:
+                break
+            stats = self._queue_stats[queue_name]
+            self.metrics.inc("worker_in_flight", -1)
+            stats.inc("in_flight", -1)
+            if outcome == "retry":
+                # before the generation check: a pool that broke under the
+                # previous session still has to be replaced
+                broken.add(executor)
+            if generation != state["generation"]:
+                continue        # tag of a closed channel: broker requeued it
+
+            if outcome == "ok":
+                state["ok"].add(tag)
+                continue
+
+            state["outstanding"].pop(tag, None)
+            requeue = outcome == "retry"
+            ch.basic_nack(delivery_tag=tag, requeue=requeue)
+            self.metrics.inc("worker_requeued" if requeue else "worker_failed")
+            stats.inc("requeued" if requeue else "failed")
+
+        if self.executor_kind == "process":
+            for executor in broken:
+                self._replace_executor(executor)
+
+    def _flush(self, state):
+        ch = state["channel"]
+        outstanding, ok = state["outstanding"], state["ok"]
+        acked = {}
+
+        upto = None
+        while outstanding:
+            tag = next(iter(outstanding))
+            if tag not in ok:
+                break
+            queue_name = outstanding.pop(tag)
+            ok.discard(tag)
+            acked[queue_name] = acked.get(queue_name, 0) + 1
+            upto = tag
+        if upto is not None:
+            ch.basic_ack(delivery_tag=upto, multiple=True)
+            self.metrics.inc("worker_ack_frames")
+
+        for tag in sorted(ok):
+            queue_name = outstanding.pop(tag)
+            acked[queue_name] = acked.get(queue_name, 0) + 1
+            ch.basic_ack(delivery_tag=tag)
+            self.metrics.inc("worker_ack_frames")
+        ok.clear()
+
+        for queue_name, n in acked.items():
+            self.metrics.inc("worker_acked", n)
+            self._queue_stats[queue_name].inc("acked", n)
+
+    def _drain(self, connection, state, timeout=10.0):
+        ch = state["channel"]
+        for tag in state["consumers"]:
+            ch.basic_cancel(tag)
+        deadline = time.monotonic() + timeout
+        while state["outstanding"] and time.monotonic() < deadline:
+            connection.process_data_events(time_limit=self.ack_interval)
+            self._collect(state)
+            self._flush(state)
+
+    def _forget(self, state):
+        # in-flight handlers of this channel will report a stale generation
+        lost = len(state["outstanding"])
+        state["outstanding"].clear()
+        state["ok"].clear()
+        if lost > 0:
+            print(f"[AMQP] Workers: {lost} in-flight delivery(ies) requeued by the broker")
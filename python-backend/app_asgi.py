@@ -0,0 +1,734 @@
+import asyncio
+import json
+import os
+
+import requests
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
+
+from amqp_async import AsyncAmqpClient
+from amqp_lease import LeaseNotFound
+from queue_depth import QueueNotFound
+from amqp_supervisor import BrokerUnavailable
+from amqp_flow import RateLimited
+from amqp_streams import StreamNotFound
+from amqp_routing import EXCHANGE_TYPES
+from dlq_replay import ReplayNotFound, replay_options, requeue_options
+from dlq_snapshot import SnapshotNotFound
+from signalr_push import push_stats
+from rabbit_mgmt import ManagementClient, ManagementError, json_etag, etag_matches
+from amqp_http import OCTET_STREAM, wants_raw, properties_from_headers, properties_to_headers
+from prefork import WorkerStats
+
+# ===============================
+# ASGI twin of app_docker.py
+# ===============================
+# Same /api/python-backend/* routes, served from one event loop:
+#
+#   hypercorn app_asgi:app --bind 0.0.0.0:8081
+#
+app = Quart(__name__)
+app = cors(app, allow_origin="*")
+
+# ===============================
+# 1) AMQP CONNECTION
+# ===============================
+RABBIT_HOST = os.getenv("RABBIT_HOST", "rabbitmq")
+RABBIT_PORT = int(os.getenv("RABBIT_PORT", "5672"))
+RABBIT_USER = os.getenv("RABBIT_USER", "guest")
+RABBIT_PASS = os.getenv("RABBIT_PASS", "guest")
+
+# Same defaults as app_docker.py (host comes from the client default)
+amqp = AsyncAmqpClient(use_quorum=False)
+
+# Management API + broker /metrics (pooled session, short TTL cache)
+mgmt = ManagementClient()
+
+
+def local_stats():
+    return {**amqp.metrics, "routing": amqp.routes.snapshot(),
+            "signalr_push": push_stats(), "management": mgmt.stats}
+
+# hypercorn --workers N: every worker imports this module itself
+worker_stats = WorkerStats(local_stats)
+
+
+@app.before_serving
+async def startup():
+    # Bind the port now; connect + warm up in the background (see /ready)
+    app.add_background_task(amqp.start)
+    worker_stats.start()
+
+
+@app.after_serving
+async def shutdown():
+    await amqp.close()
+
+
+@app.errorhandler(BrokerUnavailable)
+async def broker_unavailable(e):
+    # broker blocking publishers, or the outbox backlog is full
+    resp = jsonify({"ok": False, "error": str(e), "retryAfter": e.retry_after})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+
+@app.errorhandler(RateLimited)
+async def rate_limited(e):
+    # AMQP_PUBLISH_LIMITS budget of this exchange / routing key used up
+    resp = jsonify({"ok": False, "error": str(e), "rule": e.rule, "retryAfter": e.retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+
+# ===============================
+# 2) API ROUTES
+# ===============================
+
+@app.route("/api/python-backend/health")
+async def health():
+    # liveness only: the process answers HTTP
+    return jsonify({"status": "ok"})
+
+
+@app.route("/api/python-backend/ready")
+async def ready():
+    # readiness: broker connected, warm-up (topology + channels) finished
+    report = amqp.ready()
+    return jsonify(report), 200 if report["ready"] else 503
+
+
+@app.route("/api/python-backend/declare-exchange", methods=["POST"])
+async def declare_exchange():
+    data = await request.get_json()
+    name = data.get("name")
+    exchange_type = data.get("type", "direct")
+    if exchange_type not in EXCHANGE_TYPES:
+        return jsonify({"ok": False, "error": f"type must be one of {', '.join(EXCHANGE_TYPES)}"}), 400
+    await amqp.declare_exchange(name, exchange_type)
+
+    amqp.push("amqpMessage", {
+        "message": "Exchange declared",
+        "name": name,
+        "type": exchange_type
+    })
+
+    return jsonify({"status": "ok", "exchange": name, "type": exchange_type})
+
+
+@app.route("/api/python-backend/declare-queue", methods=["POST"])
+async def declare_queue():
+    data = await request.get_json()
+    name = data.get("name")
+    queue_type = data.get("type")       # classic | quorum | stream (retention below)
+    try:
+        await amqp.declare_queue(name, queue_type=queue_type,
+                                 max_age=data.get("maxAge"),
+                                 max_length_bytes=data.get("maxLengthBytes"),
+                                 max_segment_size_bytes=data.get("maxSegmentSizeBytes"))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    amqp.push("amqpMessage", {
+        "message": "Queue declared",
+        "name": name,
+        "type": queue_type
+    })
+
+    return jsonify({"status": "ok", "queue": name, "type": queue_type})
+
+
+@app.route("/api/python-backend/bind", methods=["POST"])
+async def bind():
+    data = await request.get_json()
+    queue = data["queue"]
+    exchange = data["exchange"]
+    routing_key = data["routingKey"]
+    exchange_type = data.get("exchangeType")
+    if exchange_type is not None and exchange_type not in EXCHANGE_TYPES:
+        return jsonify({"ok": False, "error": f"exchangeType must be one of {', '.join(EXCHANGE_TYPES)}"}), 400
+    await amqp.bind(queue, exchange, routing_key, exchange_type)
+
+    amqp.push("amqpMessage", {
+        "message": "Routing key bound",
+        "exchange": exchange,
+        "queue": queue,
+        "routing_key": routing_key
+    })
+
+    return jsonify({"status": "ok", "binding": data})
+
+
+@app.route("/api/python-backend/publish", methods=["POST"])
+async def publish():
+    if wants_raw(content_type=request.content_type):
+        return await publish_raw()
+
+    data = await request.get_json()
+    exchange = data["exchange"]
+    routing_key = data["routingKey"]
+    message = data["message"]
+
+    await amqp.publish(exchange, routing_key, message)
+
+    amqp.push("amqpMessage", {
+        "type": "published",
+        "exchange": exchange,
+        "routing_key": routing_key,
+        "message": message
+    })
+
+    return jsonify({
+        "status": "ok",
+        "published": data
+    })
+
+
+@app.route("/api/python-backend/publish-raw", methods=["POST"])
+async def publish_raw():
+    # Body = message bytes, published as-is (no JSON, no codec);
+    # ?exchange=&routingKey=, AMQP properties in X-Amqp-* headers
+    exchange = request.args.get("exchange")
+    routing_key = request.args.get("routingKey")
+    if exchange is None or routing_key is None:
+        return jsonify({"ok": False, "error": "Missing 'exchange' / 'routingKey' query parameter"}), 400
+
+    try:
+        props = properties_from_headers(request.headers)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": f"Bad X-Amqp-* header: {e}"}), 400
+
+    body = await request.get_data(cache=False)
+    await amqp.publish(exchange, routing_key, body, properties=props, encode=False)
+
+    amqp.push("amqpMessage", {
+        "type": "published",
+        "exchange": exchange,
+        "routing_key": routing_key,
+        "bytes": len(body)
+    })
+
+    return Response("", status=204)
+
+
+@app.route("/api/python-backend/publish-batch", methods=["POST"])
+async def publish_batch():
+    data = await request.get_json()
+    exchange = data.get("exchange")
+    messages = data.get("messages") or []
+
+    if not exchange or not isinstance(messages, list):
+        return jsonify({
+            "ok": False,
+            "error": "Body must contain 'exchange' and a 'messages' list"
+        }), 400
+
+    result = await amqp.publish_many(
+        exchange,
+        messages,
+        timeout=float(data.get("timeout", 30))
+    )
+
+    amqp.push("amqpMessage", {
+        "type": "publishedBatch",
+        "exchange": exchange,
+        "total": result["total"],
+        "acked": len(result["acked"]),
+        "nacked": len(result["nacked"]),
+        "returned": len(result["returned"])
+    })
+
+    return jsonify({
+        "status": "ok",
+        "exchange": exchange,
+        **result
+    })
+
+
+@app.route("/api/python-backend/consume", methods=["GET"])
+async def consume():
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({
+            "ok": False,
+            "error": "Missing 'queue' query parameter"
+        }), 400
+
+    # ?max=N → batch with manual ack, settle later via /ack-batch
+    if request.args.get("max"):
+        max_count = request.args.get("max", type=int)
+        if max_count is None:
+            return jsonify({"ok": False, "error": "Bad max: must be an integer"}), 400
+        return await consume_batch(queue, max_count)
+
+    if wants_raw(accept=request.headers.get("Accept")):
+        return await consume_raw()
+
+    try:
+        msg = await amqp.consume_one(queue)
+
+        if msg is None:
+            return jsonify({
+                "ok": False,
+                "queue": queue,
+                "message": None
+            })
+
+        amqp.push("amqpMessage", {
+            "type": "consumed",
+            "queue": queue,
+            "message": msg.get("message"),
+            "exchange": msg.get("exchange"),
+            "routing_key": msg.get("routing_key"),
+            "properties": msg.get("properties"),
+        })
+
+        return jsonify(msg)
+
+    except BrokerUnavailable:
+        raise
+    except Exception as e:
+        print("[AMQP-async] Consume error:", repr(e))
+        return jsonify({
+            "ok": False,
+            "queue": queue,
+            "error": str(e)
+        }), 500
+
+
+@app.route("/api/python-backend/consume-raw", methods=["GET"])
+async def consume_raw():
+    # Body bytes straight into the response, properties in X-Amqp-* headers.
+    # The body keeps its content_encoding unless ?decode=1.
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({"ok": False, "error": "Missing 'queue' query parameter"}), 400
+
+    try:
+        got = await amqp.consume_raw(queue)
+    except BrokerUnavailable:
+        raise
+    except Exception as e:
+        print("[AMQP-async] Consume raw error:", repr(e))
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 500
+
+    if got is None:
+        return Response("", status=204, headers={"X-Amqp-Queue": queue})
+
+    method, props, body = got
+    headers = properties_to_headers(queue, method, props)
+    if request.args.get("decode") and props.content_encoding:
+        body = amqp.codec.decompress(body, props)
+        headers.pop("X-Amqp-Content-Encoding", None)
+
+    amqp.push("amqpMessage", {
+        "type": "consumed",
+        "queue": queue,
+        "exchange": method.exchange,
+        "routing_key": method.routing_key,
+        "bytes": len(body or b"")
+    })
+
+    return Response(body or b"", content_type=OCTET_STREAM, headers=headers)
+
+
+async def consume_batch(queue, max_count):
+    ttl = request.args.get("ttl", type=float)
+
+    try:
+        batch = await amqp.consume_batch(queue, max(1, min(max_count, 1000)), ttl=ttl)
+    except BrokerUnavailable:
+        raise
+    except Exception as e:
+        print("[AMQP-async] Consume batch error:", repr(e))
+        return jsonify({
+            "ok": False,
+            "queue": queue,
+            "error": str(e)
+        }), 500
+
+    if batch is None:
+        return jsonify({
+            "ok": False,
+            "queue": queue,
+            "lease": None,
+            "messages": []
+        })
+
+    amqp.push("amqpMessage", {
+        "type": "consumedBatch",
+        "queue": queue,
+        "lease": batch["lease"],
+        "count": batch["count"]
+    })
+
+    return jsonify(batch)
+
+
+@app.route("/api/python-backend/ack-batch", methods=["POST"])
+async def ack_batch():
+    data = await request.get_json()
+    lease_id = data.get("lease")
+    action = data.get("action", "ack")      # ack | nack | requeue
+
+    if action not in ("ack", "nack", "requeue"):
+        return jsonify({"ok": False, "error": f"Unknown action '{action}'"}), 400
+
+    try:
+        count = await amqp.settle_lease(lease_id, action)
+    except LeaseNotFound:
+        return jsonify({
+            "ok": False,
+            "lease": lease_id,
+            "error": "Unknown or expired lease"
+        }), 404
+
+    amqp.push("amqpMessage", {
+        "message": "Ack batch",
+        "lease": lease_id,
+        "action": action,
+        "count": count
+    })
+
+    return jsonify({"status": "ok", "lease": lease_id, "action": action, "count": count})
+
+
+@app.route("/api/python-backend/consume-stream", methods=["GET"])
+async def consume_stream():
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({
+            "ok": False,
+            "error": "Missing 'queue' query parameter"
+        }), 400
+
+    prefetch = request.args.get("prefetch", type=int)
+    if prefetch is None and "prefetch" in request.args:
+        return jsonify({"ok": False, "error": "Bad prefetch: must be an integer"}), 400
+    prefetch = max(1, min(10 if prefetch is None else prefetch, 1000))
+    fmt = request.args.get("format", "sse")      # sse | ndjson
+
+    # subscribe before the response starts: a down broker is still a 503
+    try:
+        deliveries = await amqp.consume_stream(queue, prefetch=prefetch)
+    except BrokerUnavailable:
+        raise
+    except Exception as e:
+        print("[AMQP-async] Consume stream error:", repr(e))
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 500
+
+    async def generate():
+        async for msg in deliveries:
+            if fmt == "ndjson":
+                yield "\n" if msg is None else json.dumps(msg) + "\n"
+            elif msg is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {msg['delivery_tag']}\nevent: message\ndata: {json.dumps(msg)}\n\n"
+
+    response = Response(
+        generate(),
+        mimetype="application/x-ndjson" if fmt == "ndjson" else "text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+    response.timeout = None     # long-lived stream
+    return response
+
+
+@app.route("/api/python-backend/stream-read", methods=["GET"])
+async def stream_read():
+    # Stream queue read by offset, nothing removed: page on with ?offset=<next_offset>
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({"ok": False, "error": "Missing 'queue' query parameter"}), 400
+
+    max_count = max(1, min(request.args.get("max", 1000, type=int), 10000))
+    wait = max(0.0, min(request.args.get("wait", 1.0, type=float), 20.0))
+
+    try:
+        page = await amqp.read_stream(queue, request.args.get("offset", "first"), max_count,
+                                      prefetch=request.args.get("prefetch", type=int), wait=wait)
+    except StreamNotFound as e:
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 404
+    except ValueError as e:
+        # bad offset, or not a stream queue
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 400
+
+    return jsonify(page)
+
+
+@app.route("/api/python-backend/ack", methods=["POST"])
+async def ack():
+    data = await request.get_json()
+    tag = data.get("delivery_tag")
+    await amqp.ack(tag)
+
+    amqp.push("amqpMessage", {
+        "message": "Ack",
+        "data": data,
+        "tag": tag
+    })
+
+    return jsonify({"status": "ok", "ack": tag})
+
+
+@app.route("/api/python-backend/metrics", methods=["GET"])
+async def prom_metrics():
+    # Broker metrics (RabbitMQ prometheus plugin) streamed through as they
+    # arrive, then our client-side stages
+    try:
+        content_type, chunks = await asyncio.to_thread(mgmt.stream_metrics)
+    except Exception as e:
+        print("[WARN] Broker metrics unavailable:", repr(e))
+        content_type, chunks = "text/plain; version=0.0.4", iter(())
+
+    async def generate():
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+        yield amqp.prometheus().encode("utf-8")
+
+    return Response(generate(), content_type=content_type)
+
+
+def etag_json(payload):
+    """JSON response with an ETag; 304 when the client already has it."""
+    body, etag = json_etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response("", status=304, headers=headers)
+    return Response(body, content_type="application/json", headers=headers)
+
+
+@app.route("/api/python-backend/queue-info", methods=["GET"])
+async def queue_info():
+    q = request.args.get("queue")
+    if not q:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+
+    try:
+        return etag_json(await asyncio.to_thread(mgmt.queue, q))
+    except ManagementError as e:
+        return jsonify(e.detail), e.status
+    except requests.RequestException as e:
+        print("[WARN] Management API error:", repr(e))
+        return jsonify({"ok": False, "error": str(e)}), 502
+
+
+@app.route("/api/python-backend/queue-info-bulk", methods=["GET"])
+async def queue_info_bulk():
+    # ?queues=a,b,c&columns=name,messages,consumers — one /api/queues call
+    queues = [q for q in request.args.get("queues", "").split(",") if q]
+    columns = [c for c in request.args.get("columns", "").split(",") if c]
+
+    try:
+        rows = await asyncio.to_thread(
+            mgmt.queues, queues or None, columns=columns or None)
+        return etag_json(rows)
+    except ManagementError as e:
+        return jsonify(e.detail), e.status
+    except requests.RequestException as e:
+        print("[WARN] Management API error:", repr(e))
+        return jsonify({"ok": False, "error": str(e)}), 502
+
+
+@app.route("/api/python-backend/amqp-stats")
+async def amqp_stats():
+    if worker_stats.enabled:
+        return jsonify(await asyncio.to_thread(worker_stats.aggregate))
+    return jsonify(local_stats())
+
+
+@app.route("/api/python-backend/route", methods=["GET"])
+async def route():
+    # which queues a publish to (exchange, routingKey) reaches, per our bindings
+    exchange = request.args.get("exchange", "")
+    routing_key = request.args.get("routingKey", "")
+    return jsonify({
+        "ok": True,
+        "exchange": exchange,
+        "routing_key": routing_key,
+        "type": amqp.routes.exchange_type(exchange),
+        "queues": amqp.route(exchange, routing_key)
+    })
+
+
+@app.route("/api/python-backend/flow", methods=["GET"])
+async def flow():
+    # broker blocked state + token levels of the publish rate limits
+    return jsonify({"ok": True, **amqp.flow.snapshot()})
+
+
+@app.route("/api/python-backend/outbox", methods=["GET"])
+async def outbox():
+    # local WAL backlog of this worker (AMQP_OUTBOX_DIR)
+    return jsonify({"ok": True, **amqp.outbox.snapshot()})
+
+
+@app.route("/api/python-backend/workers", methods=["GET"])
+async def workers():
+    # per-queue delivered / acked / failed / in flight of the handler pool
+    return jsonify({"ok": True, **amqp.workers.snapshot()})
+
+
+@app.route("/api/python-backend/dlq-requeue", methods=["POST"])
+async def dlq_requeue():
+    try:
+        q, count, timeout = requeue_options(await request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    # Small replay job; the DLQ copy is acked only after the confirm
+    job = amqp.replays.start(q, max_messages=count)
+    await asyncio.to_thread(job.finished.wait, timeout)
+
+    if not job.finished.is_set():
+        # still running (slow confirms / rate): it may yet requeue, poll the job
+        return jsonify({"status": "running", "job": job.snapshot()}), 202
+    if job.replayed:
+        status = "requeued"
+    elif job.finished.is_set() and job.state == "done" and not job.scanned:
+        status = "empty"
+    else:
+        status = "failed"
+    return jsonify({"status": status, "job": job.snapshot()}), 200 if status != "failed" else 502
+
+
+@app.route("/api/python-backend/dlq-replay", methods=["POST"])
+async def dlq_replay_start():
+    data = await request.get_json()
+    q = data.get("queue")
+    if not q:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+    try:
+        options = replay_options(data)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    job = amqp.replays.start(q, **options)
+    return jsonify({"ok": True, "job": job.snapshot()}), 202
+
+
+@app.route("/api/python-backend/dlq-replay", methods=["GET"])
+async def dlq_replay_list():
+    return jsonify({"ok": True, "jobs": amqp.replays.jobs()})
+
+
+@app.route("/api/python-backend/dlq-replay/<job_id>", methods=["GET"])
+async def dlq_replay_status(job_id):
+    try:
+        return jsonify({"ok": True, "job": amqp.replays.get(job_id).snapshot()})
+    except ReplayNotFound:
+        return jsonify({"ok": False, "error": "Unknown replay job"}), 404
+
+
+@app.route("/api/python-backend/dlq-replay/<job_id>", methods=["DELETE"])
+async def dlq_replay_cancel(job_id):
+    try:
+        job = amqp.replays.cancel(job_id)
+    except ReplayNotFound:
+        return jsonify({"ok": False, "error": "Unknown replay job"}), 404
+    return jsonify({"ok": True, "job": job.snapshot()})
+
+
+@app.route("/api/python-backend/dlq-snapshot", methods=["POST"])
+async def dlq_snapshot_take():
+    data = await request.get_json()
+    q = data.get("queue")
+    if not q:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+
+    snapshot = amqp.snapshots.take(q, max_messages=data.get("max"))
+    return jsonify({"ok": True, "snapshot": snapshot.describe()}), 202
+
+
+@app.route("/api/python-backend/dlq-snapshot", methods=["GET"])
+async def dlq_snapshot_list():
+    return jsonify({"ok": True, "snapshots": amqp.snapshots.list(request.args.get("queue"))})
+
+
+@app.route("/api/python-backend/dlq-snapshot/<snapshot_id>", methods=["GET"])
+async def dlq_snapshot_info(snapshot_id):
+    try:
+        return jsonify({"ok": True, "snapshot": amqp.snapshots.get(snapshot_id).describe()})
+    except SnapshotNotFound:
+        return jsonify({"ok": False, "error": "Unknown snapshot"}), 404
+
+
+@app.route("/api/python-backend/dlq-snapshot/<snapshot_id>/messages", methods=["GET"])
+async def dlq_snapshot_messages(snapshot_id):
+    # ?offset=0&limit=50 pages; q / reason / routingKey switch to a search
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = min(int(request.args.get("limit", 50)), 500)
+        if offset < 0 or limit < 1:
+            raise ValueError("offset must be >= 0 and limit >= 1")
+    except ValueError as e:
+        return jsonify({"ok": False, "error": f"Bad offset / limit: {e}"}), 400
+    text = request.args.get("q")
+    reason = request.args.get("reason")
+    routing_key = request.args.get("routingKey")
+
+    try:
+        snapshot = amqp.snapshots.get(snapshot_id)
+        # mmap scans are disk-bound: keep them off the event loop
+        if text or reason or routing_key:
+            messages, total = await asyncio.to_thread(
+                snapshot.search, text, reason, routing_key,
+                offset=offset, limit=limit, codec=amqp.codec)
+        else:
+            messages = await asyncio.to_thread(snapshot.page, offset, limit, codec=amqp.codec)
+            total = snapshot.manifest["count"]
+    except SnapshotNotFound:
+        return jsonify({"ok": False, "error": "Unknown or unfinished snapshot"}), 404
+
+    return jsonify({"ok": True, "offset": offset, "total": total, "messages": messages})
+
+
+@app.route("/api/python-backend/dlq-snapshot/<snapshot_id>", methods=["DELETE"])
+async def dlq_snapshot_delete(snapshot_id):
+    try:
+        amqp.snapshots.delete(snapshot_id)
+    except SnapshotNotFound:
+        return jsonify({"ok": False, "error": "Unknown or unfinished snapshot"}), 404
+    return jsonify({"ok": True})
+
+
+@app.route("/api/python-backend/dlq-peek", methods=["GET"])
+async def dlq_peek():
+    q = request.args.get("queue")
+    return jsonify(await amqp.peek_dlq(q))
+
+
+@app.route("/api/python-backend/queue-length", methods=["GET"])
+async def queue_length():
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+
+    # BrokerUnavailable (down / lookup timed out) → 503 via the error handler
+    try:
+        count = await amqp.queue_count(queue)
+    except QueueNotFound as e:
+        return jsonify({"ok": False, "error": str(e)}), 404
+    return jsonify({
+        "ok": True,
+        "queue": queue,
+        "messages": count
+    })
+
+
+# ===============================
+# 3) START SERVER
+# ===============================
+
+if __name__ == "__main__":
+    print("🔥 Python Backend (ASGI Mode) started on 0.0.0.0:8081")
+    app.run(host="0.0.0.0", port=8081)
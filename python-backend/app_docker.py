@@ -1,8 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from amqp_raw import AmqpClient
-from signalr_push import push_event
+from amqp_supervisor import BrokerUnavailable
+from amqp_routing import EXCHANGE_TYPES
+from amqp_flow import RateLimited
+from amqp_streams import StreamNotFound
+from amqp_lease import LeaseNotFound
+from queue_depth import QueueNotFound
+from dlq_replay import ReplayNotFound, replay_options, requeue_options
+from dlq_snapshot import SnapshotNotFound
+from signalr_push import push_event, push_stats
+from rabbit_mgmt import ManagementClient, ManagementError, json_etag, etag_matches
+from amqp_http import OCTET_STREAM, wants_raw, properties_from_headers, properties_to_headers
+from prefork import ForkLocal, WorkerStats
 import requests
+import json
 import os
 
 app = Flask(__name__)
@@ -15,6 +27,7 @@ RABBIT_HOST = os.getenv("RABBIT_HOST", "rabbitmq")
 RABBIT_PORT = int(os.getenv("RABBIT_PORT", "5672"))
 RABBIT_USER = os.getenv("RABBIT_USER", "guest")
 RABBIT_PASS = os.getenv("RABBIT_PASS", "guest")
+AMQP_POOL_SIZE = int(os.getenv("AMQP_POOL_SIZE", "4"))
 
 #amqp = AmqpClient(
 #    host=RABBIT_HOST,
@@ -24,7 +37,43 @@ RABBIT_PASS = os.getenv("RABBIT_PASS", "guest")
 #)
 
 # Level 2 version no longer requires host
-amqp = AmqpClient(use_quorum=False)
+# One client per process, built on first use: under gunicorn every
+# worker connects after fork (see gunicorn.conf.py)
+amqp = ForkLocal(lambda: AmqpClient(use_quorum=False, pool_size=AMQP_POOL_SIZE))
+
+# Management API + broker /metrics (pooled session, short TTL cache)
+mgmt = ForkLocal(ManagementClient)
+
+
+def local_stats():
+    return {**amqp.metrics, "routing": amqp.routes.snapshot(),
+            "signalr_push": push_stats(), "management": mgmt.stats}
+
+# AMQP_STATS_DIR set → /amqp-stats sums every worker's local_stats()
+worker_stats = WorkerStats(local_stats)
+
+
+def init_worker():
+    """Start connecting (in the background) + publishing stats."""
+    amqp.get()
+    worker_stats.start()
+
+
+@app.errorhandler(BrokerUnavailable)
+def broker_unavailable(e):
+    # Circuit open: answer at once, the supervisor is reconnecting
+    resp = jsonify({"ok": False, "error": str(e), "retryAfter": e.retry_after})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    # AMQP_PUBLISH_LIMITS budget of this exchange / routing key used up
+    resp = jsonify({"ok": False, "error": str(e), "rule": e.rule, "retryAfter": e.retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
 
 # ===============================
 # 2) API ROUTES
@@ -32,36 +81,55 @@ amqp = AmqpClient(use_quorum=False)
 
 @app.route("/api/python-backend/health")
 def health():
+    # liveness only: the process answers HTTP
     return jsonify({"status": "ok"})
 
+@app.route("/api/python-backend/ready")
+def ready():
+    # readiness: broker connected, circuit closed, warm-up finished
+    report = amqp.ready()
+    return jsonify(report), 200 if report["ready"] else 503
+
 @app.route("/api/python-backend/declare-exchange", methods=["POST"])
 def declare_exchange():
     data = request.get_json()
     name = data.get("name")
-    amqp.declare_exchange(name)
+    exchange_type = data.get("type", "direct")
+    if exchange_type not in EXCHANGE_TYPES:
+        return jsonify({"ok": False, "error": f"type must be one of {', '.join(EXCHANGE_TYPES)}"}), 400
+    amqp.declare_exchange(name, exchange_type)
 
     # 🔥 Push realtime message qua Gateway → SignalR Node
     push_event("amqpMessage", {
         "message": "Exchange declared",
-        "name": name
+        "name": name,
+        "type": exchange_type
     })
 
-    return jsonify({"status": "ok", "exchange": name})
+    return jsonify({"status": "ok", "exchange": name, "type": exchange_type})
 
 
 @app.route("/api/python-backend/declare-queue", methods=["POST"])
 def declare_queue():
     data = request.get_json()
     name = data.get("name")
-    amqp.declare_queue(name)
+    queue_type = data.get("type")       # classic | quorum | stream (retention below)
+    try:
+        amqp.declare_queue(name, queue_type,
+                           max_age=data.get("maxAge"),
+                           max_length_bytes=data.get("maxLengthBytes"),
+                           max_segment_size_bytes=data.get("maxSegmentSizeBytes"))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
     # 🔥 Push realtime message qua Gateway → SignalR Node
     push_event("amqpMessage", {
         "message": "Queue declared",
-        "name": name
+        "name": name,
+        "type": queue_type
     })
 
-    return jsonify({"status": "ok", "queue": name})
+    return jsonify({"status": "ok", "queue": name, "type": queue_type})
 
 
 @app.route("/api/python-backend/bind", methods=["POST"])
@@ -70,7 +138,10 @@ def bind():
     queue = data["queue"]
     exchange = data["exchange"]
     routing_key = data["routingKey"]
-    amqp.bind(queue, exchange, routing_key)
+    exchange_type = data.get("exchangeType")
+    if exchange_type is not None and exchange_type not in EXCHANGE_TYPES:
+        return jsonify({"ok": False, "error": f"exchangeType must be one of {', '.join(EXCHANGE_TYPES)}"}), 400
+    amqp.bind(queue, exchange, routing_key, exchange_type)
 
     # 🔥 Push realtime message qua Gateway → SignalR Node
     push_event("amqpMessage", {
@@ -85,6 +156,9 @@ def bind():
 
 @app.route("/api/python-backend/publish", methods=["POST"])
 def publish():
+    if wants_raw(content_type=request.content_type):
+        return publish_raw()
+
     data = request.get_json()
     exchange = data["exchange"]
     routing_key = data["routingKey"]
@@ -105,6 +179,66 @@ def publish():
         "published": data
     })
 
+@app.route("/api/python-backend/publish-raw", methods=["POST"])
+def publish_raw():
+    # Body = message bytes, published as-is (no JSON, no codec);
+    # ?exchange=&routingKey=, AMQP properties in X-Amqp-* headers
+    exchange = request.args.get("exchange")
+    routing_key = request.args.get("routingKey")
+    if exchange is None or routing_key is None:
+        return jsonify({"ok": False, "error": "Missing 'exchange' / 'routingKey' query parameter"}), 400
+
+    try:
+        props = properties_from_headers(request.headers)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": f"Bad X-Amqp-* header: {e}"}), 400
+
+    body = request.get_data(cache=False)
+    amqp.publish(exchange, routing_key, body, properties=props, encode=False)
+
+    push_event("amqpMessage", {
+        "type": "published",
+        "exchange": exchange,
+        "routing_key": routing_key,
+        "bytes": len(body)
+    })
+
+    return Response(status=204)
+
+@app.route("/api/python-backend/publish-batch", methods=["POST"])
+def publish_batch():
+    data = request.get_json()
+    exchange = data.get("exchange")
+    messages = data.get("messages") or []
+
+    if not exchange or not isinstance(messages, list):
+        return jsonify({
+            "ok": False,
+            "error": "Body must contain 'exchange' and a 'messages' list"
+        }), 400
+
+    result = amqp.publish_many(
+        exchange,
+        messages,
+        timeout=float(data.get("timeout", 30))
+    )
+
+    # 🔥 Một event cho cả batch (không phải N event)
+    push_event("amqpMessage", {
+        "type": "publishedBatch",
+        "exchange": exchange,
+        "total": result["total"],
+        "acked": len(result["acked"]),
+        "nacked": len(result["nacked"]),
+        "returned": len(result["returned"])
+    })
+
+    return jsonify({
+        "status": "ok",
+        "exchange": exchange,
+        **result
+    })
+
 @app.route("/api/python-backend/consume", methods=["GET"])
 def consume():
     queue = request.args.get("queue")
@@ -114,6 +248,16 @@ def consume():
             "error": "Missing 'queue' query parameter"
         }), 400
 
+    # ?max=N → batch with manual ack, settle later via /ack-batch
+    if request.args.get("max"):
+        max_count = request.args.get("max", type=int)
+        if max_count is None:
+            return jsonify({"ok": False, "error": "Bad max: must be an integer"}), 400
+        return consume_batch(queue, max_count)
+
+    if wants_raw(accept=request.headers.get("Accept")):
+        return consume_raw()
+
     try:
         msg = amqp.consume_one(queue)
 
@@ -137,6 +281,8 @@ def consume():
 
         return jsonify(msg)
 
+    except BrokerUnavailable:
+        raise
     except Exception as e:
         print("[AMQP] Consume error:", repr(e))
         return jsonify({
@@ -145,6 +291,159 @@ def consume():
             "error": str(e)
         }), 500
 
+@app.route("/api/python-backend/consume-raw", methods=["GET"])
+def consume_raw():
+    # Body bytes straight into the response, properties in X-Amqp-* headers.
+    # The body keeps its content_encoding unless ?decode=1.
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({"ok": False, "error": "Missing 'queue' query parameter"}), 400
+
+    try:
+        got = amqp.consume_raw(queue)
+    except BrokerUnavailable:
+        raise
+    except Exception as e:
+        print("[AMQP] Consume raw error:", repr(e))
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 500
+
+    if got is None:
+        return Response(status=204, headers={"X-Amqp-Queue": queue})
+
+    method, props, body = got
+    headers = properties_to_headers(queue, method, props)
+    if request.args.get("decode") and props.content_encoding:
+        body = amqp.codec.decompress(body, props)
+        headers.pop("X-Amqp-Content-Encoding", None)
+
+    push_event("amqpMessage", {
+        "type": "consumed",
+        "queue": queue,
+        "exchange": method.exchange,
+        "routing_key": method.routing_key,
+        "bytes": len(body or b"")
+    })
+
+    return Response(body or b"", content_type=OCTET_STREAM, headers=headers)
+
+def consume_batch(queue, max_count):
+    ttl = request.args.get("ttl", type=float)
+
+    try:
+        batch = amqp.consume_batch(queue, max(1, min(max_count, 1000)), ttl=ttl)
+    except BrokerUnavailable:
+        raise
+    except Exception as e:
+        print("[AMQP] Consume batch error:", repr(e))
+        return jsonify({
+            "ok": False,
+            "queue": queue,
+            "error": str(e)
+        }), 500
+
+    if batch is None:
+        return jsonify({
+            "ok": False,
+            "queue": queue,
+            "lease": None,
+            "messages": []
+        })
+
+    push_event("amqpMessage", {
+        "type": "consumedBatch",
+        "queue": queue,
+        "lease": batch["lease"],
+        "count": batch["count"]
+    })
+
+    return jsonify(batch)
+
+
+@app.route("/api/python-backend/ack-batch", methods=["POST"])
+def ack_batch():
+    data = request.get_json()
+    lease_id = data.get("lease")
+    action = data.get("action", "ack")      # ack | nack | requeue
+
+    if action not in ("ack", "nack", "requeue"):
+        return jsonify({"ok": False, "error": f"Unknown action '{action}'"}), 400
+
+    try:
+        count = amqp.settle_lease(lease_id, action)
+    except LeaseNotFound:
+        return jsonify({
+            "ok": False,
+            "lease": lease_id,
+            "error": "Unknown or expired lease"
+        }), 404
+
+    push_event("amqpMessage", {
+        "message": "Ack batch",
+        "lease": lease_id,
+        "action": action,
+        "count": count
+    })
+
+    return jsonify({"status": "ok", "lease": lease_id, "action": action, "count": count})
+
+
+@app.route("/api/python-backend/consume-stream", methods=["GET"])
+def consume_stream():
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({
+            "ok": False,
+            "error": "Missing 'queue' query parameter"
+        }), 400
+
+    prefetch = request.args.get("prefetch", type=int)
+    if prefetch is None and "prefetch" in request.args:
+        return jsonify({"ok": False, "error": "Bad prefetch: must be an integer"}), 400
+    prefetch = max(1, min(10 if prefetch is None else prefetch, 1000))
+    fmt = request.args.get("format", "sse")      # sse | ndjson
+
+    # the generator only runs once the response has started: refuse here
+    amqp.breaker.check()
+
+    def generate():
+        for msg in amqp.consume_stream(queue, prefetch=prefetch):
+            if fmt == "ndjson":
+                yield "\n" if msg is None else json.dumps(msg) + "\n"
+            elif msg is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {msg['delivery_tag']}\nevent: message\ndata: {json.dumps(msg)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson" if fmt == "ndjson" else "text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"       # nginx: không buffer stream
+        }
+    )
+
+@app.route("/api/python-backend/stream-read", methods=["GET"])
+def stream_read():
+    # Stream queue read by offset, nothing removed: page on with ?offset=<next_offset>
+    queue = request.args.get("queue")
+    if not queue:
+        return jsonify({"ok": False, "error": "Missing 'queue' query parameter"}), 400
+
+    max_count = max(1, min(request.args.get("max", 1000, type=int), 10000))
+    wait = max(0.0, min(request.args.get("wait", 1.0, type=float), 20.0))
+
+    try:
+        page = amqp.read_stream(queue, request.args.get("offset", "first"), max_count,
+                                prefetch=request.args.get("prefetch", type=int), wait=wait)
+    except StreamNotFound as e:
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 404
+    except ValueError as e:
+        # bad offset, or not a stream queue
+        return jsonify({"ok": False, "queue": queue, "error": str(e)}), 400
+
+    return jsonify(page)
+
 @app.route("/api/python-backend/ack", methods=["POST"])
 def ack():
     data = request.get_json()
@@ -162,33 +461,206 @@ def ack():
 
 @app.route("/api/python-backend/metrics", methods=["GET"])
 def prom_metrics():
-    resp = requests.get("http://amqp_rabbit:15692/metrics")
-    return resp.text, 200, {"Content-Type": "text/plain"}
+    # Broker metrics (RabbitMQ prometheus plugin) streamed through as they
+    # arrive, then our client-side stages
+    try:
+        content_type, chunks = mgmt.stream_metrics()
+    except Exception as e:
+        print("[WARN] Broker metrics unavailable:", repr(e))
+        content_type, chunks = "text/plain; version=0.0.4", iter(())
+
+    def generate():
+        yield from chunks
+        yield amqp.prometheus().encode("utf-8")
+
+    return Response(stream_with_context(generate()), content_type=content_type)
+
+def etag_json(payload):
+    """JSON response with an ETag; 304 when the client already has it."""
+    body, etag = json_etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status=304, headers=headers)
+    return Response(body, content_type="application/json", headers=headers)
 
 @app.route("/api/python-backend/queue-info", methods=["GET"])
 def queue_info():
     q = request.args.get("queue")
-    url = f"http://amqp_rabbit:15672/api/queues/%2f/{q}"
-    r = requests.get(url, auth=("guest", "guest"))
-    return r.json()
+    if not q:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+
+    try:
+        return etag_json(mgmt.queue(q))
+    except ManagementError as e:
+        return jsonify(e.detail), e.status
+    except requests.RequestException as e:
+        print("[WARN] Management API error:", repr(e))
+        return jsonify({"ok": False, "error": str(e)}), 502
+
+@app.route("/api/python-backend/queue-info-bulk", methods=["GET"])
+def queue_info_bulk():
+    # ?queues=a,b,c&columns=name,messages,consumers — one /api/queues call
+    queues = [q for q in request.args.get("queues", "").split(",") if q]
+    columns = [c for c in request.args.get("columns", "").split(",") if c]
+
+    try:
+        return etag_json(mgmt.queues(queues or None, columns=columns or None))
+    except ManagementError as e:
+        return jsonify(e.detail), e.status
+    except requests.RequestException as e:
+        print("[WARN] Management API error:", repr(e))
+        return jsonify({"ok": False, "error": str(e)}), 502
 
 @app.route("/api/python-backend/amqp-stats")
 def amqp_stats():
-    return jsonify(amqp.metrics)
+    if worker_stats.enabled:
+        return jsonify(worker_stats.aggregate())
+    return jsonify(local_stats())
 
 
+@app.route("/api/python-backend/route", methods=["GET"])
+def route():
+    # which queues a publish to (exchange, routingKey) reaches, per our bindings
+    exchange = request.args.get("exchange", "")
+    routing_key = request.args.get("routingKey", "")
+    return jsonify({
+        "ok": True,
+        "exchange": exchange,
+        "routing_key": routing_key,
+        "type": amqp.routes.exchange_type(exchange),
+        "queues": amqp.route(exchange, routing_key)
+    })
+
+
+@app.route("/api/python-backend/flow", methods=["GET"])
+def flow():
+    # broker blocked state + token levels of the publish rate limits
+    return jsonify({"ok": True, **amqp.flow.snapshot()})
+
+
+@app.route("/api/python-backend/outbox", methods=["GET"])
+def outbox():
+    # local WAL backlog of this worker (AMQP_OUTBOX_DIR)
+    return jsonify({"ok": True, **amqp.outbox.snapshot()})
+
+
+@app.route("/api/python-backend/workers", methods=["GET"])
+def workers():
+    # per-queue delivered / acked / failed / in flight of the handler pool
+    return jsonify({"ok": True, **amqp.workers.snapshot()})
+
 @app.route("/api/python-backend/dlq-requeue", methods=["POST"])
 def dlq_requeue():
+    try:
+        q, count, timeout = requeue_options(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    # Small synchronous replay: the DLQ copy is acked only after the
+    # broker confirmed the republish, so a failure leaves it in the DLQ
+    job = amqp.replays.start(q, max_messages=count)
+    job.finished.wait(timeout)
+
+    if not job.finished.is_set():
+        # still running (slow confirms / rate): it may yet requeue, poll the job
+        return jsonify({"status": "running", "job": job.snapshot()}), 202
+    if job.replayed:
+        status = "requeued"
+    elif job.finished.is_set() and job.state == "done" and not job.scanned:
+        status = "empty"
+    else:
+        status = "failed"
+    return jsonify({"status": status, "job": job.snapshot()}), 200 if status != "failed" else 502
+
+@app.route("/api/python-backend/dlq-replay", methods=["POST"])
+def dlq_replay_start():
+    data = request.get_json()
+    q = data.get("queue")
+    if not q:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+    try:
+        options = replay_options(data)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    job = amqp.replays.start(q, **options)
+    return jsonify({"ok": True, "job": job.snapshot()}), 202
+
+@app.route("/api/python-backend/dlq-replay", methods=["GET"])
+def dlq_replay_list():
+    return jsonify({"ok": True, "jobs": amqp.replays.jobs()})
+
+@app.route("/api/python-backend/dlq-replay/<job_id>", methods=["GET"])
+def dlq_replay_status(job_id):
+    try:
+        return jsonify({"ok": True, "job": amqp.replays.get(job_id).snapshot()})
+    except ReplayNotFound:
+        return jsonify({"ok": False, "error": "Unknown replay job"}), 404
+
+@app.route("/api/python-backend/dlq-replay/<job_id>", methods=["DELETE"])
+def dlq_replay_cancel(job_id):
+    try:
+        job = amqp.replays.cancel(job_id)
+    except ReplayNotFound:
+        return jsonify({"ok": False, "error": "Unknown replay job"}), 404
+    return jsonify({"ok": True, "job": job.snapshot()})
+
+@app.route("/api/python-backend/dlq-snapshot", methods=["POST"])
+def dlq_snapshot_take():
     data = request.get_json()
-    q = data["queue"]
-    dlq_name = f"{q}.DLQ"
+    q = data.get("queue")
+    if not q:
+        return jsonify({"ok": False, "error": "Missing queue"}), 400
+
+    snapshot = amqp.snapshots.take(q, max_messages=data.get("max"))
+    return jsonify({"ok": True, "snapshot": snapshot.describe()}), 202
 
-    method, props, body = amqp.channel.basic_get(queue=dlq_name, auto_ack=True)
-    if method is None:
-        return jsonify({"status": "empty"})
+@app.route("/api/python-backend/dlq-snapshot", methods=["GET"])
+def dlq_snapshot_list():
+    return jsonify({"ok": True, "snapshots": amqp.snapshots.list(request.args.get("queue"))})
+
+@app.route("/api/python-backend/dlq-snapshot/<snapshot_id>", methods=["GET"])
+def dlq_snapshot_info(snapshot_id):
+    # manifest: state, count, bytes and counts by x-death reason
+    try:
+        return jsonify({"ok": True, "snapshot": amqp.snapshots.get(snapshot_id).describe()})
+    except SnapshotNotFound:
+        return jsonify({"ok": False, "error": "Unknown snapshot"}), 404
+
+@app.route("/api/python-backend/dlq-snapshot/<snapshot_id>/messages", methods=["GET"])
+def dlq_snapshot_messages(snapshot_id):
+    # ?offset=0&limit=50 pages; q / reason / routingKey switch to a search
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = min(int(request.args.get("limit", 50)), 500)
+        if offset < 0 or limit < 1:
+            raise ValueError("offset must be >= 0 and limit >= 1")
+    except ValueError as e:
+        return jsonify({"ok": False, "error": f"Bad offset / limit: {e}"}), 400
+    text = request.args.get("q")
+    reason = request.args.get("reason")
+    routing_key = request.args.get("routingKey")
 
-    amqp.publish(exchange=q, routing_key=q, message=body.decode("utf-8"))
-    return jsonify({"status": "requeued"})
+    try:
+        snapshot = amqp.snapshots.get(snapshot_id)
+        if text or reason or routing_key:
+            messages, total = snapshot.search(text, reason, routing_key,
+                                              offset=offset, limit=limit, codec=amqp.codec)
+        else:
+            messages = snapshot.page(offset, limit, codec=amqp.codec)
+            total = snapshot.manifest["count"]
+    except SnapshotNotFound:
+        return jsonify({"ok": False, "error": "Unknown or unfinished snapshot"}), 404
+
+    return jsonify({"ok": True, "offset": offset, "total": total, "messages": messages})
+
+@app.route("/api/python-backend/dlq-snapshot/<snapshot_id>", methods=["DELETE"])
+def dlq_snapshot_delete(snapshot_id):
+    try:
+        amqp.snapshots.delete(snapshot_id)
+    except SnapshotNotFound:
+        return jsonify({"ok": False, "error": "Unknown or unfinished snapshot"}), 404
+    return jsonify({"ok": True})
 
 @app.route("/api/python-backend/dlq-peek", methods=["GET"])
 def dlq_peek():
@@ -236,37 +708,17 @@ def queue_length():
         return jsonify({"ok": False, "error": "Missing queue"}), 400
 
     try:
-        import pika
-
-        creds = pika.PlainCredentials(
-            os.environ.get("RABBIT_USER", "guest"),
-            os.environ.get("RABBIT_PASS", "guest")
-        )
-
-        params = pika.ConnectionParameters(
-            host=os.environ.get("RABBIT_HOST", "rabbitmq"),
-            port=int(os.environ.get("RABBIT_PORT", 5672)),
-            credentials=creds,
-            heartbeat=0
-        )
-
-        with pika.BlockingConnection(params) as conn:
-            ch = conn.channel()
-
-            try:
-                # Passive declare: không tạo queue, chỉ hỏi thông tin
-                q = ch.queue_declare(queue=queue, passive=True)
-                count = q.method.message_count
-            except Exception:
-                # Queue không tồn tại hoặc config không khớp → trả count=0
-                count = 0
-
-            return jsonify({
-                "ok": True,
-                "queue": queue,
-                "messages": count
-            })
+        # Cached + single-flight: N pollers of one queue → ≤ 1 broker call / TTL
+        return jsonify({
+            "ok": True,
+            "queue": queue,
+            "messages": amqp.queue_length(queue)
+        })
 
+    except QueueNotFound as e:
+        return jsonify({"ok": False, "error": str(e)}), 404
+    except BrokerUnavailable:
+        raise
     except Exception as e:
         print("Queue length error:", repr(e))
         return jsonify({"ok": False, "error": str(e)}), 500
@@ -278,6 +730,7 @@ def queue_length():
 # ===============================
 
 if __name__ == "__main__":
+    init_worker()
     print("🔥 Python Backend (Docker Mode) started on 0.0.0.0:8081")
     app.run(host="0.0.0.0", port=8081)
 
@@ -0,0 +1,12 @@
+# Load-generation benchmark for the python backend.
+#
+#   cd python-backend
+#   python -m bench --duration 10 --concurrency 16            # in-process
+#   python -m bench --target http://localhost:8081 --label prod-like
+#
+# In-process mode needs no network: bench.fake_pika replaces
+# pika.BlockingConnection with an in-memory broker and bench.fake_signalr
+# receives the realtime pushes. The report is JSON (throughput and
+# p50/p99/p999 per operation) so runs can be diffed. In-process numbers
+# share one interpreter (driver + server + broker) — compare them with
+# each other, not with a real deployment.
@@ -0,0 +1,692 @@
+import time
+import threading
+from collections import deque, OrderedDict
+
+import pika
+from pika import frame, spec
+
+
+# ============================================================
+# IN-PROCESS BROKER STAND-IN (blocking pika API subset)
+# ============================================================
+# Just enough AMQP 0-9-1 semantics for amqp_raw.py / amqp_pool.py /
+# amqp_lease.py / amqp_confirms.py to run unchanged:
+#
+#   exchange_declare / queue_declare (passive, 404, 406) / queue_bind
+#   basic_publish (direct, fanout, topic, default exchange, mandatory
+#   returns, publisher confirms on BlockingChannel and on `_impl`)
+#   basic_get / consume / basic_consume (callbacks from
+#   process_data_events, per-consumer prefetch) / basic_qos / basic_ack / basic_nack (multiple,
+#   requeue, dead-lettering via x-dead-letter-exchange) / channel close
+#   requeues unacked deliveries / connection.blocked + unblocked
+#   notifications (block() / unblock(); publishes are not actually held)
+#
+# `rtt` adds a simulated network round-trip to every synchronous RPC so
+# that "one round-trip fewer" shows up in the numbers the same way it
+# would against a real broker. Callbacks (confirms, returns) are only
+# delivered from process_data_events(), as with the real connection.
+#
+#   broker = FakeBroker(rtt=0.0002)
+#   restore = install(broker)     # pika.BlockingConnection → fake
+class FakeBroker:
+
+    def __init__(self, rtt=0.0):
+        self.rtt = rtt
+        self.down = False               # True → new connections are refused
+        self.blocked = None             # resource alarm reason while blocked
+
+        self.exchanges = {"": "direct"}  # name → type
+        self.queues = {}                 # name → _Queue
+        self.bindings = {}               # exchange → [(queue, routing_key)]
+        self.connections = set()
+        self.stats = {"connections": 0, "rpcs": 0, "published": 0,
+                      "delivered": 0, "acked": 0, "dead_lettered": 0}
+
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+
+    def rpc(self):
+        self.stats["rpcs"] += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    # ------------------------------------------------------------
+    # routing
+    # ------------------------------------------------------------
+    def route(self, exchange, routing_key):
+        if exchange == "":
+            return [routing_key] if routing_key in self.queues else []
+
+        kind = self.exchanges.get(exchange)
+        targets = []
+        for queue, key in self.bindings.get(exchange, ()):
+            if kind == "fanout" \
+                    or (kind == "topic" and _topic_match(key, routing_key)) \
+                    or (kind not in ("fanout", "topic") and key == routing_key):
+                if queue not in targets and queue in self.queues:
+                    targets.append(queue)
+        return targets
+
+    def enqueue(self, exchange, routing_key, body, props):
+        """Route one message; returns False when it matched no queue."""
+        with self.cond:
+            targets = self.route(exchange, routing_key)
+            for queue in targets:
+                q = self.queues[queue]
+                if q.stream:
+                    # the broker stamps the position on every stream delivery
+                    headers = dict(props.headers or {}, **{"x-stream-offset": len(q.messages)})
+                    q.messages.append(_Message(exchange, routing_key, body,
+                                               _copy_props(props, headers=headers)))
+                else:
+                    q.messages.append(_Message(exchange, routing_key, body, props))
+            if targets:
+                self.stats["published"] += 1
+                self.cond.notify_all()
+            return bool(targets)
+
+    def dead_letter(self, queue, msg, reason="rejected"):
+        args = self.queues[queue].arguments if queue in self.queues else {}
+        dlx = args.get("x-dead-letter-exchange")
+        if dlx is None:
+            return
+        headers = dict(msg.props.headers or {})
+        headers["x-death"] = [{
+            "queue": queue,
+            "reason": reason,
+            "count": 1,
+            "exchange": msg.exchange,
+            "routing-keys": [msg.routing_key],
+            "time": int(time.time())
+        }] + list(headers.get("x-death") or [])
+        props = _copy_props(msg.props, headers=headers)
+        self.stats["dead_lettered"] += 1
+        self.enqueue(dlx, args.get("x-dead-letter-routing-key", msg.routing_key),
+                     msg.body, props)
+
+    def block(self, reason="low on memory"):
+        """Raise a resource alarm: every connection gets connection.blocked."""
+        with self.lock:
+            self.blocked = reason
+            for conn in list(self.connections):
+                conn._notify_blocked()
+
+    def unblock(self):
+        with self.lock:
+            self.blocked = None
+            for conn in list(self.connections):
+                conn._notify_unblocked()
+
+    def kill_connections(self):
+        """Simulate the broker / network going away under open connections."""
+        with self.lock:
+            for conn in list(self.connections):
+                conn._lost()
+
+
+def _topic_match(pattern, routing_key):
+    """AMQP topic match: `*` is exactly one word, `#` is zero or more."""
+    words, keys = pattern.split("."), routing_key.split(".")
+
+    def match(i, j):
+        if i == len(words):
+            return j == len(keys)
+        if words[i] == "#":
+            return any(match(i + 1, k) for k in range(j, len(keys) + 1))
+        return j < len(keys) and words[i] in ("*", keys[j]) and match(i + 1, j + 1)
+
+    return match(0, 0)
+
+
+def _copy_props(props, **changes):
+    fields = {k: getattr(props, k) for k in (
+        "content_type", "content_encoding", "headers", "delivery_mode",
+        "priority", "correlation_id", "reply_to", "expiration", "message_id",
+        "timestamp", "type", "user_id", "app_id", "cluster_id")}
+    fields.update(changes)
+    return pika.BasicProperties(**fields)
+
+
+class _Message:
+
+    __slots__ = ("exchange", "routing_key", "body", "props", "redelivered")
+
+    def __init__(self, exchange, routing_key, body, props, redelivered=False):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.props = props
+        self.redelivered = redelivered
+
+
+STREAM_CHUNK = 16
+
+
+class _Queue:
+
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = dict(arguments or {})
+        # a stream is an append-only log: consumers read it by offset
+        self.stream = self.arguments.get("x-queue-type") == "stream"
+        self.messages = [] if self.stream else deque()
+
+    def stream_start(self, offset):
+        """First position a consumer at x-stream-offset `offset` gets."""
+        n = len(self.messages)
+        if offset == "next":
+            return n
+        if offset == "last":
+            return max(0, n - 1) - max(0, n - 1) % STREAM_CHUNK
+        if isinstance(offset, int):
+            # delivery starts at the chunk holding the offset, like RabbitMQ
+            return min(offset, n) - min(offset, n) % STREAM_CHUNK
+        return 0        # "first", timestamps and intervals: no time index here
+
+
+# ============================================================
+# CONNECTION
+# ============================================================
+class FakeBlockingConnection:
+
+    def __init__(self, parameters=None, broker=None):
+        self.broker = broker
+        if broker.down:
+            raise pika.exceptions.AMQPConnectionError("fake broker is down")
+        broker.rpc()
+
+        self.params = parameters
+        self.is_open = True
+        self._lost_reason = None
+        self._channels = []
+        self._callbacks = deque()
+        self._next_channel = 1
+        self._on_blocked = []
+        self._on_unblocked = []
+
+        with broker.lock:
+            broker.connections.add(self)
+            broker.stats["connections"] += 1
+            if broker.blocked:
+                self._notify_blocked()
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    def _check(self):
+        if self._lost_reason is not None:
+            raise pika.exceptions.StreamLostError(self._lost_reason)
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Connection is closed")
+
+    def _lost(self):
+        self._lost_reason = "Transport indicated EOF"
+        self.is_open = False
+        for ch in list(self._channels):
+            ch._closed(requeue=True)
+        self.broker.connections.discard(self)
+
+    def add_on_connection_blocked_callback(self, callback):
+        self._on_blocked.append(callback)
+
+    def add_on_connection_unblocked_callback(self, callback):
+        self._on_unblocked.append(callback)
+
+    def _notify_blocked(self):
+        method = frame.Method(0, spec.Connection.Blocked(self.broker.blocked))
+        # delivered from process_data_events(), like any other frame
+        self._callbacks.append(lambda: [cb(self, method) for cb in self._on_blocked])
+
+    def _notify_unblocked(self):
+        method = frame.Method(0, spec.Connection.Unblocked())
+        self._callbacks.append(lambda: [cb(self, method) for cb in self._on_unblocked])
+
+    def channel(self, channel_number=None):
+        self._check()
+        self.broker.rpc()
+        ch = FakeBlockingChannel(self, channel_number or self._next_channel)
+        self._next_channel += 1
+        self._channels.append(ch)
+        return ch
+
+    def process_data_events(self, time_limit=0):
+        self._check()
+        delivered = 0
+        for ch in list(self._channels):
+            delivered += ch._dispatch()
+        if not self._callbacks and not delivered and time_limit:
+            time.sleep(min(time_limit, 0.001))
+        while self._callbacks:
+            cb = self._callbacks.popleft()
+            cb()
+
+    def sleep(self, duration):
+        self.process_data_events(time_limit=duration)
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.append(callback)
+
+    def close(self, reply_code=200, reply_text="Normal shutdown"):
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Connection is closed")
+        for ch in list(self._channels):
+            ch._closed(requeue=True)
+        self.is_open = False
+        self.broker.connections.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.is_open:
+            self.close()
+
+
+# ============================================================
+# CHANNEL
+# ============================================================
+class FakeBlockingChannel:
+
+    def __init__(self, connection, channel_number):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = channel_number
+        self.is_open = True
+        self._closed_by_broker = None
+        self._impl = _FakeImpl(self)
+
+        self._next_tag = 1
+        self._unacked = OrderedDict()   # delivery_tag → (queue, _Message)
+        self._prefetch = 0
+        self._confirming = False        # BlockingChannel.confirm_delivery()
+        self._return_callbacks = []
+        self._consuming = set()
+        self._consumers = OrderedDict()  # consumer_tag → [queue, callback, auto_ack, prefetch, tags]
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    # ------------------------------------------------------------
+    # state
+    # ------------------------------------------------------------
+    def _check(self):
+        self.connection._check()
+        if self._closed_by_broker is not None:
+            raise self._closed_by_broker
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+
+    def _fail(self, code, text):
+        """Broker closes the channel (404 / 406 ...) and raises at the caller."""
+        err = pika.exceptions.ChannelClosedByBroker(code, text)
+        self._closed(requeue=True)
+        self._closed_by_broker = err
+        raise err
+
+    def _closed(self, requeue):
+        if not self.is_open:
+            return
+        self.is_open = False
+        with self.broker.cond:
+            for queue, msg in reversed(list(self._unacked.values())):
+                if requeue and queue in self.broker.queues and not self.broker.queues[queue].stream:
+                    msg.redelivered = True
+                    self.broker.queues[queue].messages.appendleft(msg)
+            self._unacked.clear()
+            self._consumers.clear()
+            self.broker.cond.notify_all()
+        if self in self.connection._channels:
+            self.connection._channels.remove(self)
+
+    def close(self, reply_code=0, reply_text="Normal shutdown"):
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+        self._closed(requeue=True)
+
+    # ------------------------------------------------------------
+    # topology
+    # ------------------------------------------------------------
+    def exchange_declare(self, exchange, exchange_type="direct", passive=False,
+                         durable=False, auto_delete=False, internal=False, arguments=None):
+        self._check()
+        self.broker.rpc()
+        exchange_type = getattr(exchange_type, "value", exchange_type)
+        with self.broker.lock:
+            current = self.broker.exchanges.get(exchange)
+            if passive:
+                if current is None:
+                    self._fail(404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            elif current is None:
+                self.broker.exchanges[exchange] = exchange_type
+            elif current != exchange_type:
+                self._fail(406, f"PRECONDITION_FAILED - inequivalent arg 'type' for "
+                                f"exchange '{exchange}' in vhost '/': received "
+                                f"'{exchange_type}' but current is '{current}'")
+        return frame.Method(self.channel_number, spec.Exchange.DeclareOk())
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None):
+        self._check()
+        self.broker.rpc()
+        with self.broker.lock:
+            q = self.broker.queues.get(queue)
+            if passive:
+                if q is None:
+                    self._fail(404, f"NOT_FOUND - no queue '{queue}' in vhost '/'")
+            elif q is None:
+                q = self.broker.queues[queue] = _Queue(queue, arguments)
+            elif q.arguments != dict(arguments or {}):
+                self._fail(406, f"PRECONDITION_FAILED - inequivalent arg for "
+                                f"queue '{queue}' in vhost '/'")
+            return frame.Method(self.channel_number, spec.Queue.DeclareOk(
+                queue=queue, message_count=len(q.messages), consumer_count=0))
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self._check()
+        self.broker.rpc()
+        with self.broker.lock:
+            if queue not in self.broker.queues:
+                self._fail(404, f"NOT_FOUND - no queue '{queue}' in vhost '/'")
+            if exchange not in self.broker.exchanges:
+                self._fail(404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            binding = (queue, routing_key if routing_key is not None else queue)
+            bindings = self.broker.bindings.setdefault(exchange, [])
+            if binding not in bindings:
+                bindings.append(binding)
+        return frame.Method(self.channel_number, spec.Queue.BindOk())
+
+    def queue_purge(self, queue):
+        self._check()
+        self.broker.rpc()
+        with self.broker.lock:
+            q = self.broker.queues.get(queue)
+            n = len(q.messages) if q else 0
+            if q:
+                q.messages.clear()
+        return frame.Method(self.channel_number, spec.Queue.PurgeOk(message_count=n))
+
+    # ------------------------------------------------------------
+    # publish
+    # ------------------------------------------------------------
+    def add_on_return_callback(self, callback):
+        self._return_callbacks.append(callback)
+
+    def confirm_delivery(self):
+        self._check()
+        self.broker.rpc()
+        self._confirming = True
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._check()
+        props = properties or pika.BasicProperties()
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        if exchange not in self.broker.exchanges:
+            # real broker: async channel close, surfaced on the next call
+            self._closed(requeue=True)
+            self._closed_by_broker = pika.exceptions.ChannelClosedByBroker(
+                404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            if self._confirming:
+                raise self._closed_by_broker
+            return
+
+        routed = self.broker.enqueue(exchange, routing_key, body, props)
+        if routed or not mandatory:
+            return
+
+        method = spec.Basic.Return(312, "NO_ROUTE", exchange, routing_key)
+        if self._confirming:
+            self.broker.rpc()
+            raise pika.exceptions.UnroutableError(
+                [pika.adapters.blocking_connection.ReturnedMessage(method, props, body)])
+        for cb in self._return_callbacks:
+            self.connection._callbacks.append(
+                lambda cb=cb: cb(self, method, props, body))
+
+    # ------------------------------------------------------------
+    # consume
+    # ------------------------------------------------------------
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        self._check()
+        self.broker.rpc()
+        self._prefetch = prefetch_count
+
+    def _take(self, queue, auto_ack):
+        """Pop one message (broker lock held) → (tag, msg) or None."""
+        q = self.broker.queues.get(queue)
+        if q is None:
+            self._fail(404, f"NOT_FOUND - no queue '{queue}' in vhost '/'")
+        if q.stream:
+            self._fail(406, f"PRECONDITION_FAILED - basic.get not supported by "
+                            f"stream queues queue '{queue}' in vhost '/'")
+        if not q.messages:
+            return None
+        msg = q.messages.popleft()
+        tag = self._next_tag
+        self._next_tag += 1
+        if not auto_ack:
+            self._unacked[tag] = (queue, msg)
+        self.broker.stats["delivered"] += 1
+        return tag, msg
+
+    def _read(self, queue, consumer, auto_ack):
+        """Next stream entry of a consumer (broker lock held) → (tag, msg) or None."""
+        log = self.broker.queues[queue].messages
+        if consumer[5] >= len(log):
+            return None
+        msg = log[consumer[5]]
+        consumer[5] += 1
+        tag = self._next_tag
+        self._next_tag += 1
+        if not auto_ack:
+            self._unacked[tag] = (queue, msg)
+        self.broker.stats["delivered"] += 1
+        return tag, msg
+
+    def basic_get(self, queue, auto_ack=False):
+        self._check()
+        self.broker.rpc()
+        with self.broker.lock:
+            got = self._take(queue, auto_ack)
+            if got is None:
+                return None, None, None
+            tag, msg = got
+            remaining = len(self.broker.queues[queue].messages)
+        method = spec.Basic.GetOk(tag, msg.redelivered, msg.exchange,
+                                  msg.routing_key, remaining)
+        return method, msg.props, msg.body
+
+    def consume(self, queue, auto_ack=False, exclusive=False, arguments=None,
+                inactivity_timeout=None):
+        self._check()
+        self.broker.rpc()
+        consumer_tag = f"ctag-{self.channel_number}-{len(self._consuming) + 1}"
+        self._consuming.add(consumer_tag)
+
+        while consumer_tag in self._consuming:
+            deadline = None if inactivity_timeout is None \
+                else time.monotonic() + inactivity_timeout
+            got = None
+
+            with self.broker.cond:
+                while True:
+                    self._check()
+                    if consumer_tag not in self._consuming:
+                        return
+                    if not self._prefetch or len(self._unacked) < self._prefetch:
+                        got = self._take(queue, auto_ack)
+                        if got is not None:
+                            break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self.broker.cond.wait(0.05 if remaining is None else min(remaining, 0.05))
+
+            if got is None:
+                yield None, None, None
+                continue
+
+            tag, msg = got
+            method = spec.Basic.Deliver(consumer_tag, tag, msg.redelivered,
+                                        msg.exchange, msg.routing_key)
+            yield method, msg.props, msg.body
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None):
+        self._check()
+        self.broker.rpc()
+        if queue not in self.broker.queues:
+            self._fail(404, f"NOT_FOUND - no queue '{queue}' in vhost '/'")
+        consumer_tag = consumer_tag or f"ctag-{self.channel_number}.{len(self._consumers) + 1}"
+        q = self.broker.queues[queue]
+        cursor = None
+        if q.stream:
+            with self.broker.lock:
+                cursor = q.stream_start((arguments or {}).get("x-stream-offset", "next"))
+        # basic.qos (global=False) applies to consumers started after it
+        self._consumers[consumer_tag] = [queue, on_message_callback, auto_ack, self._prefetch,
+                                         set(), cursor]
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag):
+        self._check()
+        self._consumers.pop(consumer_tag, None)
+        return []
+
+    def _dispatch(self):
+        """Push deliveries to basic_consume callbacks (connection thread)."""
+        delivered = 0
+        for consumer_tag, consumer in list(self._consumers.items()):
+            queue, callback, auto_ack, prefetch, tags, cursor = consumer
+            while self.is_open and consumer_tag in self._consumers:
+                if prefetch and len(tags) >= prefetch:
+                    break
+                with self.broker.lock:
+                    if cursor is None:
+                        got = self._take(queue, auto_ack)
+                    else:
+                        got = self._read(queue, consumer, auto_ack)
+                if got is None:
+                    break
+                tag, msg = got
+                if not auto_ack:
+                    tags.add(tag)
+                delivered += 1
+                method = spec.Basic.Deliver(consumer_tag, tag, msg.redelivered,
+                                            msg.exchange, msg.routing_key)
+                callback(self, method, msg.props, msg.body)
+        return delivered
+
+    def _forget(self, tag):
+        for consumer in self._consumers.values():
+            consumer[4].discard(tag)
+
+    def cancel(self):
+        self._consuming.clear()
+        with self.broker.cond:
+            self.broker.cond.notify_all()
+        return 0
+
+    # ------------------------------------------------------------
+    # settle
+    # ------------------------------------------------------------
+    def _settled_tags(self, delivery_tag, multiple):
+        if multiple:
+            return [t for t in self._unacked if t <= delivery_tag]
+        if delivery_tag not in self._unacked:
+            self._fail(406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}")
+        return [delivery_tag]
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self._check()
+        with self.broker.cond:
+            for tag in self._settled_tags(delivery_tag, multiple):
+                self._unacked.pop(tag)
+                self._forget(tag)
+                self.broker.stats["acked"] += 1
+            self.broker.cond.notify_all()
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self._check()
+        with self.broker.cond:
+            for tag in self._settled_tags(delivery_tag, multiple):
+                queue, msg = self._unacked.pop(tag)
+                self._forget(tag)
+                if self.broker.queues[queue].stream:
+                    continue        # nothing left a stream, nothing to put back
+                if requeue:
+                    msg.redelivered = True
+                    self.broker.queues[queue].messages.appendleft(msg)
+                else:
+                    self.broker.dead_letter(queue, msg)
+            self.broker.cond.notify_all()
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self.basic_nack(delivery_tag, multiple=False, requeue=requeue)
+
+
+# ============================================================
+# `channel._impl` — the async Channel surface ConfirmTracker uses
+# ============================================================
+class _FakeImpl:
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._ack_nack = None
+        self._returns = []
+        self._delivery_tag = 0
+
+    def add_on_return_callback(self, callback):
+        self._returns.append(callback)
+
+    def confirm_delivery(self, ack_nack_callback, callback=None):
+        ch = self.channel
+        ch._check()
+        self._ack_nack = ack_nack_callback
+        if callback:
+            ch.connection._callbacks.append(
+                lambda: callback(frame.Method(ch.channel_number, spec.Confirm.SelectOk())))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        ch = self.channel
+        ch._check()
+        props = properties or pika.BasicProperties()
+        pending = ch.connection._callbacks
+
+        if exchange not in ch.broker.exchanges:
+            ch._closed(requeue=True)
+            ch._closed_by_broker = pika.exceptions.ChannelClosedByBroker(
+                404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            return
+
+        routed = ch.broker.enqueue(exchange, routing_key, body, props)
+        if not routed and mandatory:
+            method = spec.Basic.Return(312, "NO_ROUTE", exchange, routing_key)
+            for cb in self._returns:
+                pending.append(lambda cb=cb: cb(ch, method, props, body))
+
+        if self._ack_nack is not None:
+            self._delivery_tag += 1
+            ack = frame.Method(ch.channel_number, spec.Basic.Ack(self._delivery_tag, False))
+            pending.append(lambda: self._ack_nack(ack))
+
+
+# ============================================================
+# install / restore
+# ============================================================
+def install(broker):
+    """Route pika.BlockingConnection to `broker`; returns an undo callable."""
+    original = pika.BlockingConnection
+
+    def connect(parameters=None, _impl_class=None):
+        return FakeBlockingConnection(parameters, broker=broker)
+
+    pika.BlockingConnection = connect
+
+    def restore():
+        pika.BlockingConnection = original
+
+    return restore
@@ -0,0 +1,67 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ============================================================
+# FAKE SIGNALR PUSH RECEIVER
+# ============================================================
+# Stands in for signalr-node's /api/signalr-node/push-event(s) so the
+# dispatcher in signalr_push.py has a real HTTP peer on localhost.
+# It only counts what arrives; `delay` simulates a slow hub.
+class FakeSignalR:
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        self.delay = delay
+        self.stats = {"requests": 0, "batches": 0, "events": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/signalr-node"
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+                if receiver.delay:
+                    threading.Event().wait(receiver.delay)
+
+                with receiver._lock:
+                    receiver.stats["requests"] += 1
+                    if self.path.endswith("/push-events") and isinstance(body, list):
+                        receiver.stats["batches"] += 1
+                        receiver.stats["events"] += len(body)
+                    elif self.path.endswith("/push-event"):
+                        receiver.stats["events"] += 1
+                    else:
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-signalr", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
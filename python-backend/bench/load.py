@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API = "/api/python-backend"
+
+DEFAULT_MIX = "publish=4,consume=2,queue-length=3,ack=1"
+
+
+# ============================================================
+# IN-PROCESS STACK: fake broker + fake SignalR + app_docker (werkzeug)
+# ============================================================
+def start_stack(rtt=0.0, signalr_delay=0.0):
+    """
+    Boot app_docker.py against the fake broker. Must run before anything
+    imports signalr_push / app_docker (they read their env at import).
+    Returns (base_url, broker, receiver).
+    """
+    from bench.fake_pika import FakeBroker, install
+    from bench.fake_signalr import FakeSignalR
+
+    if "app_docker" in sys.modules:
+        raise RuntimeError("app_docker already imported — start_stack() must run first")
+
+    broker = FakeBroker(rtt=rtt)
+    install(broker)
+
+    receiver = FakeSignalR(delay=signalr_delay).start()
+    os.environ["SIGNALR_PUSH_URL"] = receiver.url + "/push-event"
+    os.environ["SIGNALR_PUSH_BATCH_URL"] = receiver.url + "/push-events"
+
+    from werkzeug.serving import make_server
+    import app_docker
+
+    # one access-log line per request would dominate the profile
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    # connect + warm-up run in the background; measure a ready instance
+    app_docker.init_worker()
+    deadline = time.monotonic() + 10
+    while not app_docker.amqp.ready()["ready"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    server = make_server("127.0.0.1", 0, app_docker.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}", broker, receiver
+
+
+# ============================================================
+# LATENCY RECORDING
+# ============================================================
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+
+    def __init__(self):
+        self.samples = {}       # op → [seconds]
+        self.errors = {}        # op → count
+        self._lock = threading.Lock()
+
+    def add(self, op, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(op, []).append(seconds)
+            if not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+    def summary(self, elapsed):
+        ops = {}
+        total = 0
+        for op, values in sorted(self.samples.items()):
+            values = sorted(values)
+            total += len(values)
+            ops[op] = {
+                "count": len(values),
+                "errors": self.errors.get(op, 0),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "p999_ms": round(percentile(values, 99.9) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "errors": sum(self.errors.values()),
+            "ops": ops
+        }
+
+
+# ============================================================
+# LOAD DRIVER
+# ============================================================
+class LoadDriver:
+
+    def __init__(self, base_url, queue="bench.q", exchange="bench.ex",
+                 concurrency=16, duration=10.0, requests_total=None,
+                 mix=DEFAULT_MIX, payload_bytes=256, timeout=30.0):
+        self.base_url = base_url.rstrip("/") + API
+        self.queue = queue
+        self.exchange = exchange
+        self.routing_key = queue
+        self.concurrency = concurrency
+        self.duration = duration
+        self.requests_total = requests_total
+        self.payload = "x" * payload_bytes
+        self.timeout = timeout
+
+        self.mix = self._parse_mix(mix)
+        self.recorder = Recorder()
+        self._issued = 0
+        self._issued_lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _parse_mix(mix):
+        weights = []
+        for part in mix.split(","):
+            op, _, w = part.partition("=")
+            op = op.strip()
+            if op not in ("publish", "consume", "queue-length", "ack"):
+                raise ValueError(f"unknown op '{op}' in --mix")
+            weights.append((op, float(w or 1)))
+        return weights
+
+    def _session(self):
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+            s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return s
+
+    # ------------------------------------------------------------
+    # setup
+    # ------------------------------------------------------------
+    def setup(self):
+        s = self._session()
+        s.post(self.base_url + "/declare-exchange",
+               json={"name": self.exchange}, timeout=self.timeout).raise_for_status()
+        s.post(self.base_url + "/declare-queue",
+               json={"name": self.queue}, timeout=self.timeout).raise_for_status()
+        s.post(self.base_url + "/bind", json={
+            "queue": self.queue,
+            "exchange": self.exchange,
+            "routingKey": self.routing_key
+        }, timeout=self.timeout).raise_for_status()
+
+    # ------------------------------------------------------------
+    # operations (each returns the response of the timed request)
+    # ------------------------------------------------------------
+    def _timed(self, op, method, path, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            r = self._session().request(method, self.base_url + path,
+                                        timeout=self.timeout, **kwargs)
+            ok = r.status_code < 400
+            return r
+        except requests.RequestException:
+            return None
+        finally:
+            self.recorder.add(op, time.perf_counter() - start, ok)
+
+    def op_publish(self):
+        self._timed("publish", "POST", "/publish", json={
+            "exchange": self.exchange,
+            "routingKey": self.routing_key,
+            "message": self.payload
+        })
+
+    def op_consume(self):
+        self._timed("consume", "GET", "/consume", params={"queue": self.queue})
+
+    def op_queue_length(self):
+        self._timed("queue-length", "GET", "/queue-length", params={"queue": self.queue})
+
+    def op_ack(self):
+        # Lease one message (untimed), then time the /ack itself
+        r = self._session().get(self.base_url + "/consume",
+                                params={"queue": self.queue, "max": 1}, timeout=self.timeout)
+        tags = r.json().get("delivery_tags") if r.ok else None
+        if not tags:
+            return
+        self._timed("ack", "POST", "/ack", json={"delivery_tag": tags[0]})
+
+    # ------------------------------------------------------------
+    # run
+    # ------------------------------------------------------------
+    def _next_op(self, rng):
+        ops, weights = zip(*self.mix)
+        return rng.choices(ops, weights)[0]
+
+    def _claim(self):
+        if self.requests_total is None:
+            return True
+        with self._issued_lock:
+            if self._issued >= self.requests_total:
+                return False
+            self._issued += 1
+            return True
+
+    def _worker(self, deadline, seed):
+        rng = random.Random(seed)
+        handlers = {
+            "publish": self.op_publish,
+            "consume": self.op_consume,
+            "queue-length": self.op_queue_length,
+            "ack": self.op_ack,
+        }
+        while time.monotonic() < deadline and self._claim():
+            handlers[self._next_op(rng)]()
+
+    def run(self, warmup=1.0, seed=1):
+        if warmup:
+            warm = LoadDriver(self.base_url[:-len(API)], self.queue, self.exchange,
+                              concurrency=self.concurrency, duration=warmup,
+                              mix=",".join(f"{o}={w}" for o, w in self.mix))
+            warm._run_threads(seed + 1000)
+
+        started = time.perf_counter()
+        self._run_threads(seed)
+        return self.recorder.summary(time.perf_counter() - started)
+
+    def _run_threads(self, seed):
+        deadline = time.monotonic() + (self.duration if self.requests_total is None else 1e9)
+        threads = [
+            threading.Thread(target=self._worker, args=(deadline, seed + i),
+                             name=f"bench-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Drive /publish, /consume, /queue-length and /ack; print JSON stats.")
+    parser.add_argument("--target", help="Base URL of a running backend "
+                                         "(default: in-process app + fake broker)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after N requests instead")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds, not recorded")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--queue", default="bench.q")
+    parser.add_argument("--exchange", default="bench.ex")
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--rtt-ms", type=float, default=0.2,
+                        help="simulated broker round-trip (in-process only)")
+    parser.add_argument("--signalr-delay-ms", type=float, default=0.0,
+                        help="simulated SignalR hub latency (in-process only)")
+    parser.add_argument("--label", help="free text stored in the report")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    # the app's own [AMQP] prints go to stderr; stdout is the report only
+    report_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    broker = receiver = None
+    target = args.target
+    if target is None:
+        target, broker, receiver = start_stack(
+            rtt=args.rtt_ms / 1000.0, signalr_delay=args.signalr_delay_ms / 1000.0)
+
+    driver = LoadDriver(target, queue=args.queue, exchange=args.exchange,
+                        concurrency=args.concurrency, duration=args.duration,
+                        requests_total=args.requests, mix=args.mix,
+                        payload_bytes=args.payload_bytes)
+    driver.setup()
+    report = driver.run(warmup=args.warmup)
+
+    report["config"] = {
+        "label": args.label,
+        "target": args.target or "in-process",
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "payload_bytes": args.payload_bytes,
+        "rtt_ms": args.rtt_ms if args.target is None else None,
+    }
+    if broker is not None:
+        import app_docker
+        from signalr_push import push_stats
+        report["broker"] = dict(broker.stats)
+        report["signalr"] = {**receiver.stats, "dispatcher": push_stats()}
+        report["client"] = {k: v for k, v in app_docker.amqp.metrics.items()
+                            if isinstance(v, (int, float, str))}
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text, file=report_out)
+    report_out.flush()
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    return report
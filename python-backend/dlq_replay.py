@@ -0,0 +1,382 @@
+import time
+import uuid
+import fnmatch
+import threading
+import traceback
+from collections import OrderedDict
+
+import pika
+
+from amqp_confirms import ConfirmTracker, CONFIRM_TAG_HEADER
+from amqp_metrics import Counters
+
+# Header stamped on every replayed copy (job id) so consumers can tell
+REPLAY_HEADER = "x-dlq-replay"
+
+
+class ReplayNotFound(Exception):
+    """Replay job id unknown (never started, or pruned from history)."""
+
+
+def death_origin(props):
+    """(exchange, routing_key, queue) the message was first dead-lettered from."""
+    deaths = (getattr(props, "headers", None) or {}).get("x-death") or []
+    if not deaths:
+        return None, None, None
+    # RabbitMQ keeps the most recent death first
+    death = deaths[0]
+    keys = death.get("routing-keys") or []
+    return death.get("exchange"), (keys[0] if keys else None), death.get("queue")
+
+
+def _number(data, key, kind=float, default=None, minimum=0):
+    value = data.get(key, default)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = float(value)
+        if kind is int:
+            if not number.is_integer():
+                raise ValueError
+            number = int(number)
+    except (TypeError, ValueError, OverflowError):
+        noun = "an integer" if kind is int else "a number"
+        raise ValueError(f"{key} must be {noun}, got {value!r}") from None
+    if number < minimum:
+        raise ValueError(f"{key} must be >= {minimum}, got {value!r}")
+    return number
+
+
+def replay_options(data):
+    """
+    JSON body of /dlq-replay → DlqReplayManager.start() keywords.
+    Raises ValueError (→ 400) on anything the job could not use.
+    """
+    routing_key = data.get("routingKey")        # glob, e.g. "order.*"
+    if routing_key is not None and not isinstance(routing_key, str):
+        raise ValueError(f"routingKey must be a string, got {routing_key!r}")
+    headers = data.get("headers")               # exact match
+    if headers is not None and not isinstance(headers, dict):
+        raise ValueError(f"headers must be an object, got {headers!r}")
+    target = data.get("target", "origin")       # origin | queue
+    if target not in ("origin", "queue"):
+        raise ValueError("target must be 'origin' or 'queue'")
+
+    return {
+        "batch_size": _number(data, "batchSize", int, default=100, minimum=1),
+        "rate": _number(data, "rate"),                  # messages / second, 0 → unlimited
+        "max_messages": _number(data, "max", int),      # 0 → all
+        "routing_key": routing_key,
+        "headers": headers,
+        "target": target
+    }
+
+
+def requeue_options(data):
+    """JSON body of /dlq-requeue → (queue, count, timeout); ValueError → 400."""
+    queue = data.get("queue")
+    if not queue or not isinstance(queue, str):
+        raise ValueError("Missing queue")
+    return (queue,
+            _number(data, "count", int, default=1, minimum=1),
+            _number(data, "timeout", default=30))
+
+
+# ============================================================
+# RATE LIMIT — token bucket, refilled continuously
+# ============================================================
+class TokenBucket:
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def shortfall(self, n=1):
+        """Seconds until `n` tokens are there (0.0 → now); takes nothing."""
+        self._refill()
+        return max(0.0, (min(float(n), self.capacity) - self.tokens) / self.rate)
+
+    def take(self, n, cancelled):
+        """Block until `n` tokens are available (or `cancelled` is set)."""
+        n = min(float(n), self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            if cancelled.wait((n - self.tokens) / self.rate):
+                return False
+
+
+class ReplayJob:
+
+    STATES = ("pending", "running", "done", "cancelled", "failed")
+
+    def __init__(self, queue, batch_size=100, rate=None, max_messages=None,
+                 routing_key=None, headers=None, target="origin", confirm_timeout=30.0):
+        self.id = uuid.uuid4().hex
+        self.queue = queue
+        self.dlq = f"{queue}.DLQ"
+        self.batch_size = max(1, int(batch_size))
+        self.rate = float(rate) if rate else None
+        self.max_messages = int(max_messages) if max_messages else None
+        self.routing_key = routing_key      # glob on the original routing key
+        self.headers = dict(headers or {})  # exact match on application headers
+        self.target = target                # origin | queue
+        self.confirm_timeout = confirm_timeout
+
+        self.state = "pending"
+        self.error = None
+        self.total = None
+        self.scanned = 0
+        self.replayed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.batches = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+    # ------------------------------------------------------------
+    # filter + destination
+    # ------------------------------------------------------------
+    def matches(self, method, props):
+        if self.routing_key:
+            _exchange, key, _queue = death_origin(props)
+            if not fnmatch.fnmatchcase(key or method.routing_key, self.routing_key):
+                return False
+        if self.headers:
+            have = getattr(props, "headers", None) or {}
+            for name, value in self.headers.items():
+                if name not in have or str(have[name]) != str(value):
+                    return False
+        return True
+
+    def destination(self, props):
+        exchange, key, queue = death_origin(props)
+        if self.target == "queue" or exchange is None or key is None:
+            # straight into the work queue through the default exchange
+            return "", queue or self.queue
+        return exchange, key
+
+    # ------------------------------------------------------------
+    # progress
+    # ------------------------------------------------------------
+    def snapshot(self):
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "id": self.id,
+            "queue": self.queue,
+            "dlq": self.dlq,
+            "state": self.state,
+            "error": self.error,
+            "total": self.total,
+            "scanned": self.scanned,
+            "replayed": self.replayed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "rate": self.rate,
+            "filter": {"routing_key": self.routing_key, "headers": self.headers or None},
+            "target": self.target,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": elapsed,
+            "throughput": round(self.replayed / elapsed, 2) if elapsed else None
+        }
+
+
+# ============================================================
+# DLQ REPLAY — move dead letters back, confirm first, ack second
+# ============================================================
+# Each job runs on its own thread with its own connection and two
+# channels (delivery tags only live on the channel that delivered them):
+#
+#   get channel      → basic_get × batch (auto_ack=False) from <q>.DLQ
+#   confirm channel  → republish the batch, wait for publisher confirms
+#   get channel      → basic_ack ONLY the copies the broker confirmed
+#
+# Anything not confirmed (nack / unroutable / timeout) and anything the
+# filter skipped simply stays unacked and goes back into the DLQ when the
+# job closes its channel — a crash mid-job can duplicate, never lose.
+#
+# The job stops after the DLQ depth it saw at start, so messages that are
+# dead-lettered again during the replay are not replayed in a loop.
+class DlqReplayManager:
+
+    def __init__(self, params_factory, metrics=None, on_progress=None, keep=50):
+        self.params_factory = params_factory
+        self.on_progress = on_progress
+        self.keep = keep
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("replay_jobs", "replay_replayed", "replay_failed"):
+            self.metrics.setdefault(key, 0)
+
+        self._jobs = OrderedDict()      # job_id → ReplayJob (oldest first)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------
+    def start(self, queue, **options):
+        job = ReplayJob(queue, **options)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self.metrics.inc("replay_jobs")
+
+        threading.Thread(target=self._run, args=(job,),
+                         name=f"dlq-replay-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ReplayNotFound(job_id)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return [job.snapshot() for job in reversed(self._jobs.values())]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        job.cancelled.set()
+        return job
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished.is_set()]
+        for job in finished[:max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[job.id]
+
+    # ------------------------------------------------------------
+    # worker
+    # ------------------------------------------------------------
+    def _run(self, job):
+        job.state = "running"
+        job.started_at = time.time()
+        connection = None
+        try:
+            connection = pika.BlockingConnection(self.params_factory())
+            get_channel = connection.channel()
+            tracker = ConfirmTracker(connection.channel())
+
+            job.total = get_channel.queue_declare(queue=job.dlq, passive=True).method.message_count
+            limit = min(job.total, job.max_messages or job.total)
+            bucket = TokenBucket(job.rate, burst=job.batch_size) if job.rate else None
+            print(f"[AMQP] DLQ replay {job.id[:8]}: {job.dlq} ({limit} of {job.total})")
+
+            while job.scanned < limit and not job.cancelled.is_set():
+                size = min(job.batch_size, limit - job.scanned)
+                if bucket and not bucket.take(size, job.cancelled):
+                    break
+                if not self._replay_batch(job, get_channel, tracker, size):
+                    break       # DLQ drained earlier than its depth said
+                self._progress(job)
+
+            job.state = "cancelled" if job.cancelled.is_set() else "done"
+        except Exception as e:
+            job.state = "failed"
+            job.error = repr(e)
+            print(f"[AMQP] DLQ replay {job.id[:8]} failed:", repr(e))
+            traceback.print_exc()
+        finally:
+            # closing returns every unacked (skipped / unconfirmed) message
+            try:
+                if connection and connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+            job.finished_at = time.time()
+            job.finished.set()
+            self._progress(job)
+            print(f"[AMQP] DLQ replay {job.id[:8]} {job.state}: "
+                  f"{job.replayed} replayed, {job.skipped} skipped, {job.failed} failed")
+
+    def _replay_batch(self, job, channel, tracker, size):
+        """One get → publish → confirm → ack round. False when the DLQ is empty."""
+        picked = []     # (delivery_tag, exchange, routing_key, body, props)
+        drained = False
+        for _ in range(size):
+            method, props, body = channel.basic_get(queue=job.dlq, auto_ack=False)
+            if method is None:
+                drained = True
+                break
+            job.scanned += 1
+            if not job.matches(method, props):
+                job.skipped += 1
+                continue
+            exchange, routing_key = job.destination(props)
+            picked.append((method.delivery_tag, exchange, routing_key, body, self._copy(props, job)))
+
+        # ConfirmTracker publishes to one exchange per batch → group
+        by_exchange = OrderedDict()
+        for entry in picked:
+            by_exchange.setdefault(entry[1], []).append(entry)
+
+        for exchange, entries in by_exchange.items():
+            outcome = tracker.publish_batch(
+                exchange,
+                [(rk, body, props) for _tag, _ex, rk, body, props in entries],
+                mandatory=True,
+                timeout=job.confirm_timeout
+            )
+            for index in outcome["acked"]:
+                channel.basic_ack(entries[index][0])
+
+            failed = len(entries) - len(outcome["acked"])
+            job.replayed += len(outcome["acked"])
+            job.failed += failed
+            self.metrics.inc("replay_replayed", len(outcome["acked"]))
+            if failed:
+                self.metrics.inc("replay_failed", failed)
+
+        job.batches += 1
+        return not drained
+
+    @staticmethod
+    def _copy(props, job):
+        # Original properties (content_type / encoding / headers incl.
+        # x-death) travel with the copy; the old confirm tag does not.
+        # expiration is dropped (it would just dead-letter again) and so is
+        # user_id (the broker rejects one that isn't ours).
+        headers = dict(props.headers or {})
+        headers.pop(CONFIRM_TAG_HEADER, None)
+        headers[REPLAY_HEADER] = job.id
+        return pika.BasicProperties(
+            content_type=props.content_type,
+            content_encoding=props.content_encoding,
+            headers=headers,
+            delivery_mode=props.delivery_mode or 2,
+            priority=props.priority,
+            correlation_id=props.correlation_id,
+            reply_to=props.reply_to,
+            message_id=props.message_id,
+            timestamp=props.timestamp,
+            type=props.type,
+            app_id=props.app_id
+        )
+
+    def _progress(self, job):
+        if self.on_progress:
+            try:
+                self.on_progress(job.snapshot())
+            except Exception as e:
+                print("[AMQP] DLQ replay progress push failed:", repr(e))
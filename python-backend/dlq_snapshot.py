@@ -0,0 +1,370 @@
+import os
+import json
+import mmap
+import time
+import uuid
+import struct
+import threading
+import traceback
+from array import array
+from contextlib import contextmanager
+
+import pika
+
+from amqp_codec import default_codec
+from amqp_metrics import Counters
+from amqp_http import properties_dict
+
+DLQ_SNAPSHOT_DIR = os.environ.get("DLQ_SNAPSHOT_DIR", "/tmp/dlq-snapshots")
+
+# One record in the segment file: <meta_len:u32><body_len:u32><meta json><body>
+_RECORD = struct.Struct("<II")
+
+
+class SnapshotNotFound(Exception):
+    """Snapshot id unknown (never taken, deleted, or still draining)."""
+
+
+def death_reason(props):
+    """x-death reason of the most recent death: rejected | expired | maxlen | ..."""
+    deaths = (getattr(props, "headers", None) or {}).get("x-death") or []
+    return (deaths[0].get("reason") if deaths else None) or "unknown"
+
+
+class _Props:
+    """Read-side stand-in for BasicProperties (what the codec looks at)."""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+    def __getattr__(self, name):
+        return None
+
+
+# ============================================================
+# SNAPSHOT — one drained DLQ, frozen on local disk
+# ============================================================
+#   <id>.seg   append-only records (meta json + raw body, still encoded)
+#   <id>.idx   uint64 offset of record N in .seg (fixed width → O(1) seek)
+#   <id>.json  manifest: queue, state, count, counts by x-death reason
+#
+# Reads go through mmap, so paging the 3-millionth record touches two
+# pages of the index and one of the segment — no broker, no channel.
+class Snapshot:
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self._mmap = None
+        self._index = None
+        self._readers = 0           # page() / search() currently using the mmap
+        self._closing = False       # deleted: unmap once the last reader is done
+        self._lock = threading.Lock()
+        self.manifest_lock = threading.Lock()   # shared with the drain thread
+
+    @property
+    def id(self):
+        return self.manifest["id"]
+
+    def path(self, ext):
+        return os.path.join(self.directory, f"{self.id}.{ext}")
+
+    def describe(self):
+        # the drain thread keeps updating `reasons` while it runs
+        with self.manifest_lock:
+            return {**self.manifest, "reasons": dict(self.manifest["reasons"])}
+
+    def save_manifest(self):
+        tmp = self.path("json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.describe(), f)
+        os.replace(tmp, self.path("json"))
+
+    # ------------------------------------------------------------
+    # read side
+    # ------------------------------------------------------------
+    def _open(self):
+        # caller holds _lock
+        if self._closing:
+            raise SnapshotNotFound(self.id)
+        if self._mmap is None:
+            if self.manifest["state"] != "ready":
+                raise SnapshotNotFound(self.id)
+            index = array("Q")
+            with open(self.path("idx"), "rb") as f:
+                index.frombytes(f.read())
+            self._index = index
+            if self.manifest["count"]:
+                with open(self.path("seg"), "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._mmap = b""
+        return self._mmap, self._index
+
+    @contextmanager
+    def _reading(self):
+        """(mmap, index), kept mapped until the block ends even if deleted meanwhile."""
+        with self._lock:
+            opened = self._open()
+            self._readers += 1
+        try:
+            yield opened
+        finally:
+            with self._lock:
+                self._readers -= 1
+                if self._closing and not self._readers:
+                    self._unmap()
+
+    def _unmap(self):
+        # caller holds _lock
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._mmap = None
+        self._index = None
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            if not self._readers:
+                self._unmap()
+
+    def _raw(self, data, offset):
+        meta_len, body_len = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        return data[start:start + meta_len], data[start + meta_len:start + meta_len + body_len]
+
+    def record(self, n, codec=default_codec):
+        with self._reading() as (data, index):
+            return self._record(data, index, n, codec)
+
+    def _record(self, data, index, n, codec):
+        meta, body = self._raw(data, index[n])
+        meta = json.loads(meta)
+        message, message_encoding = codec.text(body, _Props(meta["properties"]))
+        meta["index"] = n
+        meta["message"] = message
+        if message_encoding:
+            meta["message_encoding"] = message_encoding
+        return meta
+
+    def page(self, offset=0, limit=50, codec=default_codec):
+        with self._reading() as (data, index):
+            end = min(len(index), offset + limit)
+            return [self._record(data, index, n, codec) for n in range(max(0, offset), end)]
+
+    def search(self, text=None, reason=None, routing_key=None,
+               offset=0, limit=50, codec=default_codec):
+        """
+        Linear scan over the mmap. Cheap byte checks first (reason /
+        routing key live in the meta json), decode only candidates.
+        Returns (matches, total_matched).
+        """
+        with self._reading() as (data, index):
+            return self._search(data, index, text, reason, routing_key, offset, limit, codec)
+
+    def _search(self, data, index, text, reason, routing_key, offset, limit, codec):
+        needle = text.encode("utf-8") if text else None
+        matched = 0
+        out = []
+        for n in range(len(index)):
+            meta, body = self._raw(data, index[n])
+            if reason and f'"reason": {json.dumps(reason)}'.encode("utf-8") not in meta:
+                continue
+            if routing_key and json.dumps(routing_key).encode("utf-8") not in meta:
+                continue
+
+            record = json.loads(meta)
+            if reason and record["reason"] != reason:
+                continue
+            if routing_key and routing_key not in (record["routing_key"], record["origin_routing_key"]):
+                continue
+            if needle and needle not in meta:
+                if needle not in codec.decompress(body, _Props(record["properties"])):
+                    continue
+
+            if offset <= matched < offset + limit:
+                out.append(self._record(data, index, n, codec))
+            matched += 1
+        return out, matched
+
+
+# ============================================================
+# SNAPSHOT STORE — drain → write → requeue, then browse offline
+# ============================================================
+# A drain holds every message of the DLQ unacked on its own channel
+# (basic_get, auto_ack=False), writes it to the segment, and finally
+# nacks everything back with requeue=True in one multiple=True frame.
+# The DLQ is left exactly as it was; while the drain runs the messages
+# are invisible to other DLQ consumers (e.g. a replay job).
+class DlqSnapshotStore:
+
+    def __init__(self, params_factory, directory=DLQ_SNAPSHOT_DIR,
+                 codec=None, metrics=None, on_progress=None):
+        self.params_factory = params_factory
+        self.directory = directory
+        self.codec = codec or default_codec
+        self.on_progress = on_progress
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("snapshots_taken", "snapshot_records"):
+            self.metrics.setdefault(key, 0)
+
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[AMQP] Skipping snapshot manifest {name}: {e!r}")
+                continue
+            if manifest.get("state") != "ready":
+                # process died mid-drain: the broker requeued everything
+                manifest["state"] = "failed"
+                manifest["error"] = "interrupted"
+            self._snapshots[manifest["id"]] = Snapshot(self.directory, manifest)
+
+    # ------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------
+    def take(self, queue, max_messages=None):
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = Snapshot(self.directory, {
+            "id": uuid.uuid4().hex,
+            "queue": queue,
+            "dlq": f"{queue}.DLQ",
+            "state": "draining",
+            "error": None,
+            "count": 0,
+            "bytes": 0,
+            "reasons": {},
+            "created_at": time.time(),
+            "finished_at": None
+        })
+        with self._lock:
+            self._snapshots[snapshot.id] = snapshot
+        snapshot.save_manifest()
+        self.metrics.inc("snapshots_taken")
+
+        threading.Thread(target=self._drain, args=(snapshot, max_messages),
+                         name=f"dlq-snapshot-{snapshot.id[:8]}", daemon=True).start()
+        return snapshot
+
+    def get(self, snapshot_id):
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise SnapshotNotFound(snapshot_id)
+        return snapshot
+
+    def list(self, queue=None):
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        rows = [s.describe() for s in snapshots if queue is None or s.manifest["queue"] == queue]
+        return sorted(rows, key=lambda m: m["created_at"], reverse=True)
+
+    def delete(self, snapshot_id):
+        snapshot = self.get(snapshot_id)
+        if snapshot.manifest["state"] == "draining":
+            raise SnapshotNotFound(snapshot_id)
+        with self._lock:
+            self._snapshots.pop(snapshot_id, None)
+        snapshot.close()
+        for ext in ("seg", "idx", "json"):
+            try:
+                os.remove(snapshot.path(ext))
+            except FileNotFoundError:
+                pass
+
+    # ------------------------------------------------------------
+    # drain
+    # ------------------------------------------------------------
+    def _drain(self, snapshot, max_messages):
+        manifest = snapshot.manifest
+        connection = None
+        index = array("Q")
+        reasons = manifest["reasons"]
+        last_tag = None
+        try:
+            connection = pika.BlockingConnection(self.params_factory())
+            channel = connection.channel()
+            depth = channel.queue_declare(queue=manifest["dlq"], passive=True).method.message_count
+            limit = min(depth, int(max_messages)) if max_messages else depth
+            print(f"[AMQP] DLQ snapshot {snapshot.id[:8]}: {manifest['dlq']} ({limit} messages)")
+
+            offset = 0
+            with open(snapshot.path("seg"), "wb") as seg:
+                while len(index) < limit:
+                    method, props, body = channel.basic_get(queue=manifest["dlq"], auto_ack=False)
+                    if method is None:
+                        break
+                    last_tag = method.delivery_tag
+
+                    reason = death_reason(props)
+                    deaths = (props.headers or {}).get("x-death") or [{}]
+                    keys = deaths[0].get("routing-keys") or [None]
+                    meta = json.dumps({
+                        "exchange": method.exchange,
+                        "routing_key": method.routing_key,
+                        "redelivered": method.redelivered,
+                        "reason": reason,
+                        "origin_exchange": deaths[0].get("exchange"),
+                        "origin_routing_key": keys[0],
+                        "properties": properties_dict(props)
+                    }, default=str).encode("utf-8")
+                    body = body or b""
+
+                    seg.write(_RECORD.pack(len(meta), len(body)))
+                    seg.write(meta)
+                    seg.write(body)
+                    index.append(offset)
+                    offset += _RECORD.size + len(meta) + len(body)
+                    with snapshot.manifest_lock:
+                        reasons[reason] = reasons.get(reason, 0) + 1
+
+                    if len(index) % 1000 == 0:
+                        manifest["count"] = len(index)
+                        self._progress(snapshot)
+
+            with open(snapshot.path("idx"), "wb") as f:
+                index.tofile(f)
+
+            # everything back into the DLQ, original order, one frame
+            if last_tag is not None:
+                channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+
+            manifest["count"] = len(index)
+            manifest["bytes"] = offset
+            manifest["state"] = "ready"
+            self.metrics.inc("snapshot_records", len(index))
+        except Exception as e:
+            manifest["state"] = "failed"
+            manifest["error"] = repr(e)
+            print(f"[AMQP] DLQ snapshot {snapshot.id[:8]} failed:", repr(e))
+            traceback.print_exc()
+        finally:
+            # closing also requeues whatever a failed drain still held
+            try:
+                if connection and connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+            manifest["finished_at"] = time.time()
+            snapshot.save_manifest()
+            self._progress(snapshot)
+            print(f"[AMQP] DLQ snapshot {snapshot.id[:8]} {manifest['state']}: "
+                  f"{manifest['count']} messages")
+
+    def _progress(self, snapshot):
+        if self.on_progress:
+            try:
+                self.on_progress(snapshot.describe())
+            except Exception as e:
+                print("[AMQP] DLQ snapshot progress push failed:", repr(e))
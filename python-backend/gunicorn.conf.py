@@ -0,0 +1,48 @@
+import os
+import shutil
+import multiprocessing
+
+# ===============================
+# PRE-FORK MODE
+# ===============================
+#   gunicorn -c gunicorn.conf.py app_docker:app
+#
+# N worker processes × M threads each. Every worker imports app_docker
+# itself (no preload) and builds its own AmqpClient after fork, so no
+# pika socket is ever shared between processes. Per-worker counters
+# land in AMQP_STATS_DIR and /amqp-stats sums them.
+
+bind = os.getenv("BIND", "0.0.0.0:8081")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# A pika connection created before fork is unusable in the child
+preload_app = False
+
+# SSE /consume-stream holds a thread for up to its idle timeout
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+os.environ.setdefault("AMQP_STATS_DIR", "/tmp/amqp-stats")
+STATS_DIR = os.environ["AMQP_STATS_DIR"]
+
+
+def on_starting(server):
+    # rows of workers from a previous run would be summed in
+    shutil.rmtree(STATS_DIR, ignore_errors=True)
+    os.makedirs(STATS_DIR, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # connect now rather than inside the first request
+    import app_docker
+    app_docker.init_worker()
+
+
+def child_exit(server, worker):
+    try:
+        os.remove(os.path.join(STATS_DIR, f"{worker.pid}.json"))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import threading
+
+# Set by gunicorn.conf.py (or by hand for hypercorn --workers); unset →
+# single process, /amqp-stats reports this process only
+AMQP_STATS_DIR = os.environ.get("AMQP_STATS_DIR")
+AMQP_STATS_INTERVAL = float(os.environ.get("AMQP_STATS_INTERVAL", "1.0"))
+
+
+# ============================================================
+# FORK-LOCAL — one lazily built instance per process
+# ============================================================
+# A pika connection (or a requests pool, or a worker thread) does not
+# survive fork(): the child gets a copy of the socket, but not the
+# thread that owns it. ForkLocal builds its object on first use and
+# builds a fresh one whenever it finds itself in a new pid, so module
+# level `amqp = ForkLocal(...)` is safe with or without preload_app.
+class ForkLocal:
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid == os.getpid():
+            return self._value
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._value = self._factory()
+                self._pid = os.getpid()
+        return self._value
+
+    @property
+    def created(self):
+        return self._pid == os.getpid()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+# ============================================================
+# WORKER STATS — per-worker metrics, summed across workers
+# ============================================================
+# Every worker rewrites <dir>/<pid>.json once per interval (atomic
+# rename). Any worker answering /amqp-stats reads all files, drops the
+# ones whose process is gone, and sums them:
+#
+#   numbers        → sum   (keys with "max" / ending "_last" → max)
+#   strings        → the value if all workers agree, else {value: n}
+#   nested dicts   → the same, recursively
+class WorkerStats:
+
+    def __init__(self, snapshot, directory=AMQP_STATS_DIR, interval=AMQP_STATS_INTERVAL):
+        self.snapshot = snapshot
+        self.directory = directory
+        self.interval = interval
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    # ------------------------------------------------------------
+    # writer (one thread per worker, started lazily after fork)
+    # ------------------------------------------------------------
+    def start(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            threading.Thread(target=self._run, name="worker-stats", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                self.write()
+            except Exception as e:
+                print("[AMQP] Worker stats write failed:", repr(e))
+            time.sleep(self.interval)
+
+    def write(self):
+        pid = os.getpid()
+        row = {"pid": pid, "updated_at": time.time(), **self.snapshot()}
+        tmp = self._path(pid) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(row, f, default=str)
+        os.replace(tmp, self._path(pid))
+
+    def remove(self, pid):
+        try:
+            os.remove(self._path(pid))
+        except (FileNotFoundError, TypeError):
+            pass
+
+    # ------------------------------------------------------------
+    # reader
+    # ------------------------------------------------------------
+    def collect(self):
+        """pid → latest snapshot of every live worker (this one fresh)."""
+        self.start()
+        self.write()
+
+        rows = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            pid = int(name[:-5])
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self.remove(pid)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(self._path(pid)) as f:
+                    rows[pid] = json.load(f)
+            except (OSError, ValueError):
+                continue    # mid-rename or just removed
+        return rows
+
+    def aggregate(self):
+        rows = self.collect()
+        total = merge([{k: v for k, v in row.items() if k not in ("pid", "updated_at")}
+                       for row in rows.values()])
+        total["worker_count"] = len(rows)
+        total["workers"] = rows
+        return total
+
+
+def merge(rows):
+    out = {}
+    for key in {k for row in rows for k in row}:
+        values = [row[key] for row in rows if key in row and row[key] is not None]
+        if not values:
+            out[key] = None
+        elif all(isinstance(v, dict) for v in values):
+            out[key] = merge(values)
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            out[key] = max(values) if "max" in key or key.endswith("_last") else sum(values)
+        elif len({json.dumps(v, sort_keys=True, default=str) for v in values}) == 1:
+            out[key] = values[0]
+        else:
+            counts = {}
+            for v in values:
+                counts[str(v)] = counts.get(str(v), 0) + 1
+            out[key] = counts
+    return out
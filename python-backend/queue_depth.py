@@ -0,0 +1,242 @@
+import time
+import asyncio
+import threading
+
+from amqp_metrics import Counters
+from amqp_supervisor import BrokerUnavailable
+
+
+class QueueNotFound(LookupError):
+    """The queue does not exist on the broker (passive declare → 404)."""
+
+    def __init__(self, queue):
+        super().__init__(f"Queue '{queue}' not found")
+        self.queue = queue
+
+
+class _Entry:
+
+    __slots__ = ("count", "delta", "fetched_at")
+
+    def __init__(self, count, fetched_at):
+        self.count = count          # broker value at fetched_at
+        self.delta = 0              # local publish(+)/consume(-) since then
+        self.fetched_at = fetched_at
+
+    def value(self):
+        return max(0, self.count + self.delta)
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# ============================================================
+# QUEUE DEPTH SERVICE
+# ============================================================
+# The queueCount UI counter used to cost one passive queue_declare per
+# publish/consume. Here:
+#
+#   - a broker lookup is reused for `ttl` seconds
+#   - between lookups, known publishes/consumes nudge the cached value
+#   - N threads asking for the same queue at once share ONE lookup
+#     (single-flight); followers just wait for the leader's answer
+#
+# `fetch(queue)` does the real passive declare and may raise; errors
+# reach every caller sharing the lookup. A missing queue (fetch raises
+# QueueNotFound) is remembered for `ttl` like a count, so polling or
+# publishing to it does not cost a 404 + channel reopen each time.
+#
+# estimate() is for the queueCount push after a publish, which may fan
+# out to many queues at once: any cached value younger than
+# `estimate_ttl` (local deltas applied) is good enough there, so only a
+# queue never seen before costs a lookup. It returns None instead of
+# raising: the publish itself already succeeded.
+class QueueDepthService:
+
+    def __init__(self, fetch, ttl=1.0, wait_timeout=5.0, metrics=None, estimate_ttl=30.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.estimate_ttl = estimate_ttl
+
+        self.metrics = metrics if metrics is not None else Counters()
+        for key in ("depth_hits", "depth_fetches", "depth_coalesced", "depth_errors"):
+            self.metrics.setdefault(key, 0)
+
+        self._cache = {}        # queue → _Entry
+        self._missing = {}      # queue → monotonic time of its 404
+        self._flights = {}      # queue → _Flight
+        self._lock = threading.Lock()
+
+    def get(self, queue):
+        """Ready-message count; raises QueueNotFound, or the fetch error."""
+        with self._lock:
+            self._check_cached(queue)
+            entry = self._cache.get(queue)
+            if entry and time.monotonic() - entry.fetched_at < self.ttl:
+                self.metrics.inc("depth_hits")
+                return entry.value()
+
+            flight = self._flights.get(queue)
+            leader = flight is None
+            if leader:
+                flight = self._flights[queue] = _Flight()
+            else:
+                self.metrics.inc("depth_coalesced")
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                raise BrokerUnavailable(f"queueCount lookup for '{queue}' still running "
+                                        f"after {self.wait_timeout:g}s")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._refresh(queue)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(queue, None)
+            flight.done.set()
+
+    def estimate(self, queue):
+        """Count for a queueCount push, or None when it cannot be had."""
+        cached = self._cached(queue, self.estimate_ttl)
+        if cached is not None:
+            return cached
+        try:
+            return self.get(queue)
+        except Exception:
+            return None
+
+    def peek(self, queue):
+        """Cached value with local deltas, however old; None if never looked up."""
+        return self._cached(queue, float("inf"))
+
+    def _cached(self, queue, max_age):
+        with self._lock:
+            entry = self._cache.get(queue)
+            if entry and time.monotonic() - entry.fetched_at < max_age:
+                self.metrics.inc("depth_hits")
+                return entry.value()
+        return None
+
+    def _check_cached(self, queue):
+        # caller holds _lock
+        missing_at = self._missing.get(queue)
+        if missing_at is not None:
+            if time.monotonic() - missing_at < self.ttl:
+                self.metrics.inc("depth_hits")
+                raise QueueNotFound(queue)
+            del self._missing[queue]
+
+    def _store(self, queue, count):
+        with self._lock:
+            self._cache[queue] = _Entry(count, time.monotonic())
+            self._missing.pop(queue, None)
+
+    def _store_missing(self, queue):
+        with self._lock:
+            self._cache.pop(queue, None)
+            self._missing[queue] = time.monotonic()
+
+    def _refresh(self, queue):
+        self.metrics.inc("depth_fetches")
+        try:
+            count = self.fetch(queue)
+        except QueueNotFound:
+            self._store_missing(queue)
+            raise
+        except Exception as e:
+            print(f"[AMQP] queueCount failed for '{queue}': {e!r}")
+            self.metrics.inc("depth_errors")
+            raise
+
+        self._store(queue, count)
+        return count
+
+    def observe(self, queue, count):
+        """Record a count the broker returned anyway (e.g. a non-passive declare)."""
+        self._store(queue, count)
+
+    def adjust(self, queue, delta):
+        """Apply a known publish (+n) / consume (-n) to the cached value."""
+        with self._lock:
+            entry = self._cache.get(queue)
+            if entry:
+                entry.delta += delta
+
+    def invalidate(self, queue=None):
+        with self._lock:
+            if queue is None:
+                self._cache.clear()
+                self._missing.clear()
+            else:
+                self._cache.pop(queue, None)
+                self._missing.pop(queue, None)
+
+
+# ============================================================
+# ASYNC VARIANT (same policy, asyncio futures instead of Events)
+# ============================================================
+class AsyncQueueDepthService(QueueDepthService):
+
+    def __init__(self, fetch, ttl=1.0, metrics=None, estimate_ttl=30.0):
+        super().__init__(fetch, ttl=ttl, metrics=metrics, estimate_ttl=estimate_ttl)
+        self._async_flights = {}    # queue → Future
+
+    async def estimate(self, queue):
+        cached = self._cached(queue, self.estimate_ttl)
+        if cached is not None:
+            return cached
+        try:
+            return await self.get(queue)
+        except Exception:
+            return None
+
+    async def get(self, queue):
+        with self._lock:
+            self._check_cached(queue)
+            entry = self._cache.get(queue)
+            if entry and time.monotonic() - entry.fetched_at < self.ttl:
+                self.metrics.inc("depth_hits")
+                return entry.value()
+
+        flight = self._async_flights.get(queue)
+        if flight is not None:
+            self.metrics.inc("depth_coalesced")
+            return await asyncio.shield(flight)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._async_flights[queue] = flight
+        try:
+            self.metrics.inc("depth_fetches")
+            try:
+                count = await self.fetch(queue)
+            except QueueNotFound:
+                self._store_missing(queue)
+                raise
+            except Exception as e:
+                print(f"[AMQP-async] queueCount failed for '{queue}': {e!r}")
+                self.metrics.inc("depth_errors")
+                raise
+            self._store(queue, count)
+            flight.set_result(count)
+            return count
+        except BaseException as e:
+            # followers get the same error; mark it retrieved for the leader
+            flight.set_exception(e if isinstance(e, Exception) else
+                                 BrokerUnavailable(f"queueCount lookup for '{queue}' cancelled"))
+            flight.exception()
+            raise
+        finally:
+            self._async_flights.pop(queue, None)
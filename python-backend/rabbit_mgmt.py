@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RABBIT_MGMT_URL = os.environ.get("RABBIT_MGMT_URL", "http://amqp_rabbit:15672")
+RABBIT_PROM_URL = os.environ.get("RABBIT_PROM_URL", "http://amqp_rabbit:15692/metrics")
+RABBIT_MGMT_USER = os.environ.get("RABBIT_MGMT_USER", os.environ.get("RABBIT_USER", "guest"))
+RABBIT_MGMT_PASS = os.environ.get("RABBIT_MGMT_PASS", os.environ.get("RABBIT_PASS", "guest"))
+RABBIT_MGMT_TIMEOUT = float(os.environ.get("RABBIT_MGMT_TIMEOUT", "5"))
+RABBIT_MGMT_CACHE_TTL = float(os.environ.get("RABBIT_MGMT_CACHE_TTL", "2"))
+
+
+class ManagementError(Exception):
+
+    def __init__(self, status, detail):
+        super().__init__(f"management API {status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+def json_etag(payload):
+    """(body_bytes, etag) — the ETag is a hash of the exact bytes sent."""
+    body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+# ============================================================
+# MANAGEMENT API CLIENT
+# ============================================================
+# The dashboard polls queue info for dozens of queues. Each poll used to
+# be a fresh requests.get (new TCP connection, no timeout) per queue.
+#
+#   - one keep-alive Session, timeout on every call
+#   - GET /api/queues/<vhost>?columns=... answers any number of queues
+#     in one round-trip; the list is cached for `ttl` seconds
+#   - concurrent misses for the same key share one upstream call
+class ManagementClient:
+
+    def __init__(self,
+                 base_url=RABBIT_MGMT_URL,
+                 prom_url=RABBIT_PROM_URL,
+                 username=RABBIT_MGMT_USER,
+                 password=RABBIT_MGMT_PASS,
+                 timeout=RABBIT_MGMT_TIMEOUT,
+                 ttl=RABBIT_MGMT_CACHE_TTL,
+                 pool_size=8):
+        self.base_url = base_url.rstrip("/")
+        self.prom_url = prom_url
+        self.timeout = timeout
+        self.ttl = ttl
+
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.stats = {"hits": 0, "fetches": 0, "errors": 0}
+        self._cache = {}        # key → (fetched_at, data)
+        self._key_locks = {}    # key → Lock (single-flight per key)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # cache
+    # ------------------------------------------------------------
+    def _cached(self, key, fetch):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and time.monotonic() - hit[0] < self.ttl:
+                self.stats["hits"] += 1
+                return hit[1]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # a concurrent caller may have refreshed it while we waited
+            with self._lock:
+                hit = self._cache.get(key)
+                if hit and time.monotonic() - hit[0] < self.ttl:
+                    self.stats["hits"] += 1
+                    return hit[1]
+                self.stats["fetches"] += 1
+
+            data = fetch()
+            with self._lock:
+                self._cache[key] = (time.monotonic(), data)
+            return data
+
+    def _get(self, path, params=None):
+        r = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+        if r.status_code != 200:
+            with self._lock:
+                self.stats["errors"] += 1
+            try:
+                detail = r.json()
+            except ValueError:
+                detail = r.text
+            raise ManagementError(r.status_code, detail)
+        return r.json()
+
+    # ------------------------------------------------------------
+    # queries
+    # ------------------------------------------------------------
+    def queue(self, name, vhost="/"):
+        path = f"/api/queues/{quote(vhost, safe='')}/{quote(name, safe='')}"
+        return self._cached(("queue", vhost, name), lambda: self._get(path))
+
+    def queues(self, names=None, columns=None, vhost="/"):
+        """
+        Info for `names` (all queues when None) from ONE /api/queues call.
+        `columns` limits the fields returned ("name" is always included).
+        Missing queues are reported as {"name": q, "error": "not_found"}.
+        """
+        columns = sorted(set(columns or ()) | {"name"}) if columns else None
+        path = f"/api/queues/{quote(vhost, safe='')}"
+        params = {"columns": ",".join(columns)} if columns else None
+
+        rows = self._cached(
+            ("queues", vhost, tuple(columns or ())),
+            lambda: self._get(path, params=params)
+        )
+        if names is None:
+            return rows
+
+        by_name = {row.get("name"): row for row in rows}
+        return [by_name.get(n) or {"name": n, "error": "not_found"} for n in names]
+
+    # ------------------------------------------------------------
+    # prometheus proxy
+    # ------------------------------------------------------------
+    def stream_metrics(self, chunk_size=64 * 1024):
+        """Streaming GET of the broker's /metrics → (content_type, chunk iterator)."""
+        r = self.session.get(self.prom_url, stream=True, timeout=self.timeout)
+        r.raise_for_status()
+
+        def chunks():
+            try:
+                yield from r.iter_content(chunk_size=chunk_size)
+            finally:
+                r.close()
+
+        return r.headers.get("Content-Type", "text/plain; version=0.0.4"), chunks()
@@ -1,19 +1,282 @@
 # signalr_push.py
 import os
+import time
+import queue
+import atexit
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 
 SIGNALR_PUSH_URL = os.environ.get(
     "SIGNALR_PUSH_URL",
     "http://signalr-node:6001/api/signalr-node/push-event"  # ✔ ĐÚNG
 )
 
+# Batch endpoint: one POST carries a list of {Event, Payload}
+SIGNALR_PUSH_BATCH_URL = os.environ.get(
+    "SIGNALR_PUSH_BATCH_URL",
+    SIGNALR_PUSH_URL.rstrip("/").rsplit("/", 1)[0] + "/push-events"
+)
+
+PUSH_QUEUE_SIZE = int(os.environ.get("SIGNALR_PUSH_QUEUE_SIZE", "10000"))
+PUSH_BATCH_SIZE = int(os.environ.get("SIGNALR_PUSH_BATCH_SIZE", "200"))
+PUSH_FLUSH_MS = int(os.environ.get("SIGNALR_PUSH_FLUSH_MS", "50"))
+PUSH_OVERFLOW = os.environ.get("SIGNALR_PUSH_OVERFLOW", "drop_oldest")  # | drop_newest
+PUSH_COALESCE_MS = int(os.environ.get("SIGNALR_PUSH_COALESCE_MS", "100"))  # 0 = off
+
+
+# ============================================================
+# BACKGROUND DISPATCHER
+# ============================================================
+# push_event() used to do a blocking requests.post (timeout 2 s) inside
+# every request handler. Now it only enqueues; one worker thread drains
+# the queue and POSTs batches over a keep-alive session:
+#
+#   - flush when PUSH_BATCH_SIZE events are waiting or PUSH_FLUSH_MS passed
+#   - queue full → drop_oldest (keep the freshest UI state) or drop_newest
+#   - SignalR node without /push-events (404) → fall back to single posts
+class EventDispatcher:
+
+    def __init__(self,
+                 url=SIGNALR_PUSH_URL,
+                 batch_url=SIGNALR_PUSH_BATCH_URL,
+                 maxsize=PUSH_QUEUE_SIZE,
+                 batch_size=PUSH_BATCH_SIZE,
+                 flush_ms=PUSH_FLUSH_MS,
+                 overflow=PUSH_OVERFLOW,
+                 timeout=2):
+        self.url = url
+        self.batch_url = batch_url
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000.0
+        self.overflow = overflow
+        self.timeout = timeout
+
+        self.stats = {
+            "queued": 0,
+            "sent": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "latency_ms_last": 0.0,
+            "latency_ms_max": 0.0,
+            "latency_ms_total": 0.0
+        }
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    # ------------------------------------------------------------
+    # lifecycle (lazy, and restarted in a forked child)
+    # ------------------------------------------------------------
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._batch_supported = True
+
+            self._worker = threading.Thread(
+                target=self._run, name="signalr-push", daemon=True)
+            self._worker.start()
+            self._pid = os.getpid()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # ------------------------------------------------------------
+    # producer side
+    # ------------------------------------------------------------
+    def submit(self, event_name, payload):
+        self._ensure_started()
+        item = (time.monotonic(), {"Event": event_name, "Payload": payload})
+
+        try:
+            self._queue.put_nowait(item)
+            self._count("queued")
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+                self._queue.put_nowait(item)
+                self._count("queued")
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+
+        self._count("dropped")
+        return False
+
+    # ------------------------------------------------------------
+    # worker side
+    # ------------------------------------------------------------
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.flush_s
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._send(batch)
+
+    def _send(self, batch):
+        envelopes = [env for _, env in batch]
+        sent = 0
+
+        try:
+            if self._batch_supported and len(envelopes) > 1:
+                r = self._session.post(self.batch_url, json=envelopes, timeout=self.timeout)
+                if r.status_code == 404:
+                    print("[WARN] SignalR batch endpoint missing — single posts from now on")
+                    self._batch_supported = False
+                else:
+                    r.raise_for_status()
+                    self._delivered(batch)
+                    return
+
+            for enqueued_at, env in batch:
+                self._session.post(self.url, json=env, timeout=self.timeout).raise_for_status()
+                self._delivered([(enqueued_at, env)])
+                sent += 1
+
+        except Exception as e:
+            print(f"[WARN] SignalR push failed ({len(batch) - sent} events): {e}")
+            self._count("failed", len(batch) - sent)
+
+    def _delivered(self, batch):
+        now = time.monotonic()
+        worst = max((now - t) * 1000.0 for t, _ in batch)
+        total = sum((now - t) * 1000.0 for t, _ in batch)
+
+        with self._stats_lock:
+            self.stats["sent"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["latency_ms_last"] = round(worst, 3)
+            self.stats["latency_ms_total"] += total
+            if worst > self.stats["latency_ms_max"]:
+                self.stats["latency_ms_max"] = round(worst, 3)
+
+    def snapshot(self):
+        with self._stats_lock:
+            snap = dict(self.stats)
+        snap["pending"] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return snap
+
+    def flush(self, timeout=2.0):
+        """Best effort: wait until the queue is drained (used at exit)."""
+        if self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+# ============================================================
+# COALESCER — queueCount updates, latest value per queue per window
+# ============================================================
+# Every publish/consume emits {"type": "queueCount", "queue": q, ...}.
+# At thousands of msg/s that is thousands of identical counter updates
+# per second for each browser. Within one window only the newest count
+# per (event, queue) is kept; everything else passes straight through.
+class EventCoalescer:
+
+    COALESCE_TYPES = ("queueCount",)
+
+    def __init__(self, target, window_ms=PUSH_COALESCE_MS):
+        self.target = target
+        self.window_s = window_ms / 1000.0
+        self.stats = {"coalesced": 0}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pending = {}              # (event, queue) → payload
+            self._wakeup = threading.Event()
+            threading.Thread(
+                target=self._run, name="signalr-coalesce", daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, event_name, payload):
+        if (self.window_s <= 0
+                or not isinstance(payload, dict)
+                or payload.get("type") not in self.COALESCE_TYPES):
+            return self.target.submit(event_name, payload)
+
+        self._ensure_started()
+        key = (event_name, payload.get("type"), payload.get("queue"))
+        with self._lock:
+            if key in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[key] = payload
+        self._wakeup.set()
+        return True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.window_s)     # collect the rest of the window
+
+            with self._lock:
+                self._wakeup.clear()
+                pending, self._pending = self._pending, {}
+
+            for (event_name, _type, _queue), payload in pending.items():
+                self.target.submit(event_name, payload)
+
+    def flush(self):
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for (event_name, _type, _queue), payload in pending.items():
+            self.target.submit(event_name, payload)
+
+
+dispatcher = EventDispatcher()
+coalescer = EventCoalescer(dispatcher)
+
+
+def _flush_at_exit():
+    coalescer.flush()
+    dispatcher.flush()
+
+
+atexit.register(_flush_at_exit)
+
+
 def push_event(event_name: str, payload: dict):
-    try:
-        requests.post(
-            SIGNALR_PUSH_URL,
-            json={ "Event": event_name, "Payload": payload },
-            timeout=2
-        )
-    except Exception as e:
-        print(f"[WARN] SignalR push failed: {e}")
+    """Non-blocking: coalesce queueCount updates, enqueue the rest."""
+    coalescer.submit(event_name, payload)
+
 
+def push_stats():
+    return {**dispatcher.snapshot(), **coalescer.stats}
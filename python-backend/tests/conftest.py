@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+import pytest
+
+# the modules live flat in python-backend/, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# queueCount pushes go nowhere: refused at once instead of a DNS lookup
+os.environ.setdefault("SIGNALR_PUSH_URL", "http://127.0.0.1:9/push-event")
+
+from bench.fake_pika import FakeBroker, install  # noqa: E402
+
+
+@pytest.fixture
+def broker():
+    """In-process broker; pika.BlockingConnection points at it for the test."""
+    fake = FakeBroker()
+    restore = install(fake)
+    yield fake
+    restore()
+
+
+@pytest.fixture
+def client(broker):
+    """AmqpClient on the fake broker, connected and warmed up."""
+    from amqp_raw import AmqpClient
+
+    amqp = AmqpClient()
+    deadline = time.monotonic() + 10
+    while not amqp.ready()["ready"]:
+        assert time.monotonic() < deadline, amqp.ready()
+        time.sleep(0.01)
+    return amqp
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import app_asgi
+from amqp_supervisor import BrokerUnavailable
+
+
+def call(method, path, **kwargs):
+    async def run():
+        client = app_asgi.app.test_client()
+        response = await client.open(path, method=method, **kwargs)
+        return response.status_code, response.headers, await response.get_json()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def broker_down(monkeypatch):
+    async def down(*_args, **_kwargs):
+        raise BrokerUnavailable("AMQP connection is down", retry_after=3)
+
+    for name in ("consume_one", "consume_raw", "consume_batch", "consume_stream"):
+        monkeypatch.setattr(app_asgi.amqp, name, down)
+
+
+@pytest.mark.parametrize("path", [
+    "/api/python-backend/consume?queue=q",
+    "/api/python-backend/consume?queue=q&max=5",
+    "/api/python-backend/consume-raw?queue=q",
+    "/api/python-backend/consume-stream?queue=q",
+])
+def test_consume_routes_answer_503(broker_down, path):
+    status, headers, body = call("GET", path)
+    assert status == 503
+    assert headers["Retry-After"] == "3"
+    assert body["ok"] is False
+
+
+def test_consume_max_must_be_an_integer():
+    status, _headers, body = call("GET", "/api/python-backend/consume?queue=q&max=abc")
+    assert status == 400
+    assert "max" in body["error"]
+
+
+def test_consume_stream_prefetch_must_be_an_integer():
+    status, _headers, body = call("GET", "/api/python-backend/consume-stream?queue=q&prefetch=x")
+    assert status == 400
+    assert "prefetch" in body["error"]
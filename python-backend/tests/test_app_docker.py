@@ -0,0 +1,20 @@
+import pytest
+
+import app_docker
+
+
+@pytest.fixture
+def http():
+    return app_docker.app.test_client()
+
+
+def test_consume_max_must_be_an_integer(http):
+    response = http.get("/api/python-backend/consume?queue=q&max=abc")
+    assert response.status_code == 400
+    assert "max" in response.get_json()["error"]
+
+
+def test_consume_stream_prefetch_must_be_an_integer(http):
+    response = http.get("/api/python-backend/consume-stream?queue=q&prefetch=x")
+    assert response.status_code == 400
+    assert "prefetch" in response.get_json()["error"]
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import pytest
+
+from amqp_async import AsyncAmqpClient
+from amqp_supervisor import BrokerUnavailable
+
+
+class OpenThing:
+    is_open = True
+
+
+def test_ready_fails_fast_while_reconnecting():
+    client = AsyncAmqpClient()
+    calls = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def connect():
+            calls.append(time.monotonic())
+            await gate.wait()       # a broker that takes its time
+            client.connection = client.channel = OpenThing()
+
+        client.connect = connect
+
+        # still "starting": refused without touching connect()
+        with pytest.raises(BrokerUnavailable, match="starting"):
+            await client._ready()
+
+        # breaker closed but the connection is gone: one reconnect task,
+        # every request answered at once while it runs
+        client.breaker.close()
+        started = time.monotonic()
+        for _ in range(5):
+            with pytest.raises(BrokerUnavailable):
+                await client._ready()
+        assert time.monotonic() - started < 0.5
+        await asyncio.sleep(0)
+        assert len(calls) == 1
+        assert client.breaker.is_open
+
+        gate.set()
+        for _ in range(100):
+            if not client.breaker.is_open:
+                break
+            await asyncio.sleep(0.01)
+        assert await client._ready() is client.channel
+        assert client.ready()["breaker"] == "closed"
+
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+import pika
+import pytest
+
+from amqp_codec import JSON, MSGPACK, CodecError, PayloadCodec
+
+
+def props(content_type=None, content_encoding=None):
+    return pika.BasicProperties(content_type=content_type, content_encoding=content_encoding)
+
+
+def round_trip(codec, value):
+    body, content_type, content_encoding = codec.encode(value)
+    return codec.decode(body, props(content_type, content_encoding)), content_type, content_encoding
+
+
+def test_default_is_uncompressed():
+    codec = PayloadCodec()
+    assert codec.compression is None
+    body, content_type, content_encoding = codec.encode({"a": "x" * 5000})
+    assert (content_type, content_encoding) == (JSON, None)
+    assert body.startswith(b'{"a":"xxx')
+
+
+@pytest.mark.parametrize("value", [
+    {"order": 1, "items": ["a", "b"]},
+    [1, 2, 3],
+    "plain text é",
+    b"\xff\x00binary",        # not UTF-8: stays bytes
+    "",
+])
+def test_round_trip(value):
+    codec = PayloadCodec(compression="zlib", threshold=0)
+    decoded, _type, _encoding = round_trip(codec, value)
+    assert decoded == value
+
+
+def test_threshold_rule():
+    codec = PayloadCodec(compression="zlib", threshold=100)
+
+    small = "x" * 99
+    assert codec.encode(small) == (small.encode(), None, None)
+
+    big = "x" * 100
+    body, _type, encoding = codec.encode(big)
+    assert encoding == "zlib" and len(body) < 100
+    assert codec.decompress(body, props(content_encoding="zlib")) == big.encode()
+    assert codec.stats["compressed"] == 1
+
+    # kept uncompressed when compression does not make it smaller
+    noise = bytes(range(256))
+    assert codec.encode(noise)[2] is None
+
+    # the caller already set content_encoding: body left alone
+    assert codec.encode(b"z" * 500, content_encoding="gzip") == (b"z" * 500, None, "gzip")
+
+
+def test_text_view():
+    codec = PayloadCodec(compression="zlib", threshold=0)
+    body, content_type, encoding = codec.encode({"a": 1})
+    assert codec.text(body, props(content_type, encoding)) == ('{"a":1}', None)
+    assert codec.text(b"\xff\xfe", props()) == ("//4=", "base64")
+    assert codec.text(b"", props()) == (None, None)
+
+
+def test_gzip_from_other_producers():
+    import gzip
+    codec = PayloadCodec()
+    body = gzip.compress(b'{"a":1}')
+    assert codec.decode(body, props(JSON, "gzip")) == {"a": 1}
+
+
+def test_unknown_encoding():
+    with pytest.raises(CodecError):
+        PayloadCodec().decompress(b"abc", props(content_encoding="brotli"))
+
+
+def test_unavailable_compression_falls_back_to_zlib(monkeypatch):
+    import amqp_codec
+    monkeypatch.setattr(amqp_codec, "_lz4", None)
+    assert PayloadCodec(compression="lz4").compression == "zlib"
+
+
+@pytest.mark.parametrize("name, module", [("lz4", "lz4.frame"), ("zstd", "zstandard")])
+def test_optional_compressors(name, module):
+    pytest.importorskip(module)
+    codec = PayloadCodec(compression=name, threshold=0)
+    assert round_trip(codec, {"k": "v" * 1000}) == ({"k": "v" * 1000}, JSON, name)
+
+
+def test_msgpack():
+    pytest.importorskip("msgpack")
+    codec = PayloadCodec(serializer="msgpack")
+    assert round_trip(codec, {"k": [1, 2]}) == ({"k": [1, 2]}, MSGPACK, None)
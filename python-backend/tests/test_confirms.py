@@ -0,0 +1,73 @@
+import pika
+import pytest
+from pika import frame, spec
+
+from amqp_confirms import CONFIRM_TAG_HEADER, ConfirmBatch, ConfirmTracker
+
+
+@pytest.fixture
+def channel(broker):
+    connection = pika.BlockingConnection()
+    ch = connection.channel()
+    ch.exchange_declare("ex", exchange_type="direct")
+    ch.queue_declare("q")
+    ch.queue_bind("q", "ex", routing_key="k")
+    yield ch
+    connection.close()
+
+
+def test_acked_and_returned(channel):
+    tracker = ConfirmTracker(channel)
+    result = tracker.publish_batch("ex", [("k", b"1", None), ("nowhere", b"2", None),
+                                          ("k", b"3", None)])
+    assert result == {"total": 3, "acked": [0, 2], "nacked": [], "returned": [1], "pending": []}
+    assert not tracker.pending and not tracker.returned_tags
+
+    _method, props, body = channel.basic_get("q", auto_ack=True)
+    assert body == b"1"
+    assert props.delivery_mode == 2
+    assert props.headers[CONFIRM_TAG_HEADER] == 1
+
+
+def test_unconfirmed_are_pending_at_timeout(channel):
+    tracker = ConfirmTracker(channel)
+    tracker._impl._ack_nack = None      # broker never confirms
+    result = tracker.publish_batch("ex", [("k", b"1", None), ("k", b"2", None)], timeout=0.05)
+    assert result["pending"] == [0, 1]
+    assert result["acked"] == []
+    assert list(tracker.pending) == [1, 2]
+
+
+def test_caller_properties_are_not_modified(channel):
+    tracker = ConfirmTracker(channel)
+    props = pika.BasicProperties(headers={"a": 1})
+    tracker.publish_batch("ex", [("k", b"1", props), ("k", b"2", props)])
+
+    assert props.headers == {"a": 1}
+    assert props.delivery_mode is None
+    tags = [channel.basic_get("q", auto_ack=True)[1].headers for _ in range(2)]
+    assert tags == [{"a": 1, CONFIRM_TAG_HEADER: 1}, {"a": 1, CONFIRM_TAG_HEADER: 2}]
+
+
+def test_multiple_ack_and_nack(channel):
+    tracker = ConfirmTracker(channel)
+    batch = ConfirmBatch(4)
+    for tag in range(1, 5):
+        tracker.pending[tag] = (batch, tag - 1)
+        batch.outstanding += 1
+    tracker.returned_tags.add(2)
+
+    tracker._on_confirm(frame.Method(1, spec.Basic.Ack(2, True)))
+    assert (batch.acked, batch.returned) == ([0], [1])
+    assert list(tracker.pending) == [3, 4]
+
+    tracker._on_confirm(frame.Method(1, spec.Basic.Nack(4)))
+    tracker._on_confirm(frame.Method(1, spec.Basic.Ack(3)))
+    assert batch.as_dict() == {"total": 4, "acked": [0, 2], "nacked": [3], "returned": [1],
+                               "pending": []}
+    assert batch.outstanding == 0
+    assert not tracker.returned_tags
+
+    # a repeated or unknown tag is ignored
+    tracker._on_confirm(frame.Method(1, spec.Basic.Ack(4, True)))
+    assert batch.outstanding == 0
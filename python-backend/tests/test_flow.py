@@ -0,0 +1,66 @@
+import pytest
+
+from amqp_flow import FlowControl, RateLimited, parse_limits
+
+
+def test_parse_limits():
+    rules = parse_limits(" orders=500/1000, orders:order.eu.*=50 ,*=2000,")
+    assert [(r.exchange, r.routing_key, r.rate, r.burst) for r in rules] == [
+        ("orders", None, 500.0, 1000.0),
+        ("orders", "order.eu.*", 50.0, None),
+        ("*", None, 2000.0, None),
+    ]
+    assert [r.label for r in rules] == ["orders", "orders:order.eu.*", "*"]
+    assert parse_limits("") == []
+
+
+def test_matching_own_rule_replaces_fallback():
+    flow = FlowControl("orders=500/1000, orders:order.eu.*=50, *=2000, *:audit.*=5")
+    labels = lambda exchange, rk: [r.label for r in flow._matching(exchange, rk)]
+
+    assert labels("orders", "order.eu.created") == ["orders:order.eu.*", "orders"]
+    assert labels("orders", "order.us.created") == ["orders"]
+    assert labels("billing", "invoice.paid") == ["*"]
+    assert labels("billing", "audit.login") == ["*:audit.*", "*"]
+    assert labels("orders", "audit.login") == ["*:audit.*", "orders"]
+
+
+def test_matching_without_fallback():
+    flow = FlowControl("orders=10")
+    assert flow._matching("billing", "x") == []
+    flow.limit("billing", ["x"] * 100)      # unlimited
+
+
+def test_limit_raises_after_burst():
+    flow = FlowControl("orders=0.5/2")
+    flow.limit("orders", ["a", "b"])
+    with pytest.raises(RateLimited) as exc:
+        flow.limit("orders", ["c"])
+    assert exc.value.rule == "orders"
+    assert exc.value.retry_after >= 1
+    assert flow.metrics["rate_limited"] == 1
+
+
+def test_rejected_batch_takes_nothing():
+    flow = FlowControl("orders=0.5/3, orders:eu.*=0.5/1")
+    flow.limit("orders", ["eu.1"])
+    # the exchange bucket has room, the routing-key bucket does not
+    with pytest.raises(RateLimited) as exc:
+        flow.limit("orders", ["eu.2", "us.1"])
+    assert exc.value.rule == "orders:eu.*"
+    flow.limit("orders", ["us.1", "us.2"])
+
+
+def test_oversized_batch_on_full_bucket_goes_into_debt():
+    flow = FlowControl("orders=0.5/2")
+    flow.limit("orders", ["k"] * 5)
+    with pytest.raises(RateLimited):
+        flow.limit("orders", ["k"])
+
+
+def test_fallback_buckets_are_per_exchange():
+    flow = FlowControl("*=0.5/1")
+    flow.limit("a", ["k"])
+    flow.limit("b", ["k"])
+    with pytest.raises(RateLimited):
+        flow.limit("a", ["k"])
@@ -0,0 +1,46 @@
+import pika
+import pytest
+
+from amqp_lease import LeaseManager, LeaseNotFound
+
+
+@pytest.fixture
+def leases(broker):
+    connection = pika.BlockingConnection()
+    ch = connection.channel()
+    ch.queue_declare("jobs")
+    for n in range(5):
+        ch.basic_publish("", "jobs", b"%d" % n)
+    return LeaseManager(lambda: None, reap_interval=60)
+
+
+def queue_size(broker, name):
+    return len(broker.queues[name].messages)
+
+
+def test_fetch_and_settle(broker, leases):
+    first, got = leases.fetch("jobs", 2)
+    second, _ = leases.fetch("jobs", 2)
+    assert [body for _m, _p, body in got] == [b"0", b"1"]
+
+    # younger lease settles tag by tag, the oldest with one multiple frame
+    assert leases.settle(second.id, "requeue") == 2
+    assert leases.settle(first.id, "ack") == 2
+    assert queue_size(broker, "jobs") == 3
+    with pytest.raises(LeaseNotFound):
+        leases.settle(first.id)
+
+
+def test_missing_queue_does_not_drop_other_leases(broker, leases):
+    lease, _ = leases.fetch("jobs", 3)
+    channel = leases.channel
+
+    with pytest.raises(pika.exceptions.ChannelClosedByBroker) as exc:
+        leases.fetch("no.such.queue", 10)
+    assert exc.value.reply_code == 404
+
+    # the lease channel (and its delivery tags) survived the bad request
+    assert leases.channel is channel and channel.is_open
+    assert leases.settle(lease.id, "ack") == 3
+    assert queue_size(broker, "jobs") == 2
+    assert leases.fetch("jobs", 10)[0] is not None
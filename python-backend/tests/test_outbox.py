@@ -0,0 +1,97 @@
+import os
+import struct
+
+import pytest
+
+from amqp_outbox import OutboxLog, _RECORD
+
+
+def open_log(directory, **kwargs):
+    kwargs.setdefault("commit_ms", 0)
+    return OutboxLog(str(directory), open(directory / "lock", "w"), **kwargs)
+
+
+def segment_files(directory):
+    return sorted(n for n in os.listdir(directory) if n.endswith(".wal"))
+
+
+@pytest.fixture
+def written(tmp_path):
+    log = open_log(tmp_path)
+    for n in range(1, 4):
+        assert log.append(b"m%d" % n, b"body-%d" % n) == n
+    log._file.close()
+    return tmp_path
+
+
+def test_read_returns_fsynced_records(written):
+    log = open_log(written, writable=False)
+    assert (log.seq, log.confirmed) == (3, 0)
+    assert log.read(10) == [(1, b"m1", b"body-1"), (2, b"m2", b"body-2"), (3, b"m3", b"body-3")]
+    assert log.read(10) == []
+
+
+@pytest.mark.parametrize("tail", [
+    b"\x01\x02\x03",                                        # half a header
+    struct.pack("<QIII", 4, 0, 2, 100) + b"m4" + b"x" * 10,   # header, short payload
+])
+def test_torn_tail_is_truncated(written, tail):
+    path = written / segment_files(written)[0]
+    good = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(tail)
+
+    log = open_log(written, writable=False)
+    assert log.seq == 3
+    assert os.path.getsize(path) == good
+    assert [seq for seq, _meta, _body in log.read(10)] == [1, 2, 3]
+
+
+def test_bad_crc_cuts_from_the_damaged_record(written):
+    path = written / segment_files(written)[0]
+    record = _RECORD.size + len(b"m3") + len(b"body-3")
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.seek(size - 1)
+        f.write(b"!")
+
+    log = open_log(written, writable=False)
+    assert log.seq == 2
+    assert os.path.getsize(path) == size - record
+    assert [seq for seq, _meta, _body in log.read(10)] == [1, 2]
+
+
+def test_checkpoint_survives_reopen_and_drops_segments(tmp_path):
+    # one record per segment: every append after the first rolls
+    log = open_log(tmp_path, segment_bytes=1)
+    for n in range(1, 6):
+        log.append(b"", b"%d" % n)
+    assert [seq for seq, _meta, _body in log.read(2)] == [1, 2]
+    log.confirm(2)
+    # sealed segments holding only confirmed records are gone
+    assert segment_files(tmp_path)[0] == f"{3:020d}.wal"
+
+    assert [seq for seq, _meta, _body in log.read(10)] == [3, 4, 5]
+    log.confirm(3)
+    log._file.close()
+
+    reopened = open_log(tmp_path, writable=False)
+    assert (reopened.seq, reopened.confirmed) == (5, 3)
+    assert not reopened.drained
+    assert [seq for seq, _meta, _body in reopened.read(10)] == [4, 5]
+    assert [int(n[:-4]) for n in segment_files(tmp_path)] == reopened.segments
+
+
+def test_fully_confirmed_log_recovers_empty(written):
+    log = open_log(written, writable=False)
+    log.read(10)
+    log.confirm(3)
+
+    reopened = open_log(written, writable=False)
+    assert (reopened.seq, reopened.confirmed) == (3, 3)
+    assert reopened.drained
+    assert segment_files(written) == []
+
+    # new appends continue the sequence
+    writer = open_log(written)
+    assert writer.append(b"", b"next") == 4
@@ -0,0 +1,98 @@
+import threading
+
+import pika
+import pytest
+
+from amqp_pool import ChannelPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(broker):
+    pool = ChannelPool(lambda: None, size=2, checkout_timeout=0.05, health_check_interval=0)
+    yield pool
+    pool.close()
+
+
+def test_slots_are_reused(broker, pool):
+    with pool.slot() as first:
+        pass
+    with pool.slot() as second:
+        pass
+    assert second is first
+    assert broker.stats["connections"] == 1
+    assert pool.metrics["pool_publish_checkouts"] == 2
+    assert pool.metrics["pool_publish_in_use"] == 0
+
+
+def test_size_is_bounded(broker, pool):
+    with pool.slot(), pool.slot():
+        with pytest.raises(PoolTimeout):
+            with pool.slot():
+                pass
+    assert pool.metrics["pool_publish_timeouts"] == 1
+    assert pool.metrics["pool_publish_size"] == 2
+
+
+def test_concurrent_checkouts_share_the_bound(broker, pool):
+    pool.checkout_timeout = 5
+    barrier = threading.Barrier(8)
+
+    def work():
+        barrier.wait()
+        for _ in range(20):
+            with pool.channel() as ch:
+                ch.basic_publish("", "nowhere", b"x")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert broker.stats["connections"] <= 2
+    assert pool.metrics["pool_publish_checkouts"] == 160
+
+
+def test_broken_channel_is_reopened_on_the_same_connection(broker, pool):
+    errors = []
+    pool.on_error = errors.append
+    with pytest.raises(pika.exceptions.ChannelClosedByBroker):
+        with pool.slot() as slot:
+            connection, channel = slot.connection, slot.channel
+            slot.channel.queue_declare("missing", passive=True)
+
+    with pool.slot() as again:
+        assert again.connection is connection
+        assert again.channel is not channel and again.channel.is_open
+    assert broker.stats["connections"] == 1
+    assert len(errors) == 1
+
+
+def test_dead_connection_is_replaced(broker, pool):
+    with pool.slot() as slot:
+        dead = slot.connection
+    broker.kill_connections()
+
+    with pool.slot() as slot:
+        assert slot.connection is not dead and slot.is_open()
+    assert pool.metrics["pool_publish_replaced"] == 1
+    assert broker.stats["connections"] == 2
+
+
+def test_failed_connect_frees_the_slot(broker, pool):
+    broker.down = True
+    for _ in range(3):
+        with pytest.raises(pika.exceptions.AMQPConnectionError):
+            with pool.slot():
+                pass
+    broker.down = False
+    with pool.slot(), pool.slot():
+        pass
+
+
+def test_closed_pool_refuses(broker, pool):
+    with pool.slot():
+        pass
+    pool.close()
+    with pytest.raises(RuntimeError):
+        with pool.slot():
+            pass
@@ -0,0 +1,58 @@
+import json
+import os
+
+from prefork import ForkLocal, WorkerStats, merge
+
+
+def test_merge_sums_and_maxes():
+    rows = [
+        {"published": 3, "pool_publish_checkout_ms_max": 4.0, "checkout_ms_last": 1.0},
+        {"published": 5, "pool_publish_checkout_ms_max": 9.5, "checkout_ms_last": 0.5},
+    ]
+    assert merge(rows) == {"published": 8, "pool_publish_checkout_ms_max": 9.5,
+                           "checkout_ms_last": 1.0}
+
+
+def test_merge_strings_nested_and_missing():
+    rows = [
+        {"breaker_state": "closed", "routing": {"bindings": 2, "mode": "trie"}, "x": None},
+        {"breaker_state": "closed", "routing": {"bindings": 3, "mode": "trie"}},
+        {"breaker_state": "open", "routing": {"bindings": 1, "mode": "trie"}, "only": 7},
+    ]
+    assert merge(rows) == {
+        "breaker_state": {"closed": 2, "open": 1},
+        "routing": {"bindings": 6, "mode": "trie"},
+        "x": None,
+        "only": 7,
+    }
+
+
+def test_merge_does_not_add_booleans_or_lists():
+    assert merge([{"ok": True}, {"ok": True}]) == {"ok": True}
+    assert merge([{"ok": True}, {"ok": False}]) == {"ok": {"True": 1, "False": 1}}
+    assert merge([{"q": [1]}, {"q": [1]}]) == {"q": [1]}
+
+
+def test_aggregate_drops_dead_workers(tmp_path):
+    stats = WorkerStats(lambda: {"published": 2}, directory=str(tmp_path), interval=60)
+    # a worker that is gone (pid far above pid_max) left its file behind
+    dead = tmp_path / "99999999.json"
+    dead.write_text(json.dumps({"pid": 99999999, "published": 100}))
+
+    total = stats.aggregate()
+    assert total["published"] == 2
+    assert total["worker_count"] == 1
+    assert list(total["workers"]) == [os.getpid()]
+    assert not dead.exists()
+
+
+def test_fork_local_builds_once_per_process():
+    built = []
+    local = ForkLocal(lambda: built.append(1) or {"n": len(built)})
+    assert not local.created
+    assert local.get() is local.get()
+    assert local.created and built == [1]
+    assert local.keys() == {"n": 1}.keys()      # attribute access goes to the instance
+
+    local._pid = -1                             # as seen from a forked child
+    assert local.get() == {"n": 2}
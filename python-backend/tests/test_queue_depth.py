@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from amqp_supervisor import BrokerUnavailable
+from queue_depth import AsyncQueueDepthService, QueueDepthService, QueueNotFound
+
+
+class Fetch:
+    """Scripted fetch: returns / raises the next result, counts calls."""
+
+    def __init__(self, *results, gate=None):
+        self.results = list(results)
+        self.calls = 0
+        self.gate = gate
+
+    def __call__(self, queue):
+        self.calls += 1
+        if self.gate:
+            self.gate.wait(5)
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_single_flight():
+    gate = threading.Event()
+    fetch = Fetch(7, gate=gate)
+    depth = QueueDepthService(fetch, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(depth.get("q"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while depth.metrics["depth_coalesced"] < 4:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert results == [7] * 5
+    assert fetch.calls == 1
+
+
+def test_ttl_and_adjust():
+    fetch = Fetch(10, 20)
+    depth = QueueDepthService(fetch, ttl=0.05)
+    assert depth.get("q") == 10
+    depth.adjust("q", +3)
+    depth.adjust("q", -1)
+    assert depth.get("q") == 12
+    depth.adjust("q", -50)
+    assert depth.get("q") == 0              # never below zero
+    assert fetch.calls == 1
+
+    time.sleep(0.06)
+    assert depth.get("q") == 20             # local deltas dropped with the old value
+    assert fetch.calls == 2
+
+    depth.adjust("unknown", +1)             # nothing cached: no-op
+    assert depth.peek("unknown") is None
+
+
+def test_errors_propagate_and_are_not_cached():
+    fetch = Fetch(BrokerUnavailable("down"), 5)
+    depth = QueueDepthService(fetch, ttl=60)
+    with pytest.raises(BrokerUnavailable):
+        depth.get("q")
+    assert depth.estimate("q") == 5
+    assert fetch.calls == 2
+    assert depth.metrics["depth_errors"] == 1
+
+
+def test_error_reaches_followers():
+    gate = threading.Event()
+    depth = QueueDepthService(Fetch(OSError("reset"), gate=gate), ttl=60)
+    errors = []
+
+    def call():
+        try:
+            depth.get("q")
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while depth.metrics["depth_coalesced"] < 2:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(errors) == 3
+
+
+def test_missing_queue_is_cached_for_ttl():
+    fetch = Fetch(QueueNotFound("q"), QueueNotFound("q"), 4)
+    depth = QueueDepthService(fetch, ttl=0.05)
+    for _ in range(3):
+        with pytest.raises(QueueNotFound):
+            depth.get("q")
+    assert depth.estimate("q") is None
+    assert fetch.calls == 1
+
+    time.sleep(0.06)
+    with pytest.raises(QueueNotFound):
+        depth.get("q")
+    assert fetch.calls == 2
+
+    # the queue got declared: a real count replaces the 404
+    depth.observe("q", 9)
+    assert depth.get("q") == 9
+    assert fetch.calls == 2
+
+
+def test_follower_timeout_raises():
+    gate = threading.Event()
+    depth = QueueDepthService(Fetch(1, gate=gate), ttl=60, wait_timeout=0.05)
+    leader = threading.Thread(target=depth.get, args=("q",))
+    leader.start()
+    while not depth._flights:
+        time.sleep(0.001)
+    try:
+        with pytest.raises(BrokerUnavailable, match="still running"):
+            depth.get("q")
+    finally:
+        gate.set()
+        leader.join()
+
+
+def test_async_single_flight_and_errors():
+    calls = []
+
+    async def fetch(queue):
+        calls.append(queue)
+        await asyncio.sleep(0.01)
+        if queue == "missing":
+            raise QueueNotFound(queue)
+        return 3
+
+    async def main():
+        depth = AsyncQueueDepthService(fetch, ttl=60)
+        assert await asyncio.gather(*(depth.get("q") for _ in range(4))) == [3] * 4
+        results = await asyncio.gather(*(depth.get("missing") for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(r, QueueNotFound) for r in results)
+        with pytest.raises(QueueNotFound):
+            await depth.get("missing")
+        assert await depth.estimate("missing") is None
+        return depth
+
+    depth = asyncio.run(main())
+    assert calls == ["q", "missing"]
+    assert depth.metrics["depth_coalesced"] == 5
+
+
+def test_client_queue_length(client):
+    with pytest.raises(QueueNotFound):
+        client.queue_length("no.such.queue")
+    fetches = client.metrics["depth_fetches"]
+    with pytest.raises(QueueNotFound):
+        client.queue_length("no.such.queue")
+    assert client.metrics["depth_fetches"] == fetches
+
+    client.declare_queue("depth.q")
+    client.publish("", "depth.q", {"n": 1})
+    assert client.queue_length("depth.q") == 1
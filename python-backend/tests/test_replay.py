@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import app_docker
+from dlq_replay import replay_options, requeue_options
+
+
+def test_replay_options_defaults():
+    assert replay_options({}) == {
+        "batch_size": 100, "rate": None, "max_messages": None,
+        "routing_key": None, "headers": None, "target": "origin"
+    }
+
+
+def test_replay_options_converts_numbers():
+    options = replay_options({"batchSize": "50", "rate": 12.5, "max": 10.0,
+                              "routingKey": "order.*", "headers": {"a": 1}, "target": "queue"})
+    assert (options["batch_size"], options["rate"], options["max_messages"]) == (50, 12.5, 10)
+    assert isinstance(options["max_messages"], int)
+
+
+@pytest.mark.parametrize("body, field", [
+    ({"batchSize": "lots"}, "batchSize"),
+    ({"batchSize": 0}, "batchSize"),
+    ({"batchSize": 2.5}, "batchSize"),
+    ({"rate": "fast"}, "rate"),
+    ({"rate": -1}, "rate"),
+    ({"rate": True}, "rate"),
+    ({"max": "all"}, "max"),
+    ({"routingKey": 5}, "routingKey"),
+    ({"headers": ["a"]}, "headers"),
+    ({"target": "elsewhere"}, "target"),
+])
+def test_replay_options_rejects(body, field):
+    with pytest.raises(ValueError, match=field):
+        replay_options(body)
+
+
+def test_requeue_options():
+    assert requeue_options({"queue": "orders"}) == ("orders", 1, 30)
+    with pytest.raises(ValueError, match="queue"):
+        requeue_options({})
+    with pytest.raises(ValueError, match="count"):
+        requeue_options({"queue": "orders", "count": "x"})
+
+
+class SlowJob:
+    replayed = 0
+    scanned = 0
+    state = "running"
+
+    def __init__(self):
+        self.finished = threading.Event()
+
+    def snapshot(self):
+        return {"id": "job-1", "state": self.state}
+
+
+@pytest.fixture
+def http(monkeypatch):
+    started = []
+
+    def start(queue, **options):
+        started.append((queue, options))
+        return SlowJob()
+
+    monkeypatch.setattr(app_docker, "amqp", SimpleNamespace(replays=SimpleNamespace(start=start)))
+    client = app_docker.app.test_client()
+    client.started = started
+    return client
+
+
+def test_requeue_still_running_is_202(http):
+    response = http.post("/api/python-backend/dlq-requeue",
+                         json={"queue": "orders", "count": 2, "timeout": 0.01})
+    assert response.status_code == 202
+    assert response.get_json() == {"status": "running", "job": {"id": "job-1", "state": "running"}}
+    assert http.started == [("orders", {"max_messages": 2})]
+
+
+def test_bad_replay_body_is_400(http):
+    response = http.post("/api/python-backend/dlq-replay", json={"queue": "orders", "rate": "x"})
+    assert response.status_code == 400
+    assert "rate" in response.get_json()["error"]
+    response = http.post("/api/python-backend/dlq-requeue", json={"queue": "orders", "timeout": "soon"})
+    assert response.status_code == 400
+    assert http.started == []
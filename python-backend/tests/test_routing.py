@@ -0,0 +1,90 @@
+import random
+
+from amqp_routing import BindingIndex
+
+
+def reference_match(pattern, routing_key):
+    """Topic semantics spelled out recursively: '*' one word, '#' zero or more."""
+    def match(pattern, words):
+        if not pattern:
+            return not words
+        head, rest = pattern[0], pattern[1:]
+        if head == "#":
+            return any(match(rest, words[i:]) for i in range(len(words) + 1))
+        return bool(words) and head in ("*", words[0]) and match(rest, words[1:])
+    return match(pattern.split("."), routing_key.split("."))
+
+
+def test_topic_trie_matches_reference():
+    rng = random.Random(7)
+    words = ["a", "b", "c", "*", "#"]
+    index = BindingIndex()
+    index.set_type("t", "topic")
+    patterns = {}
+    for n in range(300):
+        pattern = ".".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        patterns[f"q{n}"] = pattern
+        index.add(f"q{n}", "t", pattern)
+
+    for _ in range(300):
+        key = ".".join(rng.choice("abcd") for _ in range(rng.randint(1, 5)))
+        expected = tuple(sorted(q for q, p in patterns.items() if reference_match(p, key)))
+        assert index.route("t", key) == expected, key
+
+
+def test_topic_edge_cases():
+    index = BindingIndex()
+    index.set_type("t", "topic")
+    index.add("all", "t", "#")
+    index.add("one", "t", "*")
+    index.add("tail", "t", "order.#")
+    index.add("mid", "t", "order.*.created")
+
+    assert index.route("t", "order") == ("all", "one", "tail")
+    assert index.route("t", "order.eu.created") == ("all", "mid", "tail")
+    assert index.route("t", "order.eu.x.created") == ("all", "tail")
+    assert index.route("t", "") == ("all", "one")
+
+
+def test_remove_prunes_and_invalidates_cache():
+    index = BindingIndex()
+    index.set_type("t", "topic")
+    index.add("q1", "t", "a.*")
+    index.add("q2", "t", "a.b")
+    assert index.route("t", "a.b") == ("q1", "q2")
+
+    index.remove("q1", "t", "a.*")
+    assert index.route("t", "a.b") == ("q2",)
+    index.remove("q2", "t", "a.b")
+    # nothing bound any more → legacy "queue named like the key" fallback
+    assert index.route("t", "a.b") == ("a.b",)
+    assert index.snapshot()["bindings"] == 0
+
+
+def test_direct_fanout_headers_and_default():
+    index = BindingIndex()
+    index.set_type("d", "direct")
+    index.set_type("f", "fanout")
+    index.set_type("h", "headers")
+    index.add("q1", "d", "k")
+    index.add("q2", "d", "k")
+    index.add("q1", "f", "ignored")
+    index.add("q2", "f", "")
+    index.add("q1", "h", "")
+
+    assert index.route("d", "k") == ("q1", "q2")
+    assert index.route("d", "other") == ()
+    assert index.route("f", "anything") == ("q1", "q2")
+    assert index.route("h", "k") == ()
+    assert index.route("", "orders") == ("orders",)
+
+
+def test_route_cache_hits():
+    index = BindingIndex(cache_size=2)
+    index.add("q", "d", "k")
+    index.route("d", "k")
+    index.route("d", "k")
+    assert index.metrics["route_hits"] == 1
+    index.route("d", "x")
+    index.route("d", "y")
+    assert index.snapshot()["cached_routes"] == 2
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pika
+import pytest
+
+from amqp_streams import NotAStream, StreamNotFound, StreamQueues, parse_offset, stream_args
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, "first"),
+    ("", "first"),
+    ("next", "next"),
+    ("last", "last"),
+    (42, 42),
+    ("42", 42),
+    (" 7 ", 7),
+    ("30m", "30m"),
+    ("1D", "1D"),
+    ("2026-10-17T08:00:00Z", datetime(2026, 10, 17, 8, tzinfo=timezone.utc)),
+    ("2026-10-17T08:00:00", datetime(2026, 10, 17, 8, tzinfo=timezone.utc)),
+])
+def test_parse_offset(value, expected):
+    assert parse_offset(value) == expected
+
+
+@pytest.mark.parametrize("value", [-1, True, "yesterday", "10x", "1.5"])
+def test_parse_offset_rejects(value):
+    with pytest.raises(ValueError):
+        parse_offset(value)
+
+
+def test_parse_offset_keeps_datetime():
+    ts = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert parse_offset(ts) is ts
+
+
+def test_stream_args():
+    assert stream_args("12h", 1024, 0) == {
+        "x-queue-type": "stream", "x-max-age": "12h", "x-max-length-bytes": 1024}
+    assert stream_args("", 0, 0) == {"x-queue-type": "stream"}
+    assert stream_args()["x-max-age"] == "7D"       # AMQP_STREAM_* defaults
+    with pytest.raises(ValueError, match="max_age"):
+        stream_args("a week")
+
+
+@pytest.fixture
+def streams(broker):
+    ch = pika.BlockingConnection().channel()
+    args = stream_args()
+    ch.queue_declare("events", durable=True, arguments=args)
+    for n in range(40):
+        ch.basic_publish("", "events", b"%d" % n)
+    ch.queue_declare("classic")
+    ch.basic_publish("", "classic", b"x")
+    return StreamQueues(lambda: None, idle=0.02)
+
+
+def test_read_pages_by_offset(streams):
+    first, next_offset = streams.read("events", "first", max_messages=15, wait=0.2)
+    assert [body for _o, _m, _p, body in first] == [b"%d" % n for n in range(15)]
+    assert next_offset == 15
+
+    # starts inside a chunk: the head of the chunk is skipped, not returned
+    page, next_offset = streams.read("events", next_offset, max_messages=100, wait=0.2)
+    assert [offset for offset, *_ in page] == list(range(15, 40))
+    assert next_offset == 40
+    assert streams.metrics["stream_skipped"] > 0
+
+    assert streams.read("events", next_offset, wait=0.05) == ([], None)
+
+
+def test_read_errors(streams):
+    with pytest.raises(StreamNotFound):
+        streams.read("missing", wait=0.05)
+    with pytest.raises(NotAStream):
+        streams.read("classic", wait=0.2)
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from amqp_supervisor import BrokerUnavailable, CircuitBreaker, ConnectionSupervisor
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_breaker_fails_fast_while_open():
+    breaker = CircuitBreaker()
+    breaker.check()
+
+    assert breaker.trip("connection reset")
+    assert not breaker.trip("again")        # already open: one trip counted
+    with pytest.raises(BrokerUnavailable, match="connection reset"):
+        breaker.check()
+    assert breaker.metrics["breaker_state"] == "open"
+    assert breaker.metrics["breaker_trips"] == 1
+    assert breaker.metrics["breaker_fast_fails"] == 1
+
+    breaker.close()
+    breaker.check()
+    assert breaker.metrics["breaker_state"] == "closed"
+
+
+def test_supervisor_retries_then_closes_breaker():
+    attempts = []
+
+    def connect():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise OSError("refused")
+
+    breaker = CircuitBreaker()
+    supervisor = ConnectionSupervisor(connect, breaker, base=0.001, cap=0.01)
+    supervisor.connection_lost("socket closed")
+    assert breaker.is_open
+
+    wait_for(lambda: not breaker.is_open)
+    assert len(attempts) == 3
+    assert supervisor.metrics["reconnect_attempts"] == 3
+
+
+def test_queue_length_fails_fast_without_dialing(client):
+    fetches = client.metrics["depth_fetches"]
+    client.breaker.trip("test outage")
+    try:
+        with pytest.raises(BrokerUnavailable):
+            client.queue_length("orders")
+        # depth refresh after a publish goes through the same fetch
+        with pytest.raises(BrokerUnavailable):
+            client._fetch_queue_count("orders")
+        assert client.metrics["depth_fetches"] == fetches
+    finally:
+        client.breaker.close()
@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+
+import pika
+import pytest
+
+from amqp_workers import ConsumerPool
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.calls = []
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.calls.append(("ack", delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.calls.append(("nack", delivery_tag, requeue))
+
+
+def make_state(tags, ok=(), generation=1):
+    return {
+        "channel": RecordingChannel(),
+        "generation": generation,
+        "outstanding": OrderedDict((tag, "q") for tag in tags),
+        "ok": set(ok),
+    }
+
+
+@pytest.fixture
+def pool():
+    return ConsumerPool(lambda: None).register("q", lambda delivery: None)
+
+
+def test_flush_coalesces_contiguous_acks(pool):
+    state = make_state(range(1, 7), ok={1, 2, 3, 5})
+    pool._flush(state)
+
+    # 1..3 in one multiple ack, 5 on its own; 4 (in flight) must not be covered
+    assert state["channel"].calls == [("ack", 3, True), ("ack", 5, False)]
+    assert list(state["outstanding"]) == [4, 6]
+    assert state["ok"] == set()
+    assert pool.metrics["worker_ack_frames"] == 2
+    assert pool.metrics["worker_acked"] == 4
+    assert pool._queue_stats["q"]["acked"] == 4
+
+
+def test_flush_waits_for_oldest(pool):
+    state = make_state(range(1, 4), ok={2, 3})
+    pool._flush(state)
+    assert state["channel"].calls == [("ack", 2, False), ("ack", 3, False)]
+    assert list(state["outstanding"]) == [1]
+
+    state["ok"].add(1)
+    pool._flush(state)
+    assert state["channel"].calls[-1] == ("ack", 1, True)
+    assert not state["outstanding"]
+
+
+def test_collect_routes_outcomes(pool):
+    state = make_state(range(1, 5))
+    executor = object()
+    pool._done.put((1, executor, 1, "q", "ok"))
+    pool._done.put((1, executor, 2, "q", "failed"))
+    pool._done.put((1, executor, 3, "q", "retry"))
+    pool._done.put((0, executor, 4, "q", "failed"))     # previous channel: ignored
+    pool._collect(state)
+
+    assert state["ok"] == {1}
+    assert state["channel"].calls == [("nack", 2, False), ("nack", 3, True)]
+    assert list(state["outstanding"]) == [1, 4]
+    assert pool.metrics["worker_failed"] == 1
+    assert pool.metrics["worker_requeued"] == 1
+
+
+def test_collect_replaces_broken_pool_of_previous_session():
+    pool = ConsumerPool(lambda: None, executor="process", concurrency=1)
+    pool.register("q", lambda delivery: None)
+    old = pool._executor = pool._new_executor()
+    try:
+        state = make_state([])
+        pool._done.put((0, old, 7, "q", "retry"))
+        pool._done.put((0, old, 8, "q", "retry"))
+        pool._collect(state)
+
+        assert pool._executor is not old
+        assert state["channel"].calls == []
+        replacement = pool._executor
+        # a late outcome of the old pool leaves the replacement alone
+        pool._done.put((1, old, 9, "q", "retry"))
+        pool._collect(state)
+        assert pool._executor is replacement
+    finally:
+        pool._executor.shutdown(wait=False)
+
+
+def test_missing_queue_does_not_stop_the_others(broker):
+    seen = []
+    pool = ConsumerPool(lambda: None, concurrency=2, ack_interval=0.01)
+    pool.RETRY_SKIPPED_S = 0.05
+    pool.register("present", lambda delivery: seen.append(delivery.body))
+    pool.register("missing", lambda delivery: seen.append(delivery.body))
+
+    ch = pika.BlockingConnection().channel()
+    ch.queue_declare("present")
+    pool.start()
+    try:
+        ch.basic_publish("", "present", b"1")
+
+        deadline = time.monotonic() + 5
+        while not (seen and pool.metrics["worker_acked"] == 1):
+            assert time.monotonic() < deadline, pool.snapshot()
+            time.sleep(0.01)
+        assert pool.snapshot()["skipped"] == ["missing"]
+        assert pool._generation == 1        # no session restarts
+
+        # the queue shows up later: picked up by the periodic retry
+        ch.queue_declare("missing")
+        ch.basic_publish("", "missing", b"2")
+        while pool.metrics["worker_acked"] < 2:
+            assert time.monotonic() < deadline, pool.snapshot()
+            time.sleep(0.01)
+        assert sorted(seen) == [b"1", b"2"]
+        assert pool.snapshot()["skipped"] == []
+        assert pool._generation == 1
+    finally:
+        pool.stop()
@@ -44,6 +44,18 @@ app.MapPost("/api/signalr-node/push-event", async (
     return Results.Ok(new { delivered = true });
 });
 
+// Batched variant: Python dispatcher flushes many events per POST
+app.MapPost("/api/signalr-node/push-events", async (
+    IHubContext<RealtimeHub> hub,
+    EventEnvelope[] envelopes) =>
+{
+    foreach (var envelope in envelopes)
+    {
+        await hub.Clients.All.SendAsync(envelope.Event, envelope.Payload);
+    }
+    return Results.Ok(new { delivered = envelopes.Length });
+});
+
 app.MapGet("/health", () => Results.Ok(new { status = "ok" }));
 
 // 🔥 Port CHUẨN cho SignalR Node trong toàn kiến trúc